@@ -0,0 +1,9 @@
+# Copyright (c) 2025, Prova and contributors
+# For license information, please see license.txt
+
+from frappe.model.document import Document
+
+
+class TimesheetDailyRollup(Document):
+	# Righe mantenute via SQL da advanced_tc.api.rollup (una per employee, giorno, progetto e activity type)
+	pass
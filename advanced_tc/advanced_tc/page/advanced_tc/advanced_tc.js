@@ -20,6 +20,17 @@ class AdvancedTimesheetCalendar {
 		this.filter_options = {};
 		this.user_permissions = {};
 		
+		// Finestra di eventi caricata e cursore per il sync incrementale
+		this.window_events = new Map();
+		this.window_key = null;
+		this.sync_cursor = null;
+		// Finestre visitate o precaricate (LRU): window_key -> {events, cursor, version, fetched_at}
+		this.window_store = new Map();
+		
+		// Colori dei progetti risolti lato client (mappa inviata da get_filter_options)
+		this.project_colors = {};
+		this.pending_color_projects = new Set();
+		
 		// Carica le impostazioni predefinite dal localStorage
 		this.default_settings = this.load_default_settings();
 		
@@ -68,10 +79,34 @@ class AdvancedTimesheetCalendar {
 							<div class="filter-group">
 								<button class="btn btn-primary btn-block" id="generate-report-btn">Generate Report</button>
 							</div>
+							<div class="filter-group">
+								<button class="btn btn-default btn-block" id="export-report-btn">Export</button>
+							</div>
+							<div class="filter-group">
+								<button class="btn btn-default btn-block" id="capacity-btn">Capacity</button>
+							</div>
+							<div class="filter-group" id="performance-group" style="display: none;">
+								<button class="btn btn-default btn-block" id="performance-btn">Performance</button>
+							</div>
 						</div>
 					</div>
 					<div class="col-lg-9 col-md-8">
 						<div id="calendar" style="height: 600px;"></div>
+						<div id="capacity-heatmap" class="capacity-heatmap" style="display: none;">
+							<div class="capacity-toolbar">
+								<button class="btn btn-default btn-sm" id="capacity-prev">&lsaquo;</button>
+								<button class="btn btn-default btn-sm" id="capacity-next">&rsaquo;</button>
+								<select class="form-control input-sm" id="capacity-weeks">
+									<option value="4">4 settimane</option>
+									<option value="8">8 settimane</option>
+									<option value="13">13 settimane</option>
+									<option value="26">26 settimane</option>
+								</select>
+								<span class="capacity-title"></span>
+								<button class="btn btn-default btn-sm" id="capacity-close">Calendario</button>
+							</div>
+							<div class="capacity-grid"></div>
+						</div>
 					</div>
 				</div>
 			</div>
@@ -108,6 +143,51 @@ class AdvancedTimesheetCalendar {
 		this.page.main.find('#generate-report-btn').on('click', () => {
 			this.show_report_dialog();
 		});
+		
+		// Esportazione CSV/XLSX delle ore aggregate
+		this.page.main.find('#export-report-btn').on('click', () => {
+			this.show_export_dialog();
+		});
+		
+		// Heatmap ore registrate / ore attese per employee e giorno
+		this.page.main.find('#capacity-btn').on('click', () => {
+			this.show_capacity_heatmap();
+		});
+		
+		this.page.main.find('#capacity-close').on('click', () => {
+			this.hide_capacity_heatmap();
+		});
+		
+		this.page.main.find('#capacity-prev').on('click', () => {
+			this.shift_capacity_heatmap(-1);
+		});
+		
+		this.page.main.find('#capacity-next').on('click', () => {
+			this.shift_capacity_heatmap(1);
+		});
+		
+		this.page.main.find('#capacity-weeks').on('change', () => {
+			this.load_capacity_heatmap();
+		});
+		
+		// Pannello statistiche delle API (solo System Manager)
+		if (frappe.user.has_role('System Manager')) {
+			this.page.main.find('#performance-group').show();
+		}
+		
+		this.page.main.find('#performance-btn').on('click', () => {
+			this.show_performance_dialog();
+		});
+		
+		// Esito delle scritture accodate in background (modalità asincrona)
+		frappe.realtime.on('advanced_tc_write_result', (result) => {
+			this.handle_write_result(result);
+		});
+		
+		// Modifiche ai Timesheet pubblicate dal server (room Employee e room del doctype Timesheet)
+		frappe.realtime.on('advanced_tc_timesheet_change', (change) => {
+			this.handle_timesheet_change(change);
+		});
 	}
 	
 	init_calendar() {
@@ -138,8 +218,17 @@ class AdvancedTimesheetCalendar {
 				this.load_events(info.start, info.end, successCallback, failureCallback);
 			},
 			eventClick: (info) => {
+				if (info.event.extendedProps.is_summary) {
+					this.open_summary_day(info.event);
+					return;
+				}
+				if (info.event.extendedProps.is_pending) {
+					// Attività accodata, non ancora salvata
+					return;
+				}
 				if (this.can_edit_event(info.event)) {
-					this.show_activity_dialog(info.event);
+					// Gli eventi arrivano in modalità slim: i dettagli vengono caricati all'apertura del dialog
+					this.load_event_details([info.event], () => this.show_activity_dialog(info.event));
 				} else {
 					frappe.msgprint('Non hai i permessi per modificare questa attività.');
 				}
@@ -163,6 +252,15 @@ class AdvancedTimesheetCalendar {
 					frappe.msgprint('Non hai i permessi per modificare questa attività.');
 				}
 			},
+			eventDataTransform: (event) => this.apply_event_color(event),
+			eventDidMount: (info) => {
+				// Tooltip con il dettaglio per progetto sui badge di riepilogo
+				if (info.event.extendedProps.is_summary) {
+					info.el.title = info.event.extendedProps.projects
+						.map(p => `${p.project_name}: ${Math.round(p.hours * 100) / 100}h`)
+						.join('\n');
+				}
+			},
 			slotMinTime: '06:00:00',
 			slotMaxTime: '22:00:00',
 			height: 'auto'
@@ -175,25 +273,183 @@ class AdvancedTimesheetCalendar {
 	}
 	
 	load_filter_options() {
+		// Bootstrap unico (opzioni dei filtri, permessi, assegnazioni, colori) conservato in sessionStorage:
+		// la copia locale viene applicata subito e rivalidata con la sua versione, il server
+		// risponde not_modified se nulla è cambiato
+		const storage_key = `advanced_tc_bootstrap:${frappe.session.user}`;
+		let cached = null;
+		try {
+			cached = JSON.parse(sessionStorage.getItem(storage_key) || 'null');
+		} catch (e) {
+			cached = null;
+		}
+		
+		if (cached) {
+			this.apply_bootstrap(cached);
+		}
+		
 		frappe.call({
-			method: 'advanced_tc.api.timesheet_details.get_filter_options',
+			method: 'advanced_tc.api.bootstrap.get_calendar_bootstrap',
+			args: { version: cached ? cached.version : null },
 			callback: (r) => {
-				if (r.message) {
-					this.filter_options = r.message;
-					this.user_permissions = r.message.user_permissions || {};
-					this.populate_filters();
-					this.apply_ui_permissions();
+				if (!r.message || r.message.not_modified) {
+					return;
 				}
+				
+				try {
+					sessionStorage.setItem(storage_key, JSON.stringify(r.message));
+				} catch (e) {
+					// Storage pieno o non disponibile: il bootstrap resta solo in memoria
+				}
+				this.apply_bootstrap(r.message);
 			}
 		});
 	}
 	
+	apply_bootstrap(data) {
+		this.bootstrap = data;
+		this.filter_options = data;
+		this.user_permissions = data.user_permissions || {};
+		// Nomi di employee e progetti per gli eventi slim, ricalcolati dalle nuove opzioni
+		this.slim_names = null;
+		Object.assign(this.project_colors, data.project_colors || {});
+		this.resolve_event_colors();
+		this.populate_filters();
+		this.apply_ui_permissions();
+		this.subscribe_realtime();
+	}
+	
+	subscribe_realtime() {
+		// Room dell'Employee corrente e, per i manager, room del doctype Timesheet (solo notifiche)
+		const employee = this.user_permissions.current_employee;
+		if (employee && this.subscribed_employee !== employee) {
+			frappe.realtime.doc_subscribe('Employee', employee);
+			this.subscribed_employee = employee;
+		}
+		
+		if (this.user_permissions.is_manager && !this.subscribed_timesheets) {
+			frappe.realtime.doctype_subscribe('Timesheet');
+			this.subscribed_timesheets = true;
+		}
+	}
+	
+	handle_timesheet_change(change) {
+		if (!change || !this.calendar || !this.calendar.view) {
+			return;
+		}
+		
+		const view = this.calendar.view;
+		if (change.from_date && change.to_date) {
+			// Modifica fuori dalla finestra visualizzata
+			const from_date = moment(change.from_date).toDate();
+			const to_date = moment(change.to_date).add(1, 'days').toDate();
+			if (from_date >= view.activeEnd || to_date <= view.activeStart) {
+				return;
+			}
+		}
+		
+		if (this.filters.employee && this.filters.employee !== change.employee) {
+			return;
+		}
+		
+		// Le righe eliminate (room Employee) spariscono subito; gli eventi aggiornati arrivano
+		// con il sync incrementale, che applica i permessi di lettura dei Timesheet
+		if (change.deleted && change.deleted.length && !this.is_summary_view()) {
+			this.patch_calendar_events([], change.deleted);
+		}
+		this.schedule_realtime_sync();
+	}
+	
+	schedule_realtime_sync() {
+		// Raggruppa le notifiche ravvicinate in un solo sync incrementale
+		clearTimeout(this.realtime_sync_timer);
+		this.realtime_sync_timer = setTimeout(() => this.refresh_events(), 300);
+	}
+	
+	patch_calendar_events(upserts, deleted) {
+		// Aggiorna in place lo store di FullCalendar e la finestra caricata, senza refetch
+		const view = this.calendar.view;
+		const visible = upserts.filter(event => {
+			const props = event.extendedProps || {};
+			return new Date(event.start) < view.activeEnd && new Date(event.end) > view.activeStart
+				&& (!this.filters.project || props.project === this.filters.project);
+		});
+		const hidden = upserts.filter(event => !visible.includes(event)).map(event => event.id);
+		const removed = deleted.concat(hidden);
+		
+		const source = this.calendar.getEventSources()[0];
+		this.calendar.batchRendering(() => {
+			removed.concat(visible.map(event => event.id)).forEach(id => {
+				const existing = this.calendar.getEventById(id);
+				if (existing) {
+					existing.remove();
+				}
+			});
+			
+			visible.forEach(event => {
+				this.calendar.addEvent(this.apply_event_color({ ...event }), source);
+			});
+		});
+		
+		this.apply_event_changes(visible, removed);
+		
+		if (this.window_key && !this.should_stream_events() && !this.is_summary_view()) {
+			this.store_window(this.window_key, this.sync_cursor);
+		}
+	}
+	
+	
+	call_with_bootstrap(opts) {
+		// Risponde dai dati del bootstrap quando possibile, altrimenti esegue la chiamata al server
+		const local = this.resolve_from_bootstrap(opts.method, opts.args || {});
+		if (local !== undefined) {
+			if (opts.callback) {
+				opts.callback({ message: local });
+			}
+			return;
+		}
+		
+		return frappe.call(opts);
+	}
+	
+	resolve_from_bootstrap(method, args) {
+		// undefined = risposta non ricavabile dal bootstrap
+		const assignments = this.bootstrap && this.bootstrap.assignments;
+		if (!assignments) {
+			return undefined;
+		}
+		
+		if (method === 'advanced_tc.api.timesheet_details.get_task_project') {
+			const task = assignments.tasks[args.task_name];
+			return task ? task.project : undefined;
+		}
+		
+		if (method === 'advanced_tc.api.timesheet_details.check_employee_has_tasks') {
+			// Le assegnazioni nel bootstrap sono quelle dell'utente corrente
+			if (!args.employee || args.employee !== this.user_permissions.current_employee) {
+				return undefined;
+			}
+			return Object.values(assignments.tasks).some(task => task.project === args.project);
+		}
+		
+		if (method === 'frappe.client.get_list' && args.doctype === 'ToDo') {
+			const filters = args.filters || {};
+			if (filters.reference_type === 'Project' && filters.allocated_to === frappe.session.user && filters.status === 'Open') {
+				return filters.reference_name in assignments.projects ? [{ name: filters.reference_name }] : [];
+			}
+		}
+		
+		return undefined;
+	}
+	
 	populate_filters() {
 		// Popola employee filter
 		const employeeSelect = this.page.main.find('#employee-filter');
+		employeeSelect.find('option:not(:first)').remove();
 		this.filter_options.employees.forEach(emp => {
 			employeeSelect.append(`<option value="${emp.name}">${emp.employee_name}</option>`);
 		});
+		employeeSelect.val(this.filters.employee || '');
 		
 		// Popola project filter
 		const projectSelect = this.page.main.find('#project-filter');
@@ -213,9 +469,11 @@ class AdvancedTimesheetCalendar {
 			this.page.main.find('#add-activity').prop('disabled', true).text('Nessun progetto disponibile');
 		} else {
 			// Popola normalmente i progetti
+			projectSelect.find('option:not(:first)').remove();
 			this.filter_options.projects.forEach(proj => {
 				projectSelect.append(`<option value="${proj.name}">${proj.project_name}</option>`);
 			});
+			projectSelect.val(this.filters.project || '');
 		}
 	}
 	
@@ -288,38 +546,618 @@ class AdvancedTimesheetCalendar {
 		}
 	}
 	
-	apply_filters() {
-		this.filters = {
-			employee: this.page.main.find('#employee-filter').val(),
-			project: this.page.main.find('#project-filter').val()
-		};
-		
+	apply_filters() {
+		this.filters = {
+			employee: this.page.main.find('#employee-filter').val(),
+			project: this.page.main.find('#project-filter').val()
+		};
+		
+		if (this.calendar) {
+			this.calendar.refetchEvents();
+		}
+		
+		if (this.is_capacity_visible()) {
+			this.load_capacity_heatmap();
+		}
+	}
+	
+	load_events(start, end, successCallback, failureCallback) {
+		// Se la finestra e i filtri non sono cambiati si scaricano solo le modifiche dall'ultimo cursore
+		// Vista mensile in modalità riepilogo: totali aggregati invece dei singoli eventi
+		if (this.is_summary_view()) {
+			this.load_summary_events(start, end, successCallback, failureCallback);
+			return;
+		}
+		
+		const window_key = this.make_window_key(start, end);
+		const since = window_key === this.window_key ? this.sync_cursor : null;
+		
+		// Vista mensile o manager senza filtro employee: caricamento progressivo a pagine
+		if (!since && this.should_stream_events()) {
+			this.load_events_paged(start, end, window_key, successCallback, failureCallback);
+			return;
+		}
+		
+		// Finestra già in memoria (visitata o precaricata): mostrata subito e riallineata in background
+		const stored = !since ? this.get_stored_window(window_key) : null;
+		if (stored) {
+			this.window_events = new Map(stored.events.map(event => [event.id, event]));
+			this.window_key = window_key;
+			this.sync_cursor = stored.cursor;
+			successCallback(stored.events);
+			this.revalidate_window(start, end, window_key);
+			this.schedule_prefetch(start, end);
+			return;
+		}
+		
+		frappe.call({
+			method: 'advanced_tc.api.timesheet_details.get_timesheet_changes',
+			args: {
+				start_date: start.toISOString(),
+				end_date: end.toISOString(),
+				filters: JSON.stringify(this.filters),
+				since: since,
+				compact: 1,
+				slim: 1
+			},
+			callback: (r) => {
+				if (!r.message) {
+					failureCallback('Error loading events');
+					return;
+				}
+				
+				const changes = r.message;
+				if (changes.reset) {
+					this.window_events = new Map();
+					this.decode_events(changes.events).forEach(event => this.window_events.set(event.id, event));
+				} else {
+					this.apply_event_changes(this.decode_events(changes.upserts), changes.deleted);
+				}
+				
+				this.window_key = window_key;
+				this.sync_cursor = changes.cursor;
+				successCallback(Array.from(this.window_events.values()));
+				this.store_window(window_key, changes.cursor);
+				this.schedule_prefetch(start, end);
+			},
+			error: (r) => {
+				// Al prossimo caricamento si riparte dalla finestra completa
+				this.window_key = null;
+				failureCallback('Error loading events');
+			}
+		});
+	}
+	
+	make_window_key(start, end) {
+		return JSON.stringify([start.toISOString(), end.toISOString(), this.filters]);
+	}
+	
+	get_stored_window(window_key) {
+		// LRU delle finestre caricate (Map in ordine di utilizzo: la prima è la meno recente)
+		const stored = this.window_store.get(window_key);
+		if (stored) {
+			this.window_store.delete(window_key);
+			this.window_store.set(window_key, stored);
+		}
+		return stored;
+	}
+	
+	store_window(window_key, cursor, events = null, version = null) {
+		const previous = this.window_store.get(window_key);
+		this.window_store.delete(window_key);
+		this.window_store.set(window_key, {
+			events: events || Array.from(this.window_events.values()),
+			cursor: cursor,
+			// La versione vale solo per gli eventi scaricati con get_timesheet_window
+			version: events ? version : (previous && previous.cursor === cursor ? previous.version : null),
+			fetched_at: Date.now()
+		});
+		
+		while (this.window_store.size > 12) {
+			this.window_store.delete(this.window_store.keys().next().value);
+		}
+	}
+	
+	revalidate_window(start, end, window_key) {
+		// Sync incrementale dal cursore della finestra in memoria: applica solo le differenze
+		frappe.call({
+			method: 'advanced_tc.api.timesheet_details.get_timesheet_changes',
+			args: {
+				start_date: start.toISOString(),
+				end_date: end.toISOString(),
+				filters: JSON.stringify(this.filters),
+				since: this.sync_cursor,
+				compact: 1,
+				slim: 1
+			},
+			callback: (r) => {
+				if (!r.message || window_key !== this.window_key) {
+					return;
+				}
+				
+				const changes = r.message;
+				if (changes.reset) {
+					// Cursore scaduto: la finestra in memoria non è più utilizzabile
+					this.window_store.delete(window_key);
+					this.window_key = null;
+					this.refresh_events();
+					return;
+				}
+				
+				const upserts = this.decode_events(changes.upserts);
+				if (upserts.length || changes.deleted.length) {
+					this.patch_calendar_events(upserts, changes.deleted);
+				}
+				this.sync_cursor = changes.cursor;
+				this.store_window(window_key, changes.cursor);
+			}
+		});
+	}
+	
+	schedule_prefetch(start, end) {
+		// Precarica la finestra precedente e la successiva quando il browser è inattivo
+		if (this.should_stream_events() || this.is_summary_view()) {
+			return;
+		}
+		
+		const prefetch_token = this.prefetch_token = (this.prefetch_token || 0) + 1;
+		const run = () => {
+			// Navigazione avvenuta nel frattempo: precaricate le adiacenti della nuova finestra
+			if (prefetch_token !== this.prefetch_token) {
+				return;
+			}
+			
+			const days = Math.round((end - start) / 86400000);
+			[-days, days].forEach(offset => {
+				this.prefetch_window(
+					moment(start).add(offset, 'days').toDate(),
+					moment(end).add(offset, 'days').toDate()
+				);
+			});
+		};
+		
+		if (window.requestIdleCallback) {
+			window.requestIdleCallback(run, { timeout: 3000 });
+		} else {
+			setTimeout(run, 500);
+		}
+	}
+	
+	prefetch_window(start, end) {
+		const window_key = this.make_window_key(start, end);
+		const stored = this.window_store.get(window_key);
+		
+		// Finestra scaricata da poco: nessuna richiesta
+		if (stored && Date.now() - stored.fetched_at < 30000) {
+			return;
+		}
+		
+		// Richiesta condizionale: con la versione invariata il server non restituisce gli eventi
+		frappe.call({
+			method: 'advanced_tc.api.timesheet_details.get_timesheet_window',
+			args: {
+				start_date: start.toISOString(),
+				end_date: end.toISOString(),
+				filters: JSON.stringify(this.filters),
+				version: stored ? stored.version : null,
+				compact: 1,
+				slim: 1
+			},
+			callback: (r) => {
+				// La finestra è diventata quella visualizzata: il suo stato è gestito da load_events
+				if (!r.message || window_key === this.window_key) {
+					return;
+				}
+				
+				if (r.message.not_modified && stored) {
+					stored.cursor = r.message.cursor;
+					stored.fetched_at = Date.now();
+					return;
+				}
+				
+				this.store_window(window_key, r.message.cursor, this.decode_events(r.message.events), r.message.version);
+			}
+		});
+	}
+	
+	is_month_summary_enabled() {
+		// Abilitata di default, disattivabile dalle impostazioni
+		const enabled = this.default_settings.month_summary_mode;
+		return enabled === undefined ? true : !!enabled;
+	}
+	
+	is_summary_view() {
+		const view_type = this.calendar && this.calendar.view ? this.calendar.view.type : null;
+		return view_type === 'dayGridMonth' && this.is_month_summary_enabled();
+	}
+	
+	load_summary_events(start, end, successCallback, failureCallback) {
+		// La finestra dettagliata non è più quella caricata: il prossimo caricamento sarà completo
+		this.window_key = null;
+		this.window_events = new Map();
+		
+		frappe.call({
+			method: 'advanced_tc.api.timesheet_details.get_timesheet_summary',
+			args: {
+				// Ora locale, come salvata nei Timesheet: la finestra mensile va da mezzanotte a mezzanotte
+				start_date: moment(start).format('YYYY-MM-DD HH:mm:ss'),
+				end_date: moment(end).format('YYYY-MM-DD HH:mm:ss'),
+				filters: JSON.stringify(this.filters)
+			},
+			callback: (r) => {
+				if (!r.message) {
+					failureCallback('Error loading summary');
+					return;
+				}
+				successCallback(this.build_summary_events(r.message));
+			},
+			error: (r) => {
+				failureCallback('Error loading summary');
+			}
+		});
+	}
+	
+	build_summary_events(rows) {
+		// Un badge per employee e giorno, con il dettaglio per progetto nelle extendedProps
+		const formatDuration = (hours) => window.TimesheetCalendarUtils
+			? window.TimesheetCalendarUtils.formatDuration(hours)
+			: `${Math.round(hours * 100) / 100}h`;
+		const badges = new Map();
+		
+		rows.forEach(row => {
+			const key = `${row.date}|${row.employee}`;
+			if (!badges.has(key)) {
+				badges.set(key, {
+					date: row.date,
+					employee: row.employee,
+					employee_name: row.employee_name || row.employee,
+					hours: 0,
+					entries: 0,
+					projects: []
+				});
+			}
+			
+			const badge = badges.get(key);
+			badge.hours += row.hours || 0;
+			badge.entries += row.entries || 0;
+			badge.projects.push({
+				project: row.project,
+				project_name: row.project_name || row.project || '-',
+				hours: row.hours || 0
+			});
+		});
+		
+		const single_employee = this.user_permissions.is_employee_only || !!this.filters.employee;
+		
+		return Array.from(badges.values()).map(badge => ({
+			id: `summary:${badge.date}:${badge.employee}`,
+			start: badge.date,
+			allDay: true,
+			editable: false,
+			classNames: ['timesheet-summary-event'],
+			title: single_employee
+				? `${formatDuration(badge.hours)} (${badge.entries})`
+				: `${badge.employee_name}: ${formatDuration(badge.hours)}`,
+			extendedProps: {
+				is_summary: true,
+				employee: badge.employee,
+				employee_name: badge.employee_name,
+				hours: badge.hours,
+				entries: badge.entries,
+				projects: badge.projects
+			}
+		}));
+	}
+	
+	open_summary_day(event) {
+		// Dal riepilogo mensile si passa alla vista giornaliera dell'employee selezionato
+		if (!this.user_permissions.is_employee_only && event.extendedProps.employee) {
+			this.page.main.find('#employee-filter').val(event.extendedProps.employee);
+			this.filters.employee = event.extendedProps.employee;
+		}
+		this.calendar.changeView('timeGridDay', event.start);
+	}
+	
+	apply_event_color(event) {
+		// Gli eventi contengono solo la chiave del progetto: il colore viene dalla mappa locale
+		const props = event.extendedProps || {};
+		if (props.is_summary) {
+			return event;
+		}
+		
+		let color = props.project ? this.project_colors[props.project] : null;
+		if (props.project && !color) {
+			this.request_project_color(props.project);
+		}
+		color = color || '#95a5a6';
+		
+		event.backgroundColor = color;
+		event.borderColor = color;
+		return event;
+	}
+	
+	request_project_color(project) {
+		// Progetti non presenti nella mappa (es. chiusi): richiesti in un'unica chiamata
+		this.pending_color_projects.add(project);
+		if (this.color_fetch_timer) {
+			return;
+		}
+		
+		this.color_fetch_timer = setTimeout(() => {
+			const projects = Array.from(this.pending_color_projects);
+			this.pending_color_projects.clear();
+			this.color_fetch_timer = null;
+			
+			frappe.call({
+				method: 'advanced_tc.api.colors.get_project_colors',
+				args: { projects: JSON.stringify(projects) },
+				callback: (r) => {
+					Object.assign(this.project_colors, r.message || {});
+					this.resolve_event_colors();
+				}
+			});
+		}, 0);
+	}
+	
+	resolve_event_colors() {
+		// Aggiorna il colore degli eventi già mostrati quando la mappa si arricchisce
+		if (!this.calendar) {
+			return;
+		}
+		
+		this.calendar.batchRendering(() => {
+			this.calendar.getEvents().forEach(event => {
+				const color = this.project_colors[event.extendedProps.project];
+				if (color && event.backgroundColor !== color) {
+					event.setProp('backgroundColor', color);
+					event.setProp('borderColor', color);
+				}
+			});
+		});
+	}
+	
+	should_stream_events() {
+		const view_type = this.calendar && this.calendar.view ? this.calendar.view.type : null;
+		return view_type === 'dayGridMonth' || (!!this.user_permissions.is_manager && !this.filters.employee);
+	}
+	
+	load_events_paged(start, end, window_key, successCallback, failureCallback) {
+		// La prima pagina viene mostrata subito, le successive vengono aggiunte man mano
+		const load_token = this.load_token = (this.load_token || 0) + 1;
+		this.window_events = new Map();
+		
+		const load_page = (after, fetched) => {
+			const is_first = !after;
+			
+			frappe.call({
+				method: 'advanced_tc.api.timesheet_details.get_timesheet_details_page',
+				args: {
+					start_date: start.toISOString(),
+					end_date: end.toISOString(),
+					filters: JSON.stringify(this.filters),
+					after: after ? JSON.stringify(after) : null,
+					fetched: fetched,
+					compact: 1,
+					slim: 1
+				},
+				callback: (r) => {
+					// Una navigazione successiva ha reso obsoleto questo caricamento
+					if (load_token !== this.load_token) {
+						return;
+					}
+					
+					if (!r.message) {
+						if (is_first) {
+							failureCallback('Error loading events');
+						}
+						return;
+					}
+					
+					const page = r.message;
+					page.events = this.decode_events(page.events);
+					page.events.forEach(event => this.window_events.set(event.id, event));
+					
+					if (is_first) {
+						this.window_key = window_key;
+						this.sync_cursor = page.cursor;
+						successCallback(page.events);
+					} else {
+						const source = this.calendar.getEventSources()[0];
+						this.calendar.batchRendering(() => {
+							page.events.forEach(event => this.calendar.addEvent(this.apply_event_color({ ...event }), source));
+						});
+					}
+					
+					if (page.next) {
+						load_page(page.next, fetched + page.events.length);
+					} else if (page.truncated) {
+						frappe.show_alert({
+							message: 'Troppe attività nel periodo: applica un filtro per vederle tutte',
+							indicator: 'orange'
+						}, 6);
+					}
+				},
+				error: (r) => {
+					if (is_first) {
+						this.window_key = null;
+						failureCallback('Error loading events');
+					}
+				}
+			});
+		};
+		
+		load_page(null, 0);
+	}
+	
+	decode_events(payload) {
+		// Espande il formato colonnare (compact=1) negli eventi FullCalendar
+		if (!payload || Array.isArray(payload)) {
+			return payload || [];
+		}
+		
+		const columns = payload.columns;
+		const lookups = payload.lookups || {};
+		const lookup_columns = {
+			employee: ['employees', 'employee_name'],
+			project: ['projects', 'project_name'],
+			task: ['tasks', 'task_subject'],
+			activity_type: ['activity_types', null],
+			company: ['companies', null]
+		};
+		const plain_columns = ['timesheet', 'hours', 'docstatus', 'description']
+			.filter(fieldname => columns[fieldname]);
+		
+		const events = [];
+		for (let i = 0; i < payload.count; i++) {
+			const props = {};
+			
+			plain_columns.forEach(fieldname => {
+				props[fieldname] = columns[fieldname][i];
+			});
+			
+			Object.entries(lookup_columns).forEach(([fieldname, [lookup, label]]) => {
+				if (!columns[fieldname]) {
+					return;
+				}
+				const index = columns[fieldname][i];
+				const entry = index === null || index === undefined ? null : lookups[lookup][index];
+				if (label && Array.isArray(entry)) {
+					props[fieldname] = entry[0];
+					props[label] = entry[1];
+				} else {
+					props[fieldname] = entry;
+				}
+			});
+			
+			if (!columns.timesheet) {
+				// Evento slim: ore e nomi ricavati localmente, il resto arriva da load_event_details
+				this.fill_slim_event_props(props, columns.start[i], columns.end[i]);
+			}
+			
+			events.push({
+				id: columns.id[i],
+				title: `${props.project || ''} - ${props.activity_type || ''}`,
+				start: columns.start[i],
+				end: columns.end[i],
+				extendedProps: props
+			});
+		}
+		
+		return events;
+	}
+	
+	apply_event_changes(upserts = [], deleted = []) {
+		// Applica le modifiche incrementali alla finestra di eventi caricata
+		if (!this.window_events) {
+			this.window_events = new Map();
+		}
+		
+		deleted.forEach(id => {
+			this.window_events.delete(id);
+			this.forget_event_details(id);
+		});
+		upserts.forEach(event => {
+			this.window_events.set(event.id, event);
+			// Gli eventi completi aggiornano la cache dei dettagli, quelli slim la invalidano
+			if (event.extendedProps && event.extendedProps.timesheet) {
+				this.remember_event_details(event.id, event.extendedProps);
+			} else {
+				this.forget_event_details(event.id);
+			}
+		});
+	}
+	
+	fill_slim_event_props(props, start, end) {
+		props.is_slim = true;
+		props.hours = (new Date(end) - new Date(start)) / 3600000;
+		
+		if (!this.slim_names) {
+			this.slim_names = { employees: {}, projects: {} };
+			const options = this.filter_options || {};
+			(options.employees || []).forEach(emp => { this.slim_names.employees[emp.name] = emp.employee_name; });
+			(options.projects || []).forEach(proj => { this.slim_names.projects[proj.name] = proj.project_name; });
+		}
+		
+		props.employee_name = this.slim_names.employees[props.employee] || props.employee;
+		props.project_name = this.slim_names.projects[props.project] || props.project;
+	}
+	
+	remember_event_details(id, details) {
+		// Cache LRU dei dettagli (Map in ordine di inserimento: il primo elemento è il meno recente)
+		if (!this.event_details) {
+			this.event_details = new Map();
+		}
+		
+		this.event_details.delete(id);
+		this.event_details.set(id, details);
+		
+		if (this.event_details.size > 2000) {
+			this.event_details.delete(this.event_details.keys().next().value);
+		}
+	}
+	
+	forget_event_details(id) {
+		if (this.event_details) {
+			this.event_details.delete(id);
+		}
+	}
+	
+	load_event_details(events, callback) {
+		// Completa gli eventi slim con i dettagli (dalla cache o con chiamate batch al server)
+		const slim_events = events.filter(event => event.extendedProps.is_slim);
+		const cached = this.event_details || new Map();
+		const missing = slim_events.filter(event => !cached.has(event.id)).map(event => event.id);
+		
+		const apply = () => {
+			this.calendar.batchRendering(() => {
+				slim_events.forEach(event => {
+					const details = this.event_details && this.event_details.get(event.id);
+					if (!details) {
+						return;
+					}
+					Object.entries(details).forEach(([key, value]) => event.setExtendedProp(key, value));
+					event.setExtendedProp('is_slim', false);
+				});
+			});
+			callback();
+		};
+		
+		if (!missing.length) {
+			apply();
+			return;
+		}
+		
+		// Richieste da al più 500 attività (limite del server)
+		const chunks = [];
+		for (let i = 0; i < missing.length; i += 500) {
+			chunks.push(missing.slice(i, i + 500));
+		}
+		
+		let pending = chunks.length;
+		chunks.forEach(names => {
+			frappe.call({
+				method: 'advanced_tc.api.timesheet_details.get_timesheet_detail_info',
+				args: { names: names },
+				callback: (r) => {
+					Object.entries(r.message || {}).forEach(([id, details]) => this.remember_event_details(id, details));
+				},
+				always: () => {
+					pending -= 1;
+					if (!pending) {
+						apply();
+					}
+				}
+			});
+		});
+	}
+	
+	refresh_events() {
+		// Riallinea il calendario dopo una modifica (sync incrementale tramite load_events)
 		if (this.calendar) {
 			this.calendar.refetchEvents();
 		}
 	}
 	
-	load_events(start, end, successCallback, failureCallback) {
-		frappe.call({
-			method: 'advanced_tc.api.timesheet_details.get_timesheet_details',
-			args: {
-				start_date: start.toISOString(),
-				end_date: end.toISOString(),
-				filters: JSON.stringify(this.filters)
-			},
-			callback: (r) => {
-				if (r.message) {
-					successCallback(r.message);
-				} else {
-					failureCallback('Error loading events');
-				}
-			},
-			error: (r) => {
-				failureCallback('Error loading events');
-			}
-		});
-	}
-	
 	handle_time_selection(info) {
 		// Calcola la durata della selezione in minuti
 		const duration = (info.end - info.start) / (1000 * 60);
@@ -360,7 +1198,19 @@ class AdvancedTimesheetCalendar {
 	}
 	
 	show_activity_dialog_with_break(event = null, start_time = null, end_time = null) {
-		// Recupera l'employee ID per l'utente corrente
+		// L'employee dell'utente corrente è già nel bootstrap
+		this.with_current_employee((employee_id) => {
+			this.create_dialog_with_break.call(this, event, start_time, end_time, employee_id);
+		});
+	}
+	
+	with_current_employee(callback) {
+		if (this.bootstrap) {
+			callback(this.user_permissions.current_employee || null);
+			return;
+		}
+		
+		// Bootstrap non ancora caricato: recupera l'employee ID per l'utente corrente
 		frappe.call({
 			method: 'frappe.client.get_list',
 			args: {
@@ -371,13 +1221,13 @@ class AdvancedTimesheetCalendar {
 				fields: ['name']
 			},
 			callback: (r) => {
-				const employee_id = r.message && r.message.length > 0 ? r.message[0].name : null;
-				this.create_dialog_with_break.call(this, event, start_time, end_time, employee_id);
+				callback(r.message && r.message.length > 0 ? r.message[0].name : null);
 			}
 		});
 	}
 	
 	create_dialog_with_break(event, start_time, end_time, employee_id) {
+		const calendar = this;
 		const is_edit = !!event;
 		const event_data = event ? event.extendedProps : {};
 		
@@ -507,7 +1357,7 @@ class AdvancedTimesheetCalendar {
 			
 			if (task && employee) {
 				// Ottieni il progetto della task
-				frappe.call({
+				calendar.call_with_bootstrap({
 					method: 'advanced_tc.api.timesheet_details.get_task_project',
 					args: { task_name: task },
 					callback: (r) => {
@@ -517,7 +1367,7 @@ class AdvancedTimesheetCalendar {
 							// Se il progetto della task è diverso da quello attualmente selezionato
 							// verifica se l'employee è assegnato al progetto della task
 							if (taskProject !== currentProject) {
-								frappe.call({
+								calendar.call_with_bootstrap({
 									method: 'frappe.client.get_list',
 									args: {
 										doctype: 'ToDo',
@@ -563,7 +1413,7 @@ class AdvancedTimesheetCalendar {
 					
 					if (project && employee) {
 						// Verifica se l'employee ha task per questo progetto
-						frappe.call({
+						calendar.call_with_bootstrap({
 							method: 'advanced_tc.api.timesheet_details.check_employee_has_tasks',
 							args: {
 								employee: employee,
@@ -609,57 +1459,13 @@ class AdvancedTimesheetCalendar {
 			}, 'btn-danger');
 		}
 		
-		// Sistema di debouncing per prevenire race conditions
-		let timesheetUpdateTimeout = null;
-		let lastTimesheetCall = null;
-		
-		// Funzione per gestire l'aggiornamento del timesheet con debouncing
-		const updateTimesheet = (employee, fromTime, delay = 300) => {
-			// Cancella il timeout precedente se esiste
-			if (timesheetUpdateTimeout) {
-				clearTimeout(timesheetUpdateTimeout);
-			}
-			
-			// Crea una chiave unica per questa combinazione
-			const callKey = `${employee}-${fromTime}`;
-			
-			// Se è la stessa chiamata dell'ultima, ignora
-			if (lastTimesheetCall === callKey) {
-				return;
+		// Timesheet settimanale risolto dal backend al salvataggio (create_timesheet_details):
+		// l'apertura del dialog non richiede chiamate al server. Cambiando employee o data
+		// il timesheet eventualmente preimpostato non è più valido.
+		const updateTimesheet = () => {
+			if (!is_edit) {
+				dialog.set_value('timesheet', '');
 			}
-			
-			timesheetUpdateTimeout = setTimeout(() => {
-				if (employee && fromTime && !is_edit) {
-					lastTimesheetCall = callKey;
-					
-					// Calcola l'inizio della settimana per la data dell'attività
-					const activityDate = new Date(fromTime);
-					const weekStart = this.getWeekStartDate(activityDate);
-					const weekStartStr = weekStart.getFullYear() + '-' + 
-										 String(weekStart.getMonth() + 1).padStart(2, '0') + '-' + 
-										 String(weekStart.getDate()).padStart(2, '0');
-					
-					// Ottieni o crea il timesheet settimanale
-					frappe.call({
-						method: 'advanced_tc.api.timesheet_details.get_or_create_timesheet',
-						args: {
-							employee: employee,
-							start_date: weekStartStr,
-							company: frappe.defaults.get_user_default('Company') || frappe.defaults.get_global_default('default_company')
-						},
-						callback: (r) => {
-							if (r.message && r.message.name) {
-								dialog.set_value('timesheet', r.message.name);
-							} else {
-								// Lascia il campo timesheet vuoto, sarà gestito dal backend
-								dialog.set_value('timesheet', '');
-							}
-							// Reset della chiave dopo il completamento
-							lastTimesheetCall = null;
-						}
-					});
-				}
-			}, delay);
 		};
 		
 		// Event listener per employee - rimuove le chiamate duplicate
@@ -671,11 +1477,7 @@ class AdvancedTimesheetCalendar {
 				dialog.set_value('project', '');
 				dialog.set_value('task', '');
 				
-				// Aggiorna il timesheet con debouncing
-				const fromTime = dialog.get_value('from_time');
-				if (fromTime) {
-					updateTimesheet(employee, fromTime);
-				}
+				updateTimesheet();
 			}
 		};
 		
@@ -710,7 +1512,7 @@ class AdvancedTimesheetCalendar {
 					
 					if (project && employee) {
 						// Verifica se l'employee ha task per questo progetto
-						frappe.call({
+						calendar.call_with_bootstrap({
 							method: 'advanced_tc.api.timesheet_details.check_employee_has_tasks',
 							args: {
 								employee: employee,
@@ -731,26 +1533,11 @@ class AdvancedTimesheetCalendar {
 			}
 		}, 500);
 		
-		// Event listener per from_time - utilizza debouncing
+		// Event listener per from_time: la settimana può cambiare
 		dialog.fields_dict.from_time.df.onchange = () => {
-			const employee = dialog.get_value('employee');
-			const fromTime = dialog.get_value('from_time');
-			
-			if (employee && fromTime) {
-				updateTimesheet(employee, fromTime);
-			}
+			updateTimesheet();
 		};
 		
-		// Inizializzazione iniziale del timesheet se entrambi i valori sono già presenti
-		setTimeout(() => {
-			const employee = dialog.get_value('employee');
-			const fromTime = dialog.get_value('from_time');
-			
-			if (employee && fromTime && !is_edit) {
-				updateTimesheet(employee, fromTime, 100); // Delay ridotto per inizializzazione
-			}
-		}, 50);
-		
 		dialog.show();
 	}
 
@@ -778,7 +1565,8 @@ class AdvancedTimesheetCalendar {
 			default_break_end: '14:00:00',
 			default_work_start: '09:30:00',
 			default_work_end: '18:30:00',
-			auto_enable_break: true
+			auto_enable_break: true,
+			month_summary_mode: true
 		};
 	}
 
@@ -789,7 +1577,8 @@ class AdvancedTimesheetCalendar {
 			default_work_end: settings.default_work_end.substring(0, 5),
 			default_break_start: settings.default_break_start.substring(0, 5),
 			default_break_end: settings.default_break_end.substring(0, 5),
-			auto_enable_break: settings.auto_enable_break
+			auto_enable_break: settings.auto_enable_break,
+			month_summary_mode: settings.month_summary_mode
 		};
 		
 
@@ -858,6 +1647,17 @@ class AdvancedTimesheetCalendar {
 					label: 'Fine Pausa',
 					default: this.default_settings.default_break_end,
 					description: 'Orario di fine pausa predefinito'
+				},
+				{
+					fieldtype: 'Section Break',
+					label: 'Vista Mensile'
+				},
+				{
+					fieldtype: 'Check',
+					fieldname: 'month_summary_mode',
+					label: 'Mostra Riepilogo Ore nella Vista Mensile',
+					default: this.is_month_summary_enabled() ? 1 : 0,
+					description: 'Mostra i totali di ore per dipendente e giorno invece delle singole attività'
 				}
 			],
 			primary_action_label: 'Salva Impostazioni',
@@ -889,6 +1689,7 @@ class AdvancedTimesheetCalendar {
 			}
 				
 				this.save_default_settings(values);
+				this.refresh_events();
 				frappe.show_alert({
 			message: 'Impostazioni salvate correttamente!',
 			indicator: 'green'
@@ -904,7 +1705,8 @@ class AdvancedTimesheetCalendar {
 				default_break_end: '14:00:00',
 				default_work_start: '09:30:00',
 				default_work_end: '18:30:00',
-				auto_enable_break: true
+				auto_enable_break: true,
+				month_summary_mode: true
 			};
 			
 			// Aggiorna i valori nel dialog
@@ -921,26 +1723,14 @@ class AdvancedTimesheetCalendar {
 		dialog.show();
 	}
 
-	// All'inizio della funzione show_activity_dialog, aggiungi:
 	show_activity_dialog(event = null, start_time = null, end_time = null) {
-	// Recupera l'employee ID per l'utente corrente
-	frappe.call({
-	method: 'frappe.client.get_list',
-	args: {
-	doctype: 'Employee',
-	filters: {
-	'user_id': frappe.session.user
-	},
-	fields: ['name']
-	},
-	callback: (r) => {
-	const employee_id = r.message && r.message.length > 0 ? r.message[0].name : null;
-	this.create_dialog.call(this, event, start_time, end_time, employee_id);
-	}
-	});
+		this.with_current_employee((employee_id) => {
+			this.create_dialog.call(this, event, start_time, end_time, employee_id);
+		});
 	}
 	
 	create_dialog(event, start_time, end_time, employee_id) {
+	const calendar = this;
 	const is_edit = !!event;
 	const event_data = event ? event.extendedProps : {};
 	
@@ -1068,7 +1858,7 @@ class AdvancedTimesheetCalendar {
 		const employee = dialog.get_value('employee');
 		if (task && employee) {
 			// Ottieni il progetto della task
-			frappe.call({
+			calendar.call_with_bootstrap({
 				method: 'advanced_tc.api.timesheet_details.get_task_project',
 				args: { task_name: task },
 				callback: (r) => {
@@ -1076,7 +1866,7 @@ class AdvancedTimesheetCalendar {
 						const taskProject = r.message;
 						
 						// Verifica se l'employee è assegnato al progetto della task
-						frappe.call({
+						calendar.call_with_bootstrap({
 							method: 'frappe.client.get_list',
 							args: {
 								doctype: 'ToDo',
@@ -1115,7 +1905,7 @@ class AdvancedTimesheetCalendar {
 		
 		if (project && employee) {
 			// Verifica se l'employee ha task per questo progetto
-			frappe.call({
+			calendar.call_with_bootstrap({
 				method: 'advanced_tc.api.timesheet_details.check_employee_has_tasks',
 				args: {
 					employee: employee,
@@ -1197,7 +1987,7 @@ class AdvancedTimesheetCalendar {
 				
 				if (project && employee) {
 					// Verifica se l'employee ha task per questo progetto
-					frappe.call({
+					calendar.call_with_bootstrap({
 						method: 'advanced_tc.api.timesheet_details.check_employee_has_tasks',
 						args: {
 							employee: employee,
@@ -1282,16 +2072,6 @@ class AdvancedTimesheetCalendar {
 
 	// Trigger the has_break change event to initialize the visibility
 	dialog.fields_dict.has_break.df.onchange();
-	
-	// Inizializzazione iniziale del timesheet se entrambi i valori sono già presenti
-	setTimeout(() => {
-		const employee = dialog.get_value('employee');
-		const fromTime = dialog.get_value('from_time');
-		
-		if (employee && fromTime && !is_edit) {
-			updateTimesheetCD(employee, fromTime, 100); // Delay ridotto per inizializzazione
-		}
-	}, 50);
 
 	// Event listener per break_start
 	dialog.fields_dict.break_start.df.onchange = () => {
@@ -1370,57 +2150,12 @@ class AdvancedTimesheetCalendar {
 		}
 	};
 
-	// Sistema di debouncing per prevenire race conditions (create_dialog)
-	let timesheetUpdateTimeoutCD = null;
-	let lastTimesheetCallCD = null;
-	
-	// Funzione per gestire l'aggiornamento del timesheet con debouncing (create_dialog)
-	const updateTimesheetCD = (employee, fromTime, delay = 300) => {
-		// Cancella il timeout precedente se esiste
-		if (timesheetUpdateTimeoutCD) {
-			clearTimeout(timesheetUpdateTimeoutCD);
-		}
-		
-		// Crea una chiave unica per questa combinazione
-		const callKey = `${employee}-${fromTime}`;
-		
-		// Se è la stessa chiamata dell'ultima, ignora
-		if (lastTimesheetCallCD === callKey) {
-			return;
+	// Timesheet settimanale risolto dal backend al salvataggio (create_timesheet_details):
+	// l'apertura del dialog non richiede chiamate al server
+	const updateTimesheetCD = () => {
+		if (!is_edit) {
+			dialog.set_value('timesheet', '');
 		}
-		
-		timesheetUpdateTimeoutCD = setTimeout(() => {
-			if (employee && fromTime && !is_edit) {
-				lastTimesheetCallCD = callKey;
-				
-				// Calcola l'inizio della settimana per la data dell'attività
-				const activityDate = new Date(fromTime);
-				const weekStart = this.getWeekStartDate(activityDate);
-				const weekStartStr = weekStart.getFullYear() + '-' + 
-									 String(weekStart.getMonth() + 1).padStart(2, '0') + '-' + 
-									 String(weekStart.getDate()).padStart(2, '0');
-				
-				// Ottieni o crea il timesheet settimanale
-				frappe.call({
-					method: 'advanced_tc.api.timesheet_details.get_or_create_timesheet',
-					args: {
-						employee: employee,
-						start_date: weekStartStr,
-						company: frappe.defaults.get_user_default('Company') || frappe.defaults.get_global_default('default_company')
-					},
-					callback: (r) => {
-						if (r.message && r.message.name) {
-							dialog.set_value('timesheet', r.message.name);
-						} else {
-							// Lascia il campo timesheet vuoto, sarà gestito dal backend
-							dialog.set_value('timesheet', '');
-						}
-						// Reset della chiave dopo il completamento
-						lastTimesheetCallCD = null;
-					}
-				});
-			}
-		}, delay);
 	};
 	
 	// Event listener per employee
@@ -1432,22 +2167,13 @@ class AdvancedTimesheetCalendar {
 			dialog.set_value('project', '');
 			dialog.set_value('task', '');
 			
-			// Aggiorna il timesheet con debouncing
-			const fromTime = dialog.get_value('from_time');
-			if (fromTime) {
-				updateTimesheetCD(employee, fromTime);
-			}
+			updateTimesheetCD();
 		}
 	};
 	
 	// Event listener per from_time per aggiornare il timesheet quando cambia la data
 	dialog.fields_dict.from_time.df.onchange = () => {
-		const employee = dialog.get_value('employee');
-		const fromTime = dialog.get_value('from_time');
-		
-		if (employee && fromTime) {
-			updateTimesheetCD(employee, fromTime);
-		}
+		updateTimesheetCD();
 		
 		// Aggiorna anche i limiti dei break times
 		updateBreakTimeLimits();
@@ -1496,46 +2222,28 @@ create_activity(values, dialog) {
         delete secondActivity.break_start;
         delete secondActivity.break_end;
 
-        // Crea la prima attività
-        
+        if (this.is_async_writes_enabled()) {
+            this.enqueue_activities([firstActivity, secondActivity], dialog);
+            return;
+        }
+
+        // Entrambe le attività vengono create in un'unica chiamata e transazione
         frappe.call({
-			method: 'advanced_tc.api.timesheet_details.create_timesheet_detail',
+            method: 'advanced_tc.api.timesheet_details.create_timesheet_details_bulk',
             args: {
-                data: JSON.stringify(firstActivity)
+                entries: JSON.stringify([firstActivity, secondActivity])
             },
             callback: (r) => {
                 if (r.message && r.message.success) {
-                    // Se la prima attività è creata con successo, usa il timesheet restituito per la seconda
-                    if (r.message.timesheet_name) {
-                        secondActivity.timesheet = r.message.timesheet_name;
-                    }
-                    
-                    frappe.call({
-                        method: 'advanced_tc.api.timesheet_details.create_timesheet_detail',
-                        args: {
-                            data: JSON.stringify(secondActivity)
-                        },
-                        callback: (r2) => {
-                            if (r2.message && r2.message.success) {
-                                frappe.show_alert({
-                                    message: 'Activities created successfully',
-                                    indicator: 'green'
-                                }, 4);
-                                dialog.hide();
-                                setTimeout(() => {
-                                    this.calendar.refetchEvents();
-                                }, 1500);
-                            } else {
-                                frappe.show_alert({
-                                    message: 'Error creating second activity',
-                                    indicator: 'red'
-                                }, 5);
-                            }
-                        }
-                    });
+                    frappe.show_alert({
+                        message: 'Activities created successfully',
+                        indicator: 'green'
+                    }, 4);
+                    dialog.hide();
+                    this.refresh_events();
                 } else {
                     frappe.show_alert({
-                        message: 'Error creating first activity',
+                        message: 'Error creating activities',
                         indicator: 'red'
                     }, 5);
                 }
@@ -1548,7 +2256,10 @@ create_activity(values, dialog) {
         delete activity.break_start;
         delete activity.break_end;
         
-
+        if (this.is_async_writes_enabled()) {
+            this.enqueue_activities([activity], dialog);
+            return;
+        }
         
         frappe.call({
             method: 'advanced_tc.api.timesheet_details.create_timesheet_detail',
@@ -1562,9 +2273,7 @@ create_activity(values, dialog) {
                         indicator: 'green'
                     }, 4);
                     dialog.hide();
-                    setTimeout(() => {
-                        this.calendar.refetchEvents();
-                    }, 1500);
+                    this.refresh_events();
                 } else {
                     frappe.show_alert({
                         message: 'Error creating activity',
@@ -1576,6 +2285,99 @@ create_activity(values, dialog) {
     }
 }
 
+is_async_writes_enabled() {
+    // Modalità asincrona abilitata dal site_config (advanced_tc_async_writes), comunicata dal bootstrap
+    return !!(this.bootstrap && this.bootstrap.settings && this.bootstrap.settings.async_writes);
+}
+
+enqueue_activities(entries, dialog) {
+    // Scrittura accodata: il server valida e risponde subito, le attività compaiono come provvisorie
+    // finché l'esito non arriva con l'evento realtime advanced_tc_write_result
+    frappe.call({
+        method: 'advanced_tc.api.write_queue.enqueue_timesheet_details',
+        args: {
+            entries: JSON.stringify(entries)
+        },
+        callback: (r) => {
+            if (!r.message || !r.message.success) {
+                frappe.show_alert({
+                    message: 'Error creating activity',
+                    indicator: 'red'
+                }, 5);
+                return;
+            }
+            
+            dialog.hide();
+            
+            if (!r.message.queued) {
+                // Modalità asincrona disattivata nel frattempo: le attività sono già state create
+                this.refresh_events();
+                return;
+            }
+            
+            r.message.provisional_ids.forEach((id, index) => {
+                this.add_provisional_event(id, entries[index]);
+            });
+            
+            frappe.show_alert({
+                message: 'Salvataggio in corso...',
+                indicator: 'blue'
+            }, 3);
+        }
+    });
+}
+
+add_provisional_event(id, entry) {
+    if (!this.calendar) {
+        return;
+    }
+    
+    // Evento senza sorgente: non viene rimosso dai refetch finché non arriva l'esito
+    this.calendar.addEvent({
+        id: id,
+        title: `${entry.project || ''} - ${entry.activity_type || ''}`,
+        start: entry.from_time,
+        end: entry.to_time,
+        editable: false,
+        classNames: ['timesheet-pending-event'],
+        extendedProps: {
+            ...entry,
+            is_pending: true
+        }
+    });
+}
+
+handle_write_result(result) {
+    if (!result) {
+        return;
+    }
+    
+    const provisional_ids = result.success
+        ? (result.created || []).map(item => item.provisional_id)
+        : (result.provisional_ids || []);
+    
+    provisional_ids.forEach(id => {
+        const event = this.calendar && this.calendar.getEventById(id);
+        if (event) {
+            event.remove();
+        }
+    });
+    
+    if (result.success) {
+        frappe.show_alert({
+            message: provisional_ids.length > 1 ? 'Activities created successfully' : 'Activity created successfully',
+            indicator: 'green'
+        }, 4);
+        this.refresh_events();
+    } else {
+        frappe.msgprint({
+            title: 'Errore',
+            message: result.error || 'Error creating activity',
+            indicator: 'red'
+        });
+    }
+}
+
 update_activity_data(id, data, dialog = null) {
     frappe.call({
 				method: 'advanced_tc.api.timesheet_details.update_timesheet_detail',
@@ -1591,9 +2393,7 @@ update_activity_data(id, data, dialog = null) {
                     message: 'Attività aggiornata correttamente',
                     indicator: 'green'
                 }, 4);
-                setTimeout(() => {
-                    this.calendar.refetchEvents();
-                }, 1500);
+                this.refresh_events();
             } else {
                 frappe.show_alert({
                     message: 'Errore durante la modifica',
@@ -1618,9 +2418,7 @@ delete_activity(id, dialog) {
  								indicator: 'green'
  							}, 4);
 							dialog.hide();
-							setTimeout(() => {
-								this.calendar.refetchEvents();
-							}, 1500);
+							this.refresh_events();
 						} else {
 							frappe.show_alert({
  								message: 'Error deleting activity',
@@ -1633,6 +2431,326 @@ delete_activity(id, dialog) {
 		);
 	}
 	
+	show_export_dialog() {
+		// Periodo e filtri correnti del calendario, aggregati lato server
+		const view = this.calendar ? this.calendar.view : null;
+		if (!view) {
+			return;
+		}
+		
+		const dialog = new frappe.ui.Dialog({
+			title: 'Esporta Ore',
+			fields: [
+				{
+					fieldtype: 'HTML',
+					fieldname: 'period',
+					options: `<p class="text-muted">Periodo: ${moment(view.activeStart).format('DD/MM/YYYY')} - ${moment(view.activeEnd).subtract(1, 'days').format('DD/MM/YYYY')}</p>`
+				},
+				{
+					fieldtype: 'Section Break',
+					label: 'Raggruppa per'
+				},
+				{ fieldtype: 'Check', fieldname: 'employee', label: 'Employee', default: 1 },
+				{ fieldtype: 'Check', fieldname: 'project', label: 'Project', default: 1 },
+				{ fieldtype: 'Check', fieldname: 'task', label: 'Task' },
+				{ fieldtype: 'Column Break' },
+				{ fieldtype: 'Check', fieldname: 'activity_type', label: 'Activity Type' },
+				{ fieldtype: 'Check', fieldname: 'week', label: 'Settimana' },
+				{ fieldtype: 'Check', fieldname: 'date', label: 'Giorno' },
+				{
+					fieldtype: 'Section Break'
+				},
+				{
+					fieldtype: 'Select',
+					fieldname: 'file_format',
+					label: 'Formato',
+					options: 'csv\nxlsx',
+					default: 'csv'
+				}
+			],
+			primary_action_label: 'Scarica',
+			primary_action: (values) => {
+				const group_by = ['employee', 'project', 'task', 'activity_type', 'week', 'date']
+					.filter(dimension => values[dimension]);
+				
+				const params = new URLSearchParams({
+					start_date: moment(view.activeStart).format('YYYY-MM-DD HH:mm:ss'),
+					end_date: moment(view.activeEnd).format('YYYY-MM-DD HH:mm:ss'),
+					filters: JSON.stringify(this.filters || {}),
+					group_by: group_by.join(','),
+					file_format: values.file_format
+				});
+				
+				// Download diretto: il file viene generato ed inviato in streaming dal server
+				window.open(`/api/method/advanced_tc.api.reports.export_timesheet_report?${params.toString()}`);
+				dialog.hide();
+			}
+		});
+		
+		dialog.show();
+	}
+	
+	is_capacity_visible() {
+		return this.page.main.find('#capacity-heatmap').is(':visible');
+	}
+	
+	show_capacity_heatmap() {
+		// Parte dalla settimana visualizzata nel calendario
+		const view_start = this.calendar ? this.calendar.view.currentStart : new Date();
+		this.capacity_start = moment(view_start).startOf('isoWeek');
+		
+		this.page.main.find('#calendar').hide();
+		this.page.main.find('#capacity-heatmap').show();
+		this.load_capacity_heatmap();
+	}
+	
+	hide_capacity_heatmap() {
+		this.page.main.find('#capacity-heatmap').hide();
+		this.page.main.find('#calendar').show();
+		
+		if (this.calendar) {
+			this.calendar.updateSize();
+		}
+	}
+	
+	shift_capacity_heatmap(direction) {
+		const weeks = parseInt(this.page.main.find('#capacity-weeks').val(), 10);
+		this.capacity_start = moment(this.capacity_start).add(direction * weeks, 'weeks');
+		this.load_capacity_heatmap();
+	}
+	
+	load_capacity_heatmap() {
+		const weeks = parseInt(this.page.main.find('#capacity-weeks').val(), 10);
+		const start = moment(this.capacity_start);
+		const end = moment(start).add(weeks, 'weeks');
+		const request_key = `${start.format('YYYY-MM-DD')}|${weeks}|${JSON.stringify(this.filters || {})}`;
+		this.capacity_request = request_key;
+		
+		this.page.main.find('.capacity-title').text(
+			`${start.format('DD/MM/YYYY')} - ${moment(end).subtract(1, 'days').format('DD/MM/YYYY')}`
+		);
+		
+		// Un'unica chiamata aggregata: ore per employee e giorno dalla tabella dei totali giornalieri
+		frappe.call({
+			method: 'advanced_tc.api.capacity.get_capacity_heatmap',
+			args: {
+				start_date: start.format('YYYY-MM-DD'),
+				end_date: end.format('YYYY-MM-DD'),
+				filters: this.filters || {}
+			},
+			callback: (r) => {
+				// Risposta di una richiesta superata da una successiva (navigazione rapida)
+				if (this.capacity_request !== request_key || !r.message) {
+					return;
+				}
+				this.render_capacity_heatmap(r.message);
+			}
+		});
+	}
+	
+	get_expected_daily_hours() {
+		// Ore attese in un giorno lavorativo: orario di lavoro meno la pausa (se attiva di default)
+		const to_minutes = (time) => {
+			const [hours, minutes] = (time || '00:00').split(':').map(Number);
+			return hours * 60 + minutes;
+		};
+		
+		const settings = this.default_settings || {};
+		let minutes = to_minutes(settings.default_work_end) - to_minutes(settings.default_work_start);
+		
+		if (settings.auto_enable_break && settings.default_break_start && settings.default_break_end) {
+			minutes -= to_minutes(settings.default_break_end) - to_minutes(settings.default_break_start);
+		}
+		
+		return Math.max(minutes, 0) / 60;
+	}
+	
+	get_capacity_level(hours, expected) {
+		if (!expected) {
+			return hours > 0 ? 'over' : 'off';
+		}
+		
+		const ratio = hours / expected;
+		if (ratio === 0) {
+			return 'empty';
+		}
+		if (ratio < 0.5) {
+			return 'low';
+		}
+		if (ratio < 0.9) {
+			return 'partial';
+		}
+		if (ratio <= 1.1) {
+			return 'full';
+		}
+		return 'over';
+	}
+	
+	render_capacity_heatmap(data) {
+		const expected_daily = this.get_expected_daily_hours();
+		const dates = data.dates.map(d => moment(d));
+		// Sabato e domenica non hanno ore attese
+		const expected = dates.map(d => d.isoWeekday() > 5 ? 0 : expected_daily);
+		const expected_total = expected.reduce((sum, hours) => sum + hours, 0);
+		const format_hours = (hours) => Math.round(hours * 10) / 10;
+		
+		const header = dates.map(d => {
+			const classes = ['capacity-day'];
+			if (d.isoWeekday() === 1) {
+				classes.push('capacity-week-start');
+			}
+			return `<th class="${classes.join(' ')}" title="${d.format('dddd DD/MM/YYYY')}">${d.format('DD')}<br>${d.format('dd')}</th>`;
+		}).join('');
+		
+		// HTML costruito in un'unica stringa: centinaia di employee senza un nodo per operazione
+		const body = data.rows.map(([employee, employee_name, hours]) => {
+			const total = hours.reduce((sum, value) => sum + value, 0);
+			const cells = hours.map((value, index) => {
+				const level = this.get_capacity_level(value, expected[index]);
+				const week_class = dates[index].isoWeekday() === 1 ? ' capacity-week-start' : '';
+				const title = `${frappe.utils.escape_html(employee_name || employee)} - ${dates[index].format('DD/MM/YYYY')}: ${format_hours(value)}h / ${format_hours(expected[index])}h`;
+				return `<td class="capacity-cell capacity-${level}${week_class}" title="${title}">${value ? format_hours(value) : ''}</td>`;
+			}).join('');
+			const total_level = this.get_capacity_level(total, expected_total);
+			
+			return `<tr>
+				<th class="capacity-employee" title="${frappe.utils.escape_html(employee)}">${frappe.utils.escape_html(employee_name || employee)}</th>
+				${cells}
+				<td class="capacity-total capacity-${total_level}">${format_hours(total)} / ${format_hours(expected_total)}</td>
+			</tr>`;
+		}).join('');
+		
+		const grid = this.page.main.find('.capacity-grid');
+		if (!data.rows.length) {
+			grid.html('<p class="text-muted">Nessun employee da visualizzare.</p>');
+			return;
+		}
+		
+		grid.html(`
+			<table class="capacity-table">
+				<thead>
+					<tr><th class="capacity-employee">Employee</th>${header}<th class="capacity-total">Totale</th></tr>
+				</thead>
+				<tbody>${body}</tbody>
+			</table>
+		`);
+	}
+	
+	show_performance_dialog() {
+		const dialog = new frappe.ui.Dialog({
+			title: 'Performance API',
+			size: 'extra-large',
+			fields: [
+				{
+					fieldtype: 'Select',
+					fieldname: 'hours',
+					label: 'Ultime ore',
+					options: '1\n6\n24\n48',
+					default: '24',
+					change: () => this.load_performance_stats(dialog)
+				},
+				{
+					fieldtype: 'HTML',
+					fieldname: 'stats'
+				}
+			],
+			primary_action_label: 'Aggiorna',
+			primary_action: () => this.load_performance_stats(dialog),
+			secondary_action_label: 'Azzera',
+			secondary_action: () => {
+				frappe.confirm('Azzerare statistiche e log delle chiamate lente?', () => {
+					frappe.call({
+						method: 'advanced_tc.api.instrumentation.reset_instrumentation_stats',
+						callback: () => this.load_performance_stats(dialog)
+					});
+				});
+			}
+		});
+		
+		dialog.show();
+		this.load_performance_stats(dialog);
+	}
+	
+	load_performance_stats(dialog) {
+		frappe.call({
+			method: 'advanced_tc.api.instrumentation.get_instrumentation_stats',
+			args: { hours: dialog.get_value('hours') },
+			callback: (r) => {
+				if (r.message) {
+					dialog.fields_dict.stats.$wrapper.html(this.render_performance_stats(r.message));
+				}
+			}
+		});
+	}
+	
+	render_performance_stats(stats) {
+		const escape = (value) => frappe.utils.escape_html(String(value));
+		const short_name = (endpoint) => endpoint.split('.').pop();
+		const format_ms = (value) => value === null ? '&gt;10000' : value;
+		
+		if (!stats.enabled) {
+			return '<p class="text-muted">Strumentazione disattivata (advanced_tc_instrumentation = 0).</p>';
+		}
+		
+		const endpoint_rows = stats.endpoints.map(e => `
+			<tr>
+				<td title="${escape(e.endpoint)}">${escape(short_name(e.endpoint))}</td>
+				<td class="text-right">${e.calls}</td>
+				<td class="text-right">${e.errors}</td>
+				<td class="text-right">${e.avg_ms}</td>
+				<td class="text-right">${format_ms(e.p50_ms)}</td>
+				<td class="text-right">${format_ms(e.p95_ms)}</td>
+				<td class="text-right">${format_ms(e.p99_ms)}</td>
+				<td class="text-right">${e.avg_sql_count}</td>
+				<td class="text-right">${e.avg_sql_ms}</td>
+				<td class="text-right">${e.avg_bytes === null ? '-' : Math.round(e.avg_bytes / 102.4) / 10}</td>
+				<td class="text-right">${Math.round(e.total_ms / 100) / 10}</td>
+			</tr>
+		`).join('');
+		
+		const slow_rows = stats.slow_calls.map(call => `
+			<tr>
+				<td>${escape(call.timestamp)}</td>
+				<td title="${escape(call.endpoint)}">${escape(short_name(call.endpoint))}</td>
+				<td>${escape(call.user)}</td>
+				<td class="text-right">${call.wall_ms}</td>
+				<td class="text-right">${call.sql_count}</td>
+				<td class="text-right">${call.sql_ms}</td>
+				<td>
+					<details>
+						<summary>${call.queries.length} query${call.error ? ' <span class="indicator-pill red">errore</span>' : ''}</summary>
+						<pre class="performance-queries">${call.queries.map(q => `${q[0]} ms  ${escape(q[1])}`).join('\n')}</pre>
+					</details>
+				</td>
+			</tr>
+		`).join('');
+		
+		return `
+			<p class="text-muted">Finestra: ultime ${stats.hours} ore. Soglia chiamate lente: ${stats.slow_call_ms} ms. Percentili stimati dagli istogrammi (limite superiore del bucket, ms).</p>
+			<div class="performance-table">
+				<table class="table table-bordered table-condensed">
+					<thead>
+						<tr>
+							<th>Endpoint</th><th>Chiamate</th><th>Errori</th><th>Media ms</th>
+							<th>p50</th><th>p95</th><th>p99</th>
+							<th>Query</th><th>SQL ms</th><th>KB</th><th>Totale s</th>
+						</tr>
+					</thead>
+					<tbody>${endpoint_rows || '<tr><td colspan="11" class="text-muted">Nessuna chiamata registrata</td></tr>'}</tbody>
+				</table>
+			</div>
+			<h6>Chiamate lente</h6>
+			<div class="performance-table">
+				<table class="table table-bordered table-condensed">
+					<thead>
+						<tr><th>Data</th><th>Endpoint</th><th>Utente</th><th>ms</th><th>Query</th><th>SQL ms</th><th>Dettaglio</th></tr>
+					</thead>
+					<tbody>${slow_rows || '<tr><td colspan="7" class="text-muted">Nessuna chiamata lenta</td></tr>'}</tbody>
+				</table>
+			</div>
+		`;
+	}
+	
 	show_report_dialog() {
 		// Ottieni gli eventi correnti dal calendario
 		const events = this.calendar.getEvents();
@@ -1643,8 +2761,11 @@ delete_activity(id, dialog) {
 		const endDate = view.activeEnd;
 		
 		// Chiama la funzione di summary dal file timesheet_calendar.js
+		// (l'esportazione CSV usa task e descrizione: i dettagli degli eventi slim vengono caricati prima)
 		if (window.TimesheetCalendarUtils && window.TimesheetCalendarUtils.showSummaryDialog) {
-			window.TimesheetCalendarUtils.showSummaryDialog(events, startDate, endDate);
+			this.load_event_details(events, () => {
+				window.TimesheetCalendarUtils.showSummaryDialog(events, startDate, endDate);
+			});
 		} else {
 			frappe.show_alert({
 			message: 'Report functionality not available',
@@ -0,0 +1,187 @@
+import frappe
+
+# Hash Redis con l'indice delle assegnazioni "Assign To" di ogni utente:
+# user -> {"projects": {project: {project_name, status}}, "tasks": {task: {subject, project, status}}}.
+# Le voci sono ricostruite per singolo utente quando cambiano i suoi ToDo o i Project/Task assegnati;
+# il collegamento employee -> user passa dalla cache documenti di Frappe (invalidata al salvataggio).
+ASSIGNMENT_INDEX_CACHE_KEY = "advanced_tc_assignment_index"
+
+
+def get_assignment_index(user):
+    """
+    Restituisce l'indice delle assegnazioni dell'utente (memorizzato per richiesta e in Redis)
+    """
+    if not user:
+        return frappe._dict(projects={}, tasks={})
+
+    local_cache = getattr(frappe.local, "advanced_tc_assignment_index", None)
+    if local_cache is None:
+        local_cache = frappe.local.advanced_tc_assignment_index = {}
+
+    if user in local_cache:
+        return local_cache[user]
+
+    index = frappe.cache().hget(ASSIGNMENT_INDEX_CACHE_KEY, user)
+    if not index:
+        index = build_assignment_index(user)
+        frappe.cache().hset(ASSIGNMENT_INDEX_CACHE_KEY, user, index)
+
+    index = frappe._dict(index)
+    local_cache[user] = index
+    return index
+
+
+# Query dell'indice delle assegnazioni (verificate anche da db_indexes.explain_hot_queries)
+ASSIGNED_PROJECTS_QUERY = """
+    SELECT DISTINCT p.name, p.project_name, p.status
+    FROM `tabToDo` td
+    INNER JOIN `tabProject` p ON p.name = td.reference_name
+    WHERE td.reference_type = 'Project' AND td.allocated_to = %(user)s AND td.status = 'Open'
+"""
+
+ASSIGNED_TASKS_QUERY = """
+    SELECT DISTINCT t.name, t.subject, t.project, t.status
+    FROM `tabToDo` td
+    INNER JOIN `tabTask` t ON t.name = td.reference_name
+    WHERE td.reference_type = 'Task' AND td.allocated_to = %(user)s AND td.status = 'Open'
+"""
+
+
+def build_assignment_index(user):
+    """
+    Calcola l'indice con due query (progetti e task con ToDo aperto per l'utente)
+    """
+    projects = frappe.db.sql(ASSIGNED_PROJECTS_QUERY, {"user": user}, as_dict=True)
+    tasks = frappe.db.sql(ASSIGNED_TASKS_QUERY, {"user": user}, as_dict=True)
+
+    return {
+        "projects": {p.name: {"project_name": p.project_name, "status": p.status} for p in projects},
+        "tasks": {t.name: {"subject": t.subject, "project": t.project, "status": t.status} for t in tasks},
+    }
+
+
+def get_employee_user(employee):
+    """
+    Utente collegato all'employee (le assegnazioni ToDo sono per utente)
+    """
+    return frappe.get_cached_value("Employee", employee, "user_id") if employee else None
+
+
+def get_assigned_projects(user, open_only=True):
+    """
+    Progetti assegnati all'utente, ordinati per project_name: [{"name", "project_name"}]
+    """
+    projects = [
+        {"name": name, "project_name": project.get("project_name")}
+        for name, project in get_assignment_index(user).projects.items()
+        if not open_only or project.get("status") == "Open"
+    ]
+    return sorted(projects, key=lambda p: (p["project_name"] or p["name"]).lower())
+
+
+def is_assigned_to_project(user, project):
+    return bool(project) and project in get_assignment_index(user).projects
+
+
+def get_assigned_tasks(user, project=None):
+    """
+    Task non annullate assegnate all'utente (opzionalmente di un solo progetto),
+    ordinate per subject: [{"name", "subject", "project"}]
+    """
+    tasks = [
+        {"name": name, "subject": task.get("subject"), "project": task.get("project")}
+        for name, task in get_assignment_index(user).tasks.items()
+        if task.get("status") != "Cancelled" and (not project or task.get("project") == project)
+    ]
+    return sorted(tasks, key=lambda t: (t["subject"] or t["name"]).lower())
+
+
+def has_assigned_tasks(user, project):
+    return any(
+        task.get("project") == project and task.get("status") != "Cancelled"
+        for task in get_assignment_index(user).tasks.values()
+    )
+
+
+def get_task_project(task, user=None):
+    """
+    Progetto di una task: dall'indice se la task è assegnata all'utente, altrimenti dalla cache documenti
+    """
+    if not task:
+        return None
+
+    if user:
+        indexed = get_assignment_index(user).tasks.get(task)
+        if indexed:
+            return indexed.get("project")
+
+    return frappe.get_cached_value("Task", task, "project")
+
+
+def clear_assignment_index(users=None):
+    """
+    Invalida l'indice per gli utenti indicati (o per tutti se users è None)
+    """
+    local_cache = getattr(frappe.local, "advanced_tc_assignment_index", None)
+
+    if users is None:
+        frappe.cache().delete_value(ASSIGNMENT_INDEX_CACHE_KEY)
+        if local_cache:
+            local_cache.clear()
+        return
+
+    for user in users:
+        if not user:
+            continue
+        frappe.cache().hdel(ASSIGNMENT_INDEX_CACHE_KEY, user)
+        if local_cache:
+            local_cache.pop(user, None)
+
+
+def get_assigned_users(reference_type, reference_name):
+    """
+    Utenti con un ToDo (aperto o meno) sul documento: gli unici il cui indice può contenerlo
+    """
+    return frappe.get_all("ToDo", filters={
+        "reference_type": reference_type,
+        "reference_name": reference_name
+    }, pluck="allocated_to", distinct=True)
+
+
+def on_todo_change(doc, method=None):
+    """
+    Hook doc_events per ToDo: ricostruisce solo l'indice degli utenti coinvolti
+    """
+    if doc.get("reference_type") not in ("Project", "Task"):
+        return
+
+    users = {doc.get("allocated_to")}
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        users.add(previous.get("allocated_to"))
+
+    clear_assignment_index(users)
+
+
+def on_project_change(doc, method=None):
+    """
+    Hook doc_events per Project: nome e stato compaiono nell'indice degli utenti assegnati
+    """
+    if method == "on_trash" or doc.has_value_changed("project_name") or doc.has_value_changed("status"):
+        clear_assignment_index(get_assigned_users("Project", doc.name))
+
+
+def on_task_change(doc, method=None):
+    """
+    Hook doc_events per Task: subject, progetto e stato compaiono nell'indice degli utenti assegnati
+    """
+    if method == "on_trash" or any(doc.has_value_changed(f) for f in ("subject", "project", "status")):
+        clear_assignment_index(get_assigned_users("Task", doc.name))
+
+
+def on_link_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di Project e Task
+    """
+    clear_assignment_index()
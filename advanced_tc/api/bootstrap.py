@@ -0,0 +1,204 @@
+import hashlib
+import json
+
+import frappe
+from frappe import _
+
+from advanced_tc.api.assignments import get_assigned_tasks, get_assigned_users, get_assignment_index
+from advanced_tc.api.colors import get_project_color_map
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import build_filter_options
+from advanced_tc.api.write_queue import is_async_writes_enabled
+
+# Hash Redis con il bootstrap del calendario già calcolato per ogni utente:
+# user -> {"version", "data"}. Invalidato dagli hook doc_events sui dati che contiene.
+BOOTSTRAP_CACHE_KEY = "advanced_tc_bootstrap"
+
+# Utenti manager con un bootstrap in cache: i loro elenchi (progetti aperti, employee attivi)
+# dipendono da tutti i Project e gli Employee, quelli degli altri utenti solo dai propri
+BOOTSTRAP_MANAGERS_KEY = "advanced_tc_bootstrap_managers"
+
+# Campi dei dati anagrafici presenti nel bootstrap: le altre modifiche non lo invalidano
+BOOTSTRAP_FIELDS = {
+    "Project": ("project_name", "status"),
+    "Task": ("subject", "project", "status"),
+    "Employee": ("employee_name", "status", "user_id"),
+    "Activity Type": ("activity_type",),
+}
+
+
+@frappe.whitelist()
+def get_calendar_bootstrap(version=None):
+    """
+    Restituisce in una sola risposta tutto ciò che serve alla pagina e ai dialog: employees,
+    progetti, activity type, permessi, assegnazioni progetto/task dell'utente e colori dei progetti.
+    Se il client invia la versione che ha già in cache (sessionStorage) e nulla è cambiato,
+    la risposta contiene solo {"version", "not_modified": True}.
+    """
+    try:
+        ctx = get_permission_context()
+
+        cached = frappe.cache().hget(BOOTSTRAP_CACHE_KEY, ctx.user_id)
+        if not cached:
+            data = build_bootstrap(ctx)
+            cached = {"version": make_version(data), "data": data}
+            frappe.cache().hset(BOOTSTRAP_CACHE_KEY, ctx.user_id, cached)
+            if ctx.is_manager:
+                frappe.cache().hset(BOOTSTRAP_MANAGERS_KEY, ctx.user_id, 1)
+
+        data = cached["data"]
+
+        # Colori (colori fissati) e impostazioni del sito sono globali: calcolati ad ogni richiesta,
+        # senza query, ed inclusi nella versione
+        project_colors = get_project_color_map([p["name"] for p in data["projects"]])
+        settings = get_site_settings()
+        current_version = make_version([cached["version"], project_colors, settings])
+
+        if version and version == current_version:
+            return {"version": current_version, "not_modified": True}
+
+        return dict(data, project_colors=project_colors, settings=settings, version=current_version)
+    except Exception as e:
+        frappe.log_error(f"Errore in get_calendar_bootstrap: {e!s}")
+        frappe.throw(_("Errore nel caricamento dei dati del calendario: {0}").format(str(e)))
+
+
+def build_bootstrap(ctx):
+    """
+    Calcola il bootstrap (senza colori) per il contesto permessi indicato
+    """
+    data = build_filter_options(ctx)
+    data["permissions"] = {
+        "user_id": ctx.user_id,
+        "is_manager": ctx.is_manager,
+        "is_restricted": ctx.is_restricted,
+        "current_employee": ctx.current_employee,
+        "employee_name": ctx.employee_name,
+    }
+    data["assignments"] = get_user_assignments(ctx.user_id)
+    return data
+
+
+def get_user_assignments(user):
+    """
+    Progetti e task assegnati all'utente tramite "Assign To", presi dall'indice delle assegnazioni.
+    Usata dal client per i controlli dei dialog senza chiamate al server:
+    {"projects": {project: project_name}, "tasks": {task: {"project", "subject"}}}
+    """
+    index = get_assignment_index(user)
+
+    return {
+        "projects": {name: project.get("project_name") for name, project in index.projects.items()},
+        "tasks": {
+            task["name"]: {"project": task["project"], "subject": task["subject"]}
+            for task in get_assigned_tasks(user)
+        },
+    }
+
+
+def get_site_settings():
+    """
+    Impostazioni del sito (site_config) rilevanti per il comportamento del client
+    """
+    return {
+        "async_writes": is_async_writes_enabled(),
+    }
+
+
+def make_version(data):
+    """
+    Hash stabile del contenuto, usato come ETag del bootstrap
+    """
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def clear_bootstrap_cache(user=None):
+    """
+    Invalida il bootstrap in cache per un utente (o per tutti se user è None)
+    """
+    if user:
+        frappe.cache().hdel(BOOTSTRAP_CACHE_KEY, user)
+    else:
+        frappe.cache().delete_value([BOOTSTRAP_CACHE_KEY, BOOTSTRAP_MANAGERS_KEY])
+
+
+def clear_manager_bootstrap_cache():
+    """
+    Invalida il bootstrap in cache dei soli manager
+    """
+    for user in frappe.cache().hkeys(BOOTSTRAP_MANAGERS_KEY):
+        clear_bootstrap_cache(frappe.safe_decode(user))
+    frappe.cache().delete_value(BOOTSTRAP_MANAGERS_KEY)
+
+
+def on_todo_change(doc, method=None):
+    """
+    Hook doc_events per ToDo: le assegnazioni cambiano solo il bootstrap degli utenti coinvolti
+    """
+    if doc.get("reference_type") not in ("Project", "Task"):
+        return
+
+    users = {doc.get("allocated_to")}
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        users.add(previous.get("allocated_to"))
+
+    for user in users:
+        if user:
+            clear_bootstrap_cache(user)
+
+
+def on_master_change(doc, method=None):
+    """
+    Hook doc_events per Project, Task, Employee e Activity Type: invalida il bootstrap solo se
+    cambiano i campi che contiene, e solo per gli utenti che li vedono
+    """
+    if method != "on_trash" and not any(doc.has_value_changed(f) for f in BOOTSTRAP_FIELDS[doc.doctype]):
+        return
+
+    if doc.doctype == "Activity Type":
+        # Elenco condiviso da tutti gli utenti
+        clear_bootstrap_cache()
+        return
+
+    if doc.doctype == "Task":
+        # Le task compaiono solo nelle assegnazioni degli utenti assegnati
+        users = set(get_assigned_users("Task", doc.name))
+    elif doc.doctype == "Project":
+        # Progetti aperti dei manager e progetti assegnati agli utenti
+        clear_manager_bootstrap_cache()
+        users = set(get_assigned_users("Project", doc.name))
+    else:
+        # Employee attivi dei manager e dati dell'employee del proprio utente
+        clear_manager_bootstrap_cache()
+        users = {doc.get("user_id")}
+        previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+        if previous:
+            users.add(previous.get("user_id"))
+
+    for user in users:
+        if user:
+            clear_bootstrap_cache(user)
+
+
+def on_master_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di Project, Task, Employee e Activity Type
+    """
+    clear_bootstrap_cache()
+
+
+def on_user_change(doc, method=None):
+    """
+    Hook doc_events per User: ruoli e permessi fanno parte del bootstrap
+    """
+    clear_bootstrap_cache(doc.name)
+
+
+def on_has_role_change(doc, method=None):
+    """
+    Hook doc_events per Has Role inserite o rimosse direttamente
+    """
+    if doc.get("parenttype") == "User" and doc.get("parent"):
+        clear_bootstrap_cache(doc.parent)
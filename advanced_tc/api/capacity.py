@@ -0,0 +1,112 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, date_diff, flt, getdate
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import build_event_conditions
+
+# Ampiezza massima della heatmap (giorni): circa sei mesi
+MAX_HEATMAP_DAYS = 186
+
+
+@frappe.whitelist()
+def get_capacity_heatmap(start_date, end_date, filters=None):
+    """
+    Ore registrate per employee e giorno (end_date esclusa) lette dalla tabella Timesheet Daily Rollup,
+    con la stessa visibilità per ruolo del calendario. Le ore attese sono calcolate dal client
+    con le impostazioni dell'orario di lavoro.
+    Formato compatto: {"dates": [...], "rows": [[employee, employee_name, [ore per ogni data]], ...]}
+    """
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+
+        start_date, end_date = getdate(start_date), getdate(end_date)
+        days = date_diff(end_date, start_date)
+        if days <= 0 or days > MAX_HEATMAP_DAYS:
+            frappe.throw(_("Intervallo non valido per la heatmap (massimo {0} giorni)").format(MAX_HEATMAP_DAYS))
+
+        dates = [add_days(start_date, offset) for offset in range(days)]
+        ctx = get_permission_context()
+        # Solo per la visibilità: le date sono filtrate sulla tabella dei totali
+        scope = build_event_conditions(ctx, filters=filters)
+        if scope is None:
+            return {"dates": [str(d) for d in dates], "rows": []}
+
+        scope_employee = scope[2]
+        employees = get_heatmap_employees(days, scope_employee)
+        position = {d: index for index, d in enumerate(dates)}
+
+        for row in fetch_daily_hours(start_date, end_date, filters, scope_employee):
+            entry = employees.setdefault(row.employee, [row.employee, row.employee_name, [0] * days])
+            entry[2][position[getdate(row.date)]] = flt(row.hours, 2)
+
+        return {
+            "dates": [str(d) for d in dates],
+            "rows": sorted(employees.values(), key=lambda entry: (entry[1] or entry[0]).lower())
+        }
+
+    except frappe.PermissionError:
+        raise
+    except Exception as e:
+        frappe.log_error(f"Errore in get_capacity_heatmap: {e!s}")
+        frappe.throw(_("Errore nel recupero della heatmap: {0}").format(str(e)))
+
+
+def get_heatmap_employees(days, scope_employee=None):
+    """
+    Righe della heatmap per gli employee attivi (anche senza ore: sono quelli sottoutilizzati)
+    """
+    filters = {"status": "Active"}
+    if scope_employee:
+        filters = {"name": scope_employee}
+
+    return {
+        employee.name: [employee.name, employee.employee_name, [0] * days]
+        for employee in frappe.get_all("Employee", filters=filters, fields=["name", "employee_name"])
+    }
+
+
+def fetch_daily_hours(start_date, end_date, filters, scope_employee):
+    """
+    Ore per employee e giorno. Con il filtro task (non presente nei totali giornalieri)
+    il calcolo avviene sui Timesheet Detail.
+    """
+    values = {"start_date": start_date, "end_date": end_date, "employee": scope_employee}
+    filters = filters or {}
+
+    if filters.get("task"):
+        conditions = ["tsd.task = %(task)s"]
+        values["task"] = filters["task"]
+        for fieldname in ("project", "activity_type"):
+            if filters.get(fieldname):
+                conditions.append(f"tsd.{fieldname} = %({fieldname})s")
+                values[fieldname] = filters[fieldname]
+        if scope_employee:
+            conditions.append("ts.employee = %(employee)s")
+
+        return frappe.db.sql(f"""
+            SELECT ts.employee, MAX(ts.employee_name) as employee_name, DATE(tsd.from_time) as date, SUM(tsd.hours) as hours
+            FROM `tabTimesheet Detail` tsd
+            INNER JOIN `tabTimesheet` ts ON tsd.parent = ts.name
+            WHERE ts.docstatus < 2 AND tsd.from_time >= %(start_date)s AND tsd.from_time < %(end_date)s
+            AND {" AND ".join(conditions)}
+            GROUP BY ts.employee, DATE(tsd.from_time)
+        """, values, as_dict=True)
+
+    conditions = ["r.date >= %(start_date)s", "r.date < %(end_date)s"]
+    if scope_employee:
+        conditions.append("r.employee = %(employee)s")
+    for fieldname in ("project", "activity_type"):
+        if filters.get(fieldname):
+            conditions.append(f"r.{fieldname} = %({fieldname})s")
+            values[fieldname] = filters[fieldname]
+
+    return frappe.db.sql(f"""
+        SELECT r.employee, MAX(r.employee_name) as employee_name, r.date, SUM(r.hours) as hours
+        FROM `tabTimesheet Daily Rollup` r
+        WHERE {" AND ".join(conditions)}
+        GROUP BY r.employee, r.date
+    """, values, as_dict=True)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+import frappe
+from frappe import _
+
+# Lista di colori predefiniti
+PALETTE = (
+    "#3498db",  # Blu
+    "#e74c3c",  # Rosso
+    "#f39c12",  # Arancione
+    "#2ecc71",  # Verde
+    "#9b59b6",  # Viola
+    "#1abc9c",  # Turchese
+    "#e67e22",  # Arancione scuro
+    "#34495e",  # Blu scuro
+    "#f1c40f",  # Giallo
+    "#e91e63",  # Rosa
+    "#00bcd4",  # Ciano
+    "#ff9800",  # Ambra
+)
+
+# Colore grigio di default per le attività senza progetto
+DEFAULT_COLOR = "#95a5a6"
+
+# Mappa progetto -> colore fissata dagli amministratori (salvata come default globale)
+PINNED_COLORS_KEY = "advanced_tc_project_colors"
+
+HEX_COLOR_PATTERN = re.compile(r"^#[0-9a-fA-F]{6}$")
+
+
+def get_pinned_colors():
+    """
+    Colori fissati dagli amministratori, in cache Redis
+    """
+    def load():
+        value = frappe.db.get_global(PINNED_COLORS_KEY)
+        return json.loads(value) if value else {}
+
+    return frappe.cache().get_value(PINNED_COLORS_KEY, load)
+
+
+@lru_cache(maxsize=4096)
+def get_hashed_color(project, reserved=()):
+    """
+    Colore derivato dall'hash MD5 del nome del progetto (sempre lo stesso per lo stesso progetto).
+    Se il colore è già fissato per un altro progetto si passa al successivo libero della palette.
+    """
+    index = int(hashlib.md5(project.encode()).hexdigest(), 16) % len(PALETTE)
+
+    if len(reserved) < len(PALETTE):
+        while PALETTE[index] in reserved:
+            index = (index + 1) % len(PALETTE)
+
+    return PALETTE[index]
+
+
+def get_event_color(project, pinned=None):
+    """Restituisce un colore per il progetto"""
+    if not project:
+        return DEFAULT_COLOR
+
+    pinned = get_pinned_colors() if pinned is None else pinned
+    if project in pinned:
+        return pinned[project]
+
+    return get_hashed_color(project, tuple(sorted(set(pinned.values()))))
+
+
+def get_project_color_map(projects):
+    """
+    Mappa progetto -> colore per un elenco di progetti
+    """
+    pinned = get_pinned_colors()
+    return {project: get_event_color(project, pinned) for project in projects if project}
+
+
+@frappe.whitelist()
+def get_project_colors(projects):
+    """
+    Colori dei progetti richiesti dal calendario per gli eventi con progetti non ancora noti al client
+    """
+    if isinstance(projects, str):
+        projects = json.loads(projects)
+
+    return get_project_color_map(projects or [])
+
+
+@frappe.whitelist()
+def set_project_color(project, color=None):
+    """
+    Fissa (o rimuove, se color è vuoto) il colore di un progetto. Solo per System Manager.
+    """
+    frappe.only_for("System Manager")
+
+    if color and not HEX_COLOR_PATTERN.match(color):
+        frappe.throw(_("Colore non valido: usare il formato esadecimale #rrggbb"))
+
+    pinned = dict(get_pinned_colors())
+    if color:
+        pinned[project] = color.lower()
+    else:
+        pinned.pop(project, None)
+
+    frappe.db.set_global(PINNED_COLORS_KEY, json.dumps(pinned, sort_keys=True))
+    frappe.cache().delete_value(PINNED_COLORS_KEY)
+
+    return get_project_color_map([project])
@@ -0,0 +1,148 @@
+import frappe
+
+from advanced_tc.api.assignments import ASSIGNED_PROJECTS_QUERY, ASSIGNED_TASKS_QUERY
+from advanced_tc.api.overlaps import EMPLOYEE_INTERVALS_QUERY, OVERLAP_INDEXES
+from advanced_tc.api.timesheet_details import OPEN_PROJECTS_QUERY, build_event_conditions, build_event_query
+from advanced_tc.api.weekly_timesheets import WEEK_TIMESHEET_QUERY
+
+# Indici per l'autocomplete per prefisso (installati dalla patch add_search_indexes)
+SEARCH_INDEXES = [
+    ("Project", ["status", "project_name"], "advanced_tc_project_search"),
+    ("Timesheet", ["docstatus", "creation"], "advanced_tc_timesheet_search"),
+]
+
+# Indici composti per le query "calde" del calendario: (doctype, campi, nome indice).
+# Installati dalle patch in patches.txt e verificati dal comando bench advanced-tc-check-indexes.
+CALENDAR_INDEXES = [
+    *OVERLAP_INDEXES,
+    # Finestre del calendario e filtri per progetto/task
+    ("Timesheet Detail", ["from_time", "to_time"], "advanced_tc_time_range"),
+    ("Timesheet Detail", ["project", "from_time"], "advanced_tc_project_time"),
+    ("Timesheet Detail", ["task", "from_time"], "advanced_tc_task_time"),
+    # Timesheet settimanale per employee
+    ("Timesheet", ["employee", "start_date", "docstatus"], "advanced_tc_employee_week"),
+    # Assegnazioni "Assign To" su Project e Task
+    ("ToDo", ["reference_type", "reference_name", "allocated_to", "status"], "advanced_tc_todo_reference"),
+    ("ToDo", ["allocated_to", "status", "reference_type"], "advanced_tc_todo_allocated"),
+    # Task di un progetto (ricerca task assegnate)
+    ("Task", ["project", "status"], "advanced_tc_task_project"),
+    # Employee collegato all'utente corrente
+    ("Employee", ["user_id"], "advanced_tc_employee_user"),
+    # Autocomplete per prefisso nei dialog (advanced_tc.api.search)
+    *SEARCH_INDEXES,
+    # Totali giornalieri (advanced_tc.api.rollup)
+    ("Timesheet Daily Rollup", ["employee", "date"], "advanced_tc_rollup_employee_date"),
+    ("Timesheet Daily Rollup", ["date", "employee"], "advanced_tc_rollup_date_employee"),
+]
+
+
+def ensure_indexes():
+    """
+    Crea gli indici mancanti (frappe.db.add_index ignora quelli già presenti)
+    """
+    for doctype, fields, index_name in CALENDAR_INDEXES:
+        frappe.db.add_index(doctype, fields, index_name=index_name)
+
+
+def verify_indexes():
+    """
+    Restituisce lo stato di ogni indice atteso: [{"doctype", "fields", "index", "exists"}]
+    """
+    return [
+        {
+            "doctype": doctype,
+            "fields": fields,
+            "index": index_name,
+            "exists": bool(frappe.db.has_index(f"tab{doctype}", index_name))
+        }
+        for doctype, fields, index_name in CALENDAR_INDEXES
+    ]
+
+
+def get_sample_values():
+    """
+    Valori realistici (presi dal database, se presenti) per eseguire EXPLAIN sulle query calde
+    """
+    sample = frappe.db.sql("""
+        SELECT tsd.from_time, tsd.to_time, tsd.project, tsd.task, ts.employee, e.user_id
+        FROM `tabTimesheet Detail` tsd
+        INNER JOIN `tabTimesheet` ts ON tsd.parent = ts.name
+        LEFT JOIN `tabEmployee` e ON e.name = ts.employee
+        ORDER BY tsd.modified DESC
+        LIMIT 1
+    """, as_dict=True)
+    sample = sample[0] if sample else frappe._dict()
+
+    from_time = sample.from_time or frappe.utils.now_datetime()
+    return {
+        "start_date": frappe.utils.add_days(from_time, -7),
+        "end_date": frappe.utils.add_days(from_time, 7),
+        "from_time": from_time,
+        "to_time": sample.to_time or frappe.utils.add_to_date(from_time, hours=1),
+        "employee": sample.employee or "EMP-EXPLAIN",
+        "user": sample.user_id or "explain@example.com",
+        "project": sample.project or "PROJ-EXPLAIN",
+        "task": sample.task or "TASK-EXPLAIN",
+        "week_start": frappe.utils.getdate(from_time),
+        "week_end": frappe.utils.add_days(frappe.utils.getdate(from_time), 6),
+        "txt": "P%",
+        "limit": 20,
+    }
+
+
+def get_hot_queries(values):
+    """
+    Query calde di advanced_tc.api, costruite con le stesse costanti e funzioni usate dalle API
+    (EXPLAIN verifica esattamente le query eseguite in produzione)
+    """
+    manager = frappe._dict(is_manager=True, is_restricted=False, current_employee=None)
+
+    def event_query(filters):
+        conditions, _values, _scope_employee = build_event_conditions(
+            manager, values["start_date"], values["end_date"], filters
+        )
+        return build_event_query(conditions)
+
+    return {
+        "get_timesheet_details": event_query({}),
+        "get_timesheet_details (employee)": event_query({"employee": values["employee"]}),
+        "get_timesheet_details (project)": event_query({"project": values["project"]}),
+        "overlap check": EMPLOYEE_INTERVALS_QUERY.format(conditions=""),
+        "get_or_create_timesheet": WEEK_TIMESHEET_QUERY.format(lock=""),
+        # Forma della query generata da frappe.db.get_value("Employee", {"user_id": user}, ...)
+        "employee by user_id": """
+            SELECT name, employee_name FROM `tabEmployee` WHERE user_id = %(user)s
+        """,
+        "assigned projects": ASSIGNED_PROJECTS_QUERY,
+        "assigned tasks": ASSIGNED_TASKS_QUERY,
+        "project prefix search": OPEN_PROJECTS_QUERY.format(keyset=""),
+    }
+
+
+def explain_hot_queries():
+    """
+    Esegue EXPLAIN sulle query calde e indica, per ogni tabella, l'indice usato.
+    Una tabella letta con type=ALL (scansione completa) rende la query "non indicizzata".
+    """
+    values = get_sample_values()
+    report = []
+
+    for name, query in get_hot_queries(values).items():
+        plan = frappe.db.sql(f"EXPLAIN {query}", values, as_dict=True)
+        tables = [
+            {
+                "table": row.get("table"),
+                "type": row.get("type"),
+                "key": row.get("key"),
+                "rows": row.get("rows"),
+                "full_scan": (row.get("type") or "").upper() == "ALL"
+            }
+            for row in plan
+        ]
+        report.append({
+            "query": name,
+            "uses_index": not any(table["full_scan"] for table in tables),
+            "tables": tables
+        })
+
+    return report
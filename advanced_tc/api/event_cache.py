@@ -0,0 +1,206 @@
+import functools
+import json
+
+import frappe
+from frappe.utils import add_days, cint, get_datetime, getdate
+
+# Prefisso degli hash Redis con le finestre di eventi già formattate.
+# Ogni hash raggruppa le finestre di un singolo employee (viste filtrate o utenti Employee)
+# oppure quelle manager senza filtro employee, così l'invalidazione resta mirata.
+EVENT_CACHE_PREFIX = "advanced_tc_event_cache"
+ALL_EMPLOYEES_BUCKET = "__all__"
+
+# Durata predefinita delle finestre in cache (secondi), configurabile da site_config
+DEFAULT_EVENT_CACHE_TTL = 6 * 60 * 60
+
+
+def get_cache_ttl():
+    """
+    TTL delle finestre in cache; impostare advanced_tc_event_cache_ttl a 0 per disabilitare la cache
+    """
+    return cint(frappe.conf.get("advanced_tc_event_cache_ttl", DEFAULT_EVENT_CACHE_TTL))
+
+
+def get_bucket_key(scope_employee):
+    return f"{EVENT_CACHE_PREFIX}|{scope_employee or ALL_EMPLOYEES_BUCKET}"
+
+
+def to_naive_datetime(value):
+    """
+    Datetime senza fuso orario: la pagina invia date ISO con "Z", mentre i Timesheet
+    e gli intervalli di invalidazione usano datetime naive (come row_matches_window)
+    """
+    return get_datetime(value).replace(tzinfo=None) if value else None
+
+
+def make_window_field(start_date, end_date, filters=None):
+    """
+    Chiave della finestra all'interno del bucket: intervallo di date più filtri (escluso employee,
+    già rappresentato dal bucket). L'intervallo resta leggibile per l'invalidazione per date.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v and k != "employee"}
+    return json.dumps([
+        str(to_naive_datetime(start_date)) if start_date else None,
+        str(to_naive_datetime(end_date)) if end_date else None,
+        filters
+    ], sort_keys=True, default=str)
+
+
+def get_window(scope_employee, field):
+    """
+    Restituisce la lista di eventi in cache per la finestra, oppure None
+    """
+    if not get_cache_ttl():
+        return None
+
+    return frappe.cache().hget(get_bucket_key(scope_employee), field)
+
+
+def set_window(scope_employee, field, events):
+    """
+    Memorizza la lista di eventi formattati per la finestra
+    """
+    ttl = get_cache_ttl()
+    if not ttl:
+        return
+
+    bucket_key = get_bucket_key(scope_employee)
+    frappe.cache().hset(bucket_key, field, events)
+    frappe.cache().expire(frappe.cache().make_key(bucket_key), ttl)
+
+
+def invalidate_windows(employee=None, from_date=None, to_date=None):
+    """
+    Invalida le finestre che possono contenere attività dell'employee nell'intervallo indicato.
+    Vengono toccati solo il bucket dell'employee e quello delle viste manager complete;
+    senza intervallo di date il bucket viene eliminato per intero.
+    """
+    buckets = [get_bucket_key(None)]
+    if employee:
+        buckets.append(get_bucket_key(employee))
+
+    for bucket_key in buckets:
+        if not from_date or not to_date:
+            frappe.cache().delete_value(bucket_key)
+            continue
+
+        range_start = get_datetime(getdate(from_date))
+        range_end = get_datetime(add_days(getdate(to_date), 1))
+
+        for field in frappe.cache().hkeys(bucket_key):
+            field = frappe.safe_decode(field)
+            try:
+                window_start, window_end, _filters = json.loads(field)
+            except ValueError:
+                frappe.cache().hdel(bucket_key, field)
+                continue
+
+            # Finestra aperta o sovrapposta all'intervallo modificato
+            if (not window_start or to_naive_datetime(window_start) < range_end) and (
+                not window_end or to_naive_datetime(window_end) > range_start
+            ):
+                frappe.cache().hdel(bucket_key, field)
+
+
+def invalidate_windows_after_commit(employee=None, from_date=None, to_date=None):
+    """
+    Invalidazione rimandata al commit della transazione: una lettura concorrente eseguita prima
+    del commit vedrebbe ancora le righe precedenti e potrebbe rimetterle in cache
+    """
+    frappe.db.after_commit.add(functools.partial(invalidate_windows, employee, from_date, to_date))
+
+
+def clear_event_cache():
+    """
+    Elimina tutte le finestre in cache (es. dopo la rinomina di un progetto o di una task)
+    """
+    frappe.cache().delete_keys(EVENT_CACHE_PREFIX)
+
+
+def get_timesheet_date_range(doc):
+    """
+    Intervallo di date coperto da un Timesheet, incluso lo stato precedente al salvataggio
+    (un'attività spostata fuori dalla settimana deve invalidare anche la finestra di origine)
+    """
+    dates = []
+    docs = [doc]
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        docs.append(previous)
+
+    for d in docs:
+        for fieldname in ("start_date", "end_date"):
+            if d.get(fieldname):
+                dates.append(getdate(d.get(fieldname)))
+        for log in d.get("time_logs") or []:
+            for fieldname in ("from_time", "to_time"):
+                if log.get(fieldname):
+                    dates.append(getdate(log.get(fieldname)))
+
+    if not dates:
+        return None, None
+
+    return min(dates), max(dates)
+
+
+def on_timesheet_change(doc, method=None):
+    """
+    Hook doc_events per Timesheet (save, submit, cancel, delete): invalida, dopo il commit,
+    le finestre dell'employee interessato che si sovrappongono alle date del timesheet
+    """
+    from_date, to_date = get_timesheet_date_range(doc)
+    employees = {doc.get("employee")}
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        employees.add(previous.get("employee"))
+
+    for employee in employees:
+        invalidate_windows_after_commit(employee, from_date, to_date)
+
+
+def on_timesheet_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di un Timesheet (il nome compare negli eventi)
+    """
+    invalidate_windows_after_commit(doc.get("employee"))
+
+
+def on_employee_change(doc, method=None):
+    """
+    Hook doc_events per Employee: employee_name compare negli eventi dell'employee
+    """
+    if doc.has_value_changed("employee_name"):
+        invalidate_windows_after_commit(doc.name)
+
+
+def on_employee_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di un Employee (il codice compare negli eventi)
+    """
+    for employee in (old, new):
+        invalidate_windows_after_commit(employee)
+
+
+def on_project_change(doc, method=None):
+    """
+    Hook doc_events per Project: project_name compare in tutti gli eventi del progetto
+    """
+    if doc.has_value_changed("project_name"):
+        frappe.db.after_commit.add(clear_event_cache)
+
+
+def on_task_change(doc, method=None):
+    """
+    Hook doc_events per Task: il subject compare in tutti gli eventi della task
+    """
+    if doc.has_value_changed("subject"):
+        frappe.db.after_commit.add(clear_event_cache)
+
+
+def on_link_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di Project e Task
+    """
+    frappe.db.after_commit.add(clear_event_cache)
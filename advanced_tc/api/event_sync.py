@@ -0,0 +1,102 @@
+import functools
+
+import frappe
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+# Sorted set Redis con i Timesheet Detail eliminati (punteggio: istante dell'eliminazione).
+# Le righe rimosse da un Timesheet non lasciano traccia nel database, quindi il sync
+# incrementale le recupera da qui leggendo solo le eliminazioni successive al cursore.
+# Comandi Redis nativi (i metodi di frappe.cache() serializzano i valori con pickle).
+TOMBSTONE_CACHE_KEY = "advanced_tc_event_tombstones"
+
+# Finestra (secondi) per cui le eliminazioni restano disponibili al sync incrementale;
+# cursori più vecchi ricevono un reset completo della finestra
+DEFAULT_SYNC_RETENTION = 24 * 60 * 60
+
+# Margine (secondi) sottratto al cursore per non perdere scritture in commit durante la lettura
+SYNC_CURSOR_MARGIN = 2
+
+
+def get_sync_retention():
+    return cint(frappe.conf.get("advanced_tc_sync_retention", DEFAULT_SYNC_RETENTION))
+
+
+def get_sync_cursor():
+    """
+    Cursore da restituire al client: l'istante corrente meno un piccolo margine di sicurezza
+    (le modifiche ripetute sono idempotenti lato client)
+    """
+    return str(add_to_date(now_datetime(), seconds=-SYNC_CURSOR_MARGIN))
+
+
+def is_cursor_expired(since):
+    """
+    True se il cursore è più vecchio della finestra di conservazione delle eliminazioni
+    """
+    return get_datetime(since) < add_to_date(now_datetime(), seconds=-get_sync_retention())
+
+
+def get_tombstone_key():
+    return frappe.cache().make_key(TOMBSTONE_CACHE_KEY)
+
+
+def record_tombstones(names):
+    """
+    Registra i Timesheet Detail eliminati ed elimina le registrazioni scadute
+    (con una sola pipeline: il costo non dipende dal numero di eliminazioni conservate)
+    """
+    if not names:
+        return
+
+    now = now_datetime().timestamp()
+    retention = get_sync_retention()
+    key = get_tombstone_key()
+
+    pipeline = frappe.cache().pipeline()
+    pipeline.zadd(key, {name: now for name in names})
+    pipeline.zremrangebyscore(key, "-inf", now - retention)
+    pipeline.expire(key, retention)
+    pipeline.execute()
+
+
+def record_tombstones_after_commit(names):
+    """
+    Registrazione rimandata al commit: un rollback successivo (negli altri doc_events o nel resto
+    della richiesta) lascerebbe una riga esistente segnalata come eliminata
+    """
+    if names:
+        frappe.db.after_commit.add(functools.partial(record_tombstones, list(names)))
+
+
+def get_tombstones(since):
+    """
+    Restituisce i nomi dei Timesheet Detail eliminati dopo il cursore
+    """
+    since = get_datetime(since).timestamp()
+    return [
+        frappe.safe_decode(name)
+        for name in frappe.cache().zrangebyscore(get_tombstone_key(), f"({since}", "+inf")
+    ]
+
+
+def on_timesheet_change(doc, method=None):
+    """
+    Hook doc_events per Timesheet: registra le righe rimosse dal documento.
+    In caso di eliminazione del Timesheet o di cambio employee tutte le righe vengono
+    considerate rimosse per le viste che le stavano mostrando.
+    """
+    current = {d.name for d in doc.get("time_logs") or [] if d.name}
+
+    if method == "on_trash":
+        record_tombstones_after_commit(current)
+        return
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if not previous:
+        return
+
+    previous_names = {d.name for d in previous.get("time_logs") or [] if d.name}
+    if previous.get("employee") != doc.get("employee"):
+        record_tombstones_after_commit(previous_names)
+    else:
+        record_tombstones_after_commit(previous_names - current)
@@ -0,0 +1,310 @@
+import functools
+import json
+import time
+from datetime import timedelta
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+# Strumentazione delle API del calendario (disattivabile con advanced_tc_instrumentation = 0 in site_config)
+INSTRUMENTATION_CONFIG = "advanced_tc_instrumentation"
+
+# Soglia (ms) oltre la quale una chiamata finisce nel log delle chiamate lente
+SLOW_CALL_CONFIG = "advanced_tc_slow_call_ms"
+DEFAULT_SLOW_CALL_MS = 1000
+
+# Un hash Redis per ora con i contatori di tutti gli endpoint (campi "<endpoint>|<misura>"),
+# mantenuto per STATS_RETENTION_HOURS: le statistiche sono una finestra mobile sulle ultime ore.
+# Contatori e log usano comandi Redis nativi tramite pipeline (i metodi di frappe.cache() serializzano i valori con pickle).
+STATS_KEY_PREFIX = "advanced_tc_instrumentation"
+STATS_RETENTION_HOURS = 48
+
+# Limiti superiori (ms) dei bucket dell'istogramma delle durate
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+SLOW_LOG_KEY = "advanced_tc_slow_calls"
+SLOW_LOG_SIZE = 200
+# Query conservate per ogni chiamata lenta (testo troncato)
+SLOW_LOG_QUERIES = 50
+SLOW_LOG_QUERY_LENGTH = 500
+
+
+class SqlRecorder:
+    """
+    Context manager che conta le query eseguite tramite frappe.db.sql (numero, tempo totale,
+    righe restituite) sostituendo temporaneamente il metodo dell'istanza frappe.db.
+    I recorder possono essere annidati: all'uscita viene ripristinato il wrapper precedente.
+    """
+
+    def __init__(self, capture_queries=False):
+        self.capture_queries = capture_queries
+        self.count = 0
+        self.sql_ms = 0.0
+        self.rows = 0
+        self.queries = []
+        self.previous = None
+
+    def __enter__(self):
+        db = frappe.db
+        self.previous = db.__dict__.get("sql")
+        original_sql = db.sql
+
+        def recorded_sql(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return self.record(original_sql(*args, **kwargs))
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                self.count += 1
+                self.sql_ms += elapsed
+                if self.capture_queries and len(self.queries) < SLOW_LOG_QUERIES:
+                    query = args[0] if args else kwargs.get("query", "")
+                    self.queries.append([round(elapsed, 2), " ".join(str(query).split())[:SLOW_LOG_QUERY_LENGTH]])
+
+        db.sql = recorded_sql
+        return self
+
+    def __exit__(self, *exc):
+        if self.previous is not None:
+            frappe.db.sql = self.previous
+        else:
+            # Rimuove l'attributo d'istanza: torna visibile il metodo della classe
+            del frappe.db.sql
+
+    def record(self, result):
+        if isinstance(result, list | tuple):
+            self.rows += len(result)
+        return result
+
+
+def is_instrumentation_enabled():
+    return bool(cint(frappe.conf.get(INSTRUMENTATION_CONFIG, 1)))
+
+
+def instrumented(fn):
+    """
+    Decoratore per le API whitelisted: misura durata, numero e tempo delle query SQL,
+    aggiorna gli istogrammi in Redis e registra le chiamate oltre la soglia insieme all'elenco
+    delle loro query. Le chiamate annidate sono misurate solo dalla più esterna.
+    La dimensione della risposta è letta dopo la serializzazione (record_response_size),
+    senza serializzare il risultato una seconda volta; solo le chiamate lente la calcolano qui.
+    """
+    endpoint = f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(frappe.local, "advanced_tc_instrumenting", False) or not is_instrumentation_enabled():
+            return fn(*args, **kwargs)
+
+        frappe.local.advanced_tc_instrumenting = True
+        recorder = SqlRecorder(capture_queries=True)
+        error = False
+        result = None
+        started = time.perf_counter()
+
+        try:
+            with recorder:
+                result = fn(*args, **kwargs)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            frappe.local.advanced_tc_instrumenting = False
+            frappe.local.advanced_tc_instrumented_endpoint = endpoint
+            wall_ms = (time.perf_counter() - started) * 1000
+            try:
+                record_call(endpoint, wall_ms, recorder, result, error)
+            except Exception as e:
+                # La strumentazione non deve mai far fallire la chiamata
+                frappe.logger("advanced_tc").warning(f"Errore nella strumentazione di {endpoint}: {e!s}")
+
+    return wrapper
+
+
+def response_size(result):
+    """
+    Dimensione (byte) della risposta JSON; 0 per le risposte binarie (es. esportazioni)
+    """
+    if result is None or not isinstance(result, dict | list | tuple | str | int | float):
+        return 0
+    return len(json.dumps(result, default=str, separators=(",", ":")).encode())
+
+
+def get_bucket_label(wall_ms):
+    for limit in LATENCY_BUCKETS:
+        if wall_ms <= limit:
+            return f"le_{limit}"
+    return "le_inf"
+
+
+def get_stats_key(hour):
+    return frappe.cache().make_key(f"{STATS_KEY_PREFIX}|{hour.strftime('%Y%m%d%H')}")
+
+
+def get_stats_keys(hours):
+    """
+    Chiavi degli hash delle ultime ore, dalla corrente all'indietro
+    """
+    current = now_datetime().replace(minute=0, second=0, microsecond=0)
+    return [get_stats_key(current - timedelta(hours=offset)) for offset in range(hours)]
+
+
+def record_call(endpoint, wall_ms, recorder, result, error):
+    """
+    Aggiorna i contatori dell'ora corrente con una sola pipeline Redis
+    """
+    key = get_stats_key(now_datetime())
+    pipeline = frappe.cache().pipeline()
+
+    pipeline.hincrby(key, f"{endpoint}|calls", 1)
+    if error:
+        pipeline.hincrby(key, f"{endpoint}|errors", 1)
+    pipeline.hincrbyfloat(key, f"{endpoint}|wall_ms", wall_ms)
+    pipeline.hincrby(key, f"{endpoint}|sql_count", recorder.count)
+    pipeline.hincrbyfloat(key, f"{endpoint}|sql_ms", recorder.sql_ms)
+    pipeline.hincrby(key, f"{endpoint}|{get_bucket_label(wall_ms)}", 1)
+    pipeline.expire(key, STATS_RETENTION_HOURS * 3600)
+    pipeline.execute()
+
+    slow_ms = cint(frappe.conf.get(SLOW_CALL_CONFIG)) or DEFAULT_SLOW_CALL_MS
+    if wall_ms >= slow_ms:
+        log_slow_call(endpoint, wall_ms, recorder, 0 if error else response_size(result), error)
+
+
+def record_response_size(response=None, request=None):
+    """
+    Hook after_request: aggiunge ai contatori la dimensione della risposta HTTP già serializzata
+    di un'API strumentata (le risposte in streaming, es. le esportazioni, non sono contate)
+    """
+    endpoint = getattr(frappe.local, "advanced_tc_instrumented_endpoint", None)
+    if not endpoint or response is None:
+        return
+
+    try:
+        frappe.local.advanced_tc_instrumented_endpoint = None
+        size = response.content_length
+        if size is None and not response.direct_passthrough:
+            size = response.calculate_content_length()
+        if not size:
+            return
+
+        key = get_stats_key(now_datetime())
+        pipeline = frappe.cache().pipeline()
+        pipeline.hincrby(key, f"{endpoint}|bytes", size)
+        pipeline.hincrby(key, f"{endpoint}|sized_calls", 1)
+        pipeline.expire(key, STATS_RETENTION_HOURS * 3600)
+        pipeline.execute()
+    except Exception as e:
+        frappe.logger("advanced_tc").warning(f"Errore nella misura della risposta di {endpoint}: {e!s}")
+
+
+def log_slow_call(endpoint, wall_ms, recorder, size, error):
+    entry = {
+        "endpoint": endpoint,
+        "timestamp": str(now_datetime()),
+        "user": frappe.session.user,
+        "wall_ms": round(wall_ms, 2),
+        "sql_count": recorder.count,
+        "sql_ms": round(recorder.sql_ms, 2),
+        "bytes": size,
+        "error": error,
+        # Query più lente per prime
+        "queries": sorted(recorder.queries, key=lambda query: query[0], reverse=True),
+    }
+
+    key = frappe.cache().make_key(SLOW_LOG_KEY)
+    pipeline = frappe.cache().pipeline()
+    pipeline.lpush(key, json.dumps(entry))
+    pipeline.ltrim(key, 0, SLOW_LOG_SIZE - 1)
+    pipeline.execute()
+
+    frappe.logger("advanced_tc").warning(
+        f"Chiamata lenta {endpoint}: {entry['wall_ms']} ms, {recorder.count} query ({entry['sql_ms']} ms)"
+    )
+
+
+def estimate_percentile(buckets, calls, fraction):
+    """
+    Percentile stimato dall'istogramma: limite superiore del primo bucket che raggiunge la frazione
+    """
+    if not calls:
+        return None
+
+    cumulative = 0
+    for limit in (*LATENCY_BUCKETS, None):
+        cumulative += buckets.get(f"le_{limit}" if limit else "le_inf", 0)
+        if cumulative >= calls * fraction:
+            return limit
+    return None
+
+
+@frappe.whitelist()
+def get_instrumentation_stats(hours=24):
+    """
+    Statistiche per endpoint delle ultime ore (solo System Manager), ordinate per tempo totale,
+    e le chiamate lente più recenti
+    """
+    frappe.only_for("System Manager")
+
+    hours = min(max(cint(hours) or 24, 1), STATS_RETENTION_HOURS)
+
+    pipeline = frappe.cache().pipeline()
+    for key in get_stats_keys(hours):
+        pipeline.hgetall(key)
+    pipeline.lrange(frappe.cache().make_key(SLOW_LOG_KEY), 0, SLOW_LOG_SIZE - 1)
+    *hourly, slow_log = pipeline.execute()
+
+    totals = {}
+    for counters in hourly:
+        for field, value in (counters or {}).items():
+            endpoint, measure = frappe.safe_decode(field).rsplit("|", 1)
+            stats = totals.setdefault(endpoint, {})
+            stats[measure] = stats.get(measure, 0) + float(value)
+
+    endpoints = []
+    for endpoint, stats in totals.items():
+        calls = int(stats.get("calls", 0))
+        if not calls:
+            continue
+
+        buckets = {measure: int(value) for measure, value in stats.items() if measure.startswith("le_")}
+        endpoints.append({
+            "endpoint": endpoint,
+            "calls": calls,
+            "errors": int(stats.get("errors", 0)),
+            "total_ms": round(stats.get("wall_ms", 0), 2),
+            "avg_ms": round(stats.get("wall_ms", 0) / calls, 2),
+            "p50_ms": estimate_percentile(buckets, calls, 0.5),
+            "p95_ms": estimate_percentile(buckets, calls, 0.95),
+            "p99_ms": estimate_percentile(buckets, calls, 0.99),
+            "avg_sql_count": round(stats.get("sql_count", 0) / calls, 2),
+            "avg_sql_ms": round(stats.get("sql_ms", 0) / calls, 2),
+            # Media sulle sole risposte HTTP misurate (non sulle chiamate interne)
+            "avg_bytes": int(stats.get("bytes", 0) / stats["sized_calls"]) if stats.get("sized_calls") else None,
+            "histogram": buckets,
+        })
+
+    slow_calls = [json.loads(frappe.safe_decode(entry)) for entry in slow_log or []]
+
+    return {
+        "hours": hours,
+        "enabled": is_instrumentation_enabled(),
+        "slow_call_ms": cint(frappe.conf.get(SLOW_CALL_CONFIG)) or DEFAULT_SLOW_CALL_MS,
+        "endpoints": sorted(endpoints, key=lambda endpoint: endpoint["total_ms"], reverse=True),
+        "slow_calls": slow_calls,
+    }
+
+
+@frappe.whitelist(methods=["POST"])
+def reset_instrumentation_stats():
+    """
+    Azzera statistiche e log delle chiamate lente (solo System Manager)
+    """
+    frappe.only_for("System Manager")
+
+    pipeline = frappe.cache().pipeline()
+    pipeline.delete(*get_stats_keys(STATS_RETENTION_HOURS), frappe.cache().make_key(SLOW_LOG_KEY))
+    pipeline.execute()
+
+    return {"success": True}
@@ -0,0 +1,89 @@
+import frappe
+from frappe import _
+from frappe.utils import get_datetime
+
+# Indici usati dalla ricerca delle sovrapposizioni (installati dalla patch
+# advanced_tc.patches.v0_1.add_overlap_indexes)
+OVERLAP_INDEXES = [
+    ("Timesheet", ["employee", "docstatus"], "advanced_tc_employee_docstatus"),
+    ("Timesheet Detail", ["parent", "from_time", "to_time"], "advanced_tc_parent_time_range"),
+]
+
+# Attività dell'employee sovrapposte a una fascia oraria ({conditions}: esclusioni opzionali)
+EMPLOYEE_INTERVALS_QUERY = """
+    SELECT tsd.name, tsd.from_time, tsd.to_time
+    FROM `tabTimesheet Detail` tsd
+    INNER JOIN `tabTimesheet` ts ON tsd.parent = ts.name
+    WHERE ts.employee = %(employee)s
+    AND ts.docstatus < 2
+    AND tsd.parenttype = 'Timesheet'
+    AND tsd.from_time < %(to_time)s
+    AND tsd.to_time > %(from_time)s
+    {conditions}
+    ORDER BY tsd.from_time
+"""
+
+
+def get_employee_intervals(employee, from_time, to_time, exclude=None):
+    """
+    Restituisce le attività dell'employee (su tutti i suoi Timesheet non annullati) che si
+    sovrappongono all'intervallo [from_time, to_time), come lista di (name, from_time, to_time).
+    La ricerca usa gli indici su Timesheet(employee) e Timesheet Detail(parent, from_time, to_time)
+    invece di caricare e scorrere i time_logs del documento.
+    """
+    conditions = ""
+    values = {
+        "employee": employee,
+        "from_time": get_datetime(from_time),
+        "to_time": get_datetime(to_time)
+    }
+
+    if exclude:
+        conditions = "AND tsd.name NOT IN %(exclude)s"
+        values["exclude"] = tuple(exclude)
+
+    return frappe.db.sql(EMPLOYEE_INTERVALS_QUERY.format(conditions=conditions), values)
+
+
+def has_overlap(from_time, to_time, intervals):
+    """
+    Verifica in memoria se l'intervallo si sovrappone a uno di quelli indicati
+    """
+    return any(
+        from_time < existing_to and to_time > existing_from
+        for _name, existing_from, existing_to in intervals
+        if existing_from and existing_to
+    )
+
+
+def validate_no_overlap(employee, from_time, to_time, exclude=None, message=None):
+    """
+    Solleva un errore se l'employee ha già un'attività nella fascia oraria indicata
+    """
+    from_time = get_datetime(from_time)
+    to_time = get_datetime(to_time)
+
+    if get_employee_intervals(employee, from_time, to_time, exclude=exclude):
+        frappe.throw(message or _("Attività già presente per il giorno e fascia oraria selezionati."))
+
+
+def validate_entries_no_overlap(entries, message=None):
+    """
+    Verifica un insieme di nuove attività (employee, from_time, to_time): una sola query per
+    employee sull'intervallo complessivo, poi controllo in memoria anche tra le nuove voci
+    """
+    by_employee = {}
+    for employee, from_time, to_time in entries:
+        by_employee.setdefault(employee, []).append((get_datetime(from_time), get_datetime(to_time)))
+
+    for employee, ranges in by_employee.items():
+        intervals = list(get_employee_intervals(
+            employee,
+            min(from_time for from_time, _to in ranges),
+            max(to_time for _from, to_time in ranges)
+        ))
+
+        for from_time, to_time in sorted(ranges):
+            if has_overlap(from_time, to_time, intervals):
+                frappe.throw(message or _("Attività già presente per il giorno e fascia oraria selezionati."))
+            intervals.append((None, from_time, to_time))
@@ -0,0 +1,112 @@
+import frappe
+
+# Ruoli che hanno visibilità completa su tutti i timesheet
+MANAGER_ROLES = ["System Manager", "HR Manager", "HR User"]
+
+# Hash Redis che contiene il contesto permessi serializzato per ogni utente
+PERMISSION_CONTEXT_CACHE_KEY = "advanced_tc_permission_context"
+
+
+def get_permission_context(user=None):
+    """
+    Restituisce il contesto permessi (ruoli, is_manager, employee corrente) per l'utente.
+    Il contesto viene risolto una sola volta per richiesta e memorizzato in Redis per utente,
+    così i percorsi "caldi" non eseguono query di autorizzazione sul database.
+    """
+    user = user or frappe.session.user
+
+    # Cache per la durata della richiesta
+    local_cache = getattr(frappe.local, "advanced_tc_permission_context", None)
+    if local_cache is None:
+        local_cache = frappe.local.advanced_tc_permission_context = {}
+
+    if user in local_cache:
+        return local_cache[user]
+
+    context = frappe.cache().hget(PERMISSION_CONTEXT_CACHE_KEY, user)
+    if not context:
+        context = build_permission_context(user)
+        frappe.cache().hset(PERMISSION_CONTEXT_CACHE_KEY, user, context)
+
+    context = frappe._dict(context)
+    local_cache[user] = context
+    return context
+
+
+def build_permission_context(user):
+    """
+    Calcola il contesto permessi interrogando ruoli ed Employee associato all'utente
+    """
+    roles = frappe.get_roles(user)
+    is_manager = any(role in roles for role in MANAGER_ROLES)
+    is_employee = "Employee" in roles
+
+    employee = frappe.db.get_value("Employee", {"user_id": user}, ["name", "employee_name"], as_dict=True)
+
+    return {
+        "user_id": user,
+        "roles": roles,
+        "is_manager": is_manager,
+        "is_employee": is_employee,
+        # Employee semplice: vede e modifica solo i propri timesheet
+        "is_restricted": not is_manager and is_employee,
+        "current_employee": employee.name if employee else None,
+        "employee_name": (employee.employee_name or employee.name) if employee else None,
+    }
+
+
+def clear_permission_context(user=None):
+    """
+    Invalida il contesto permessi in cache per un utente (o per tutti se user è None)
+    """
+    if user:
+        frappe.cache().hdel(PERMISSION_CONTEXT_CACHE_KEY, user)
+    else:
+        frappe.cache().delete_value(PERMISSION_CONTEXT_CACHE_KEY)
+
+    local_cache = getattr(frappe.local, "advanced_tc_permission_context", None)
+    if local_cache:
+        if user:
+            local_cache.pop(user, None)
+        else:
+            local_cache.clear()
+
+
+def on_employee_change(doc, method=None):
+    """
+    Hook doc_events per Employee: invalida il contesto dell'utente collegato
+    (sia quello attuale che quello precedente in caso di cambio di user_id)
+    """
+    users = {doc.get("user_id")}
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        users.add(previous.get("user_id"))
+
+    for user in users:
+        if user:
+            clear_permission_context(user)
+
+
+def on_employee_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di un Employee
+    """
+    if doc.get("user_id"):
+        clear_permission_context(doc.user_id)
+
+
+def on_user_change(doc, method=None):
+    """
+    Hook doc_events per User: le modifiche ai ruoli (child table Has Role) vengono salvate
+    insieme al documento User, quindi l'invalidazione avviene qui
+    """
+    clear_permission_context(doc.name)
+
+
+def on_has_role_change(doc, method=None):
+    """
+    Hook doc_events per Has Role inserite o rimosse direttamente (fuori dal salvataggio dello User)
+    """
+    if doc.get("parenttype") == "User" and doc.get("parent"):
+        clear_permission_context(doc.parent)
@@ -0,0 +1,66 @@
+import frappe
+from frappe.utils import getdate
+
+from advanced_tc.api import event_cache
+
+# Evento realtime con le modifiche di un Timesheet, ascoltato dai calendari aperti
+TIMESHEET_CHANGE_EVENT = "advanced_tc_timesheet_change"
+
+
+def publish_timesheet_change(timesheet, employee, from_date=None, to_date=None, deleted=()):
+    """
+    Pubblica le modifiche di un Timesheet dopo il commit, solo come notifica (Timesheet, employee,
+    intervallo di date): i calendari che mostrano l'intervallo recuperano gli eventi con il sync
+    incrementale di get_timesheet_changes, che applica i permessi di lettura dei Timesheet.
+    La room del documento Employee riceve anche i nomi delle righe eliminate (rimosse subito);
+    i suoi membri sono gli utenti che leggono l'Employee, non necessariamente i suoi Timesheet.
+    """
+    if not employee:
+        return
+
+    hint = {
+        "timesheet": timesheet,
+        "employee": employee,
+        "from_date": str(from_date) if from_date else None,
+        "to_date": str(to_date) if to_date else None,
+    }
+
+    frappe.publish_realtime(
+        TIMESHEET_CHANGE_EVENT,
+        dict(hint, deleted=list(deleted)),
+        doctype="Employee",
+        docname=employee,
+        after_commit=True
+    )
+
+    frappe.publish_realtime(TIMESHEET_CHANGE_EVENT, hint, doctype="Timesheet", after_commit=True)
+
+
+def on_timesheet_change(doc, method=None):
+    """
+    Hook doc_events per Timesheet (save, cancel, delete; il submit esegue anche on_update)
+    """
+    current = {d.name for d in doc.get("time_logs") or [] if d.name}
+    from_date, to_date = event_cache.get_timesheet_date_range(doc)
+
+    if method in ("on_trash", "on_cancel"):
+        # Le righe escono da tutte le viste
+        publish_timesheet_change(doc.name, doc.employee, from_date, to_date, deleted=current)
+        return
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    previous_names = {d.name for d in previous.get("time_logs") or [] if d.name} if previous else set()
+
+    if previous and previous.get("employee") and previous.get("employee") != doc.get("employee"):
+        # Cambio employee: le righe spariscono dal calendario del precedente
+        publish_timesheet_change(doc.name, previous.employee, from_date, to_date, deleted=previous_names)
+        previous_names = set()
+
+    publish_timesheet_change(doc.name, doc.employee, from_date, to_date, deleted=previous_names - current)
+
+
+def on_timesheet_fast_update(timesheet, from_date, to_date):
+    """
+    Pubblicazione per gli aggiornamenti diretti di update_detail_times (senza doc_events)
+    """
+    publish_timesheet_change(timesheet.name, timesheet.employee, getdate(from_date), getdate(to_date))
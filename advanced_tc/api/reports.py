@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from tempfile import SpooledTemporaryFile
+
+import frappe
+from frappe import _
+from frappe.utils import flt, nowdate
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import build_event_conditions
+
+# Dimensioni di raggruppamento: nome -> [(espressione SQL, intestazione colonna)]
+REPORT_DIMENSIONS = {
+    "employee": [("ts.employee", "Employee"), ("ts.employee_name", "Employee Name")],
+    "project": [("tsd.project", "Project"), ("p.project_name", "Project Name")],
+    "task": [("tsd.task", "Task"), ("t.subject", "Task Subject")],
+    "activity_type": [("tsd.activity_type", "Activity Type")],
+    "week": [("DATE_SUB(DATE(tsd.from_time), INTERVAL WEEKDAY(tsd.from_time) DAY)", "Week")],
+    "date": [("DATE(tsd.from_time)", "Date")],
+}
+
+DEFAULT_GROUP_BY = ["employee", "project"]
+
+REPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Oltre questa dimensione (byte) il file in preparazione passa dalla memoria al disco
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+@frappe.whitelist()
+def export_timesheet_report(start_date=None, end_date=None, filters=None, group_by=None, file_format="csv"):
+    """
+    Esporta le ore aggregate in SQL (GROUP BY sulle dimensioni richieste) con la stessa visibilità
+    per ruolo e gli stessi filtri del calendario. Le righe vengono lette una alla volta
+    (frappe.db.unbuffered_cursor) e scritte su un file temporaneo, in memoria fino a SPOOL_MAX_SIZE
+    e poi su disco, restituito come file al termine della scrittura.
+    """
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+
+        group_by = parse_group_by(group_by)
+        if file_format not in REPORT_FORMATS:
+            frappe.throw(_("Formato di esportazione non supportato: {0}").format(file_format))
+
+        ctx = get_permission_context()
+        scope = build_event_conditions(ctx, start_date, end_date, filters)
+        if scope is None:
+            frappe.throw(_("Non autorizzato a esportare questi dati"), frappe.PermissionError)
+
+        conditions, values, _scope_employee = scope
+        query, header = build_report_query(conditions, group_by)
+        output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+        # Cursore non bufferizzato: le righe arrivano dal database man mano che vengono scritte
+        # (nessun'altra query può essere eseguita finché il blocco non è concluso)
+        with frappe.db.unbuffered_cursor():
+            rows = frappe.db.sql(query, values, as_iterator=True)
+            if file_format == "xlsx":
+                write_xlsx(output, header, rows)
+            else:
+                write_csv(output, header, rows)
+        output.seek(0)
+
+        filename = f"timesheet_report_{start_date or ''}_{end_date or nowdate()}.{file_format}".replace(" ", "_")
+        return Response(
+            wrap_file(frappe.local.request.environ, output),
+            mimetype=REPORT_FORMATS[file_format],
+            direct_passthrough=True,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except frappe.PermissionError:
+        raise
+    except Exception as e:
+        frappe.log_error(f"Errore in export_timesheet_report: {e!s}")
+        frappe.throw(_("Errore nell'esportazione: {0}").format(str(e)))
+
+
+def parse_group_by(group_by):
+    """
+    Dimensioni richieste (lista o stringa JSON / separata da virgole), nell'ordine indicato
+    """
+    if isinstance(group_by, str):
+        group_by = json.loads(group_by) if group_by.startswith("[") else group_by.split(",")
+
+    group_by = [dimension.strip() for dimension in group_by or [] if dimension and dimension.strip()]
+    invalid = [dimension for dimension in group_by if dimension not in REPORT_DIMENSIONS]
+    if invalid:
+        frappe.throw(_("Raggruppamento non valido: {0}").format(", ".join(invalid)))
+
+    return list(dict.fromkeys(group_by)) or DEFAULT_GROUP_BY
+
+
+def build_report_query(conditions, group_by):
+    """
+    Query aggregata e intestazioni delle colonne per le dimensioni indicate
+    """
+    columns = [column for dimension in group_by for column in REPORT_DIMENSIONS[dimension]]
+    expressions = [expression for expression, _label in columns]
+    where_clause = " AND " + " AND ".join(conditions) if conditions else ""
+
+    query = f"""
+        SELECT
+            {", ".join(expressions)},
+            SUM(tsd.hours) as hours,
+            COUNT(*) as entries
+        FROM
+            `tabTimesheet Detail` tsd
+        INNER JOIN
+            `tabTimesheet` ts ON tsd.parent = ts.name
+        LEFT JOIN
+            `tabProject` p ON tsd.project = p.name
+        LEFT JOIN
+            `tabTask` t ON tsd.task = t.name
+        WHERE
+            ts.docstatus < 2 {where_clause}
+        GROUP BY
+            {", ".join(expressions)}
+        ORDER BY
+            {", ".join(expressions)}
+    """
+
+    return query, [label for _expression, label in columns] + ["Hours", "Entries"]
+
+
+def format_report_row(row):
+    """
+    Valori serializzabili: date come stringa ISO, ore arrotondate al centesimo
+    """
+    *dimensions, hours, entries = row
+    return [str(value) if hasattr(value, "isoformat") else value for value in dimensions] + [
+        flt(hours, 2),
+        entries
+    ]
+
+
+def write_csv(output, header, rows):
+    # utf-8-sig: Excel riconosce la codifica dei nomi accentati
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(format_report_row(row))
+    text.flush()
+    text.detach()
+
+
+def write_xlsx(output, header, rows):
+    from openpyxl import Workbook
+
+    # write_only: le righe non restano in memoria nel foglio
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Timesheet")
+    sheet.append(header)
+    for row in rows:
+        sheet.append(format_report_row(row))
+    workbook.save(output)
@@ -0,0 +1,140 @@
+import frappe
+from frappe.utils import add_days, getdate
+
+from advanced_tc.api import event_cache
+
+# Tabella dei totali giornalieri (employee, giorno, progetto, activity type).
+# Le righe sono ricalcolate via SQL per le sole giornate toccate da una modifica;
+# le attività sono attribuite al giorno del loro inizio, come nel riepilogo mensile.
+ROLLUP_DOCTYPE = "Timesheet Daily Rollup"
+
+# Nome della riga: deterministico per (employee, giorno, progetto, activity type)
+ROLLUP_NAME = "MD5(CONCAT_WS('|', ts.employee, DATE(tsd.from_time), IFNULL(tsd.project, ''), IFNULL(tsd.activity_type, '')))"
+
+ROLLUP_SOURCE = """
+    FROM
+        `tabTimesheet Detail` tsd
+    INNER JOIN
+        `tabTimesheet` ts ON tsd.parent = ts.name
+    WHERE
+        ts.docstatus < 2 AND ts.employee IS NOT NULL
+        AND tsd.parenttype = 'Timesheet' AND tsd.from_time IS NOT NULL {conditions}
+"""
+
+ROLLUP_INSERT = """
+    INSERT INTO `tabTimesheet Daily Rollup`
+        (name, creation, modified, owner, modified_by, docstatus, idx,
+        employee, employee_name, date, project, activity_type, hours, entries)
+    SELECT
+        """ + ROLLUP_NAME + """,
+        NOW(), NOW(), 'Administrator', 'Administrator', 0, 0,
+        ts.employee,
+        MAX(ts.employee_name),
+        DATE(tsd.from_time),
+        tsd.project,
+        tsd.activity_type,
+        SUM(tsd.hours),
+        COUNT(*)
+    """ + ROLLUP_SOURCE + """
+    GROUP BY
+        ts.employee, DATE(tsd.from_time), tsd.project, tsd.activity_type
+"""
+
+# Aggiornamento incrementale: le righe esistenti vengono aggiornate sul nome (chiave primaria)
+ROLLUP_UPSERT = ROLLUP_INSERT + """
+    ON DUPLICATE KEY UPDATE
+        modified = VALUES(modified),
+        employee_name = VALUES(employee_name),
+        hours = VALUES(hours),
+        entries = VALUES(entries)
+"""
+
+ROLLUP_LIVE_NAMES = "SELECT DISTINCT " + ROLLUP_NAME + ROLLUP_SOURCE
+
+
+def refresh_rollup(employee, from_date, to_date, exclude_timesheet=None):
+    """
+    Ricalcola i totali dell'employee per i giorni da from_date a to_date inclusi.
+    exclude_timesheet esclude un Timesheet in corso di eliminazione (le sue righe sono ancora nel database).
+
+    Niente DELETE + INSERT sull'intervallo: con due transazioni concorrenti sullo stesso employee
+    i gap lock della DELETE bloccano a vicenda gli INSERT (deadlock InnoDB). Le righe vengono
+    aggiornate con INSERT ... ON DUPLICATE KEY UPDATE sul nome e si eliminano per nome solo
+    quelle non più presenti.
+    """
+    if not employee or not from_date or not to_date:
+        return
+
+    values = {
+        "employee": employee,
+        "from_date": getdate(from_date),
+        "to_date": getdate(to_date),
+        "range_start": getdate(from_date),
+        "range_end": add_days(getdate(to_date), 1),
+        "exclude_timesheet": exclude_timesheet,
+    }
+
+    conditions = """
+        AND ts.employee = %(employee)s
+        AND tsd.from_time >= %(range_start)s AND tsd.from_time < %(range_end)s
+    """
+    if exclude_timesheet:
+        conditions += " AND ts.name != %(exclude_timesheet)s"
+
+    live_names = {row[0] for row in frappe.db.sql(ROLLUP_LIVE_NAMES.format(conditions=conditions), values)}
+    stale_names = [
+        name
+        for name in frappe.db.sql_list("""
+            SELECT name FROM `tabTimesheet Daily Rollup`
+            WHERE employee = %(employee)s AND date BETWEEN %(from_date)s AND %(to_date)s
+        """, values)
+        if name not in live_names
+    ]
+
+    if live_names:
+        frappe.db.sql(ROLLUP_UPSERT.format(conditions=conditions), values)
+
+    if stale_names:
+        frappe.db.sql("DELETE FROM `tabTimesheet Daily Rollup` WHERE name IN %(names)s", {"names": tuple(stale_names)})
+
+
+def rebuild_rollup(from_date=None, to_date=None):
+    """
+    Ricostruisce la tabella (tutta o per un intervallo di date) con un'unica INSERT ... SELECT
+    """
+    values = {}
+    delete_conditions = []
+    insert_conditions = ""
+
+    if from_date:
+        values["from_date"] = getdate(from_date)
+        delete_conditions.append("date >= %(from_date)s")
+        insert_conditions += " AND tsd.from_time >= %(from_date)s"
+
+    if to_date:
+        values["to_date"] = getdate(to_date)
+        values["range_end"] = add_days(getdate(to_date), 1)
+        delete_conditions.append("date <= %(to_date)s")
+        insert_conditions += " AND tsd.from_time < %(range_end)s"
+
+    where_clause = "WHERE " + " AND ".join(delete_conditions) if delete_conditions else ""
+    frappe.db.sql(f"DELETE FROM `tabTimesheet Daily Rollup` {where_clause}", values)
+    frappe.db.sql(ROLLUP_INSERT.format(conditions=insert_conditions), values)
+
+    return frappe.db.count(ROLLUP_DOCTYPE)
+
+
+def on_timesheet_change(doc, method=None):
+    """
+    Hook doc_events per Timesheet (save, cancel, delete): ricalcola i giorni coperti dal
+    Timesheet, compreso lo stato precedente al salvataggio, per l'employee attuale e precedente
+    """
+    from_date, to_date = event_cache.get_timesheet_date_range(doc)
+    employees = {doc.get("employee")}
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if previous:
+        employees.add(previous.get("employee"))
+
+    for employee in employees:
+        refresh_rollup(employee, from_date, to_date, exclude_timesheet=doc.name if method == "on_trash" else None)
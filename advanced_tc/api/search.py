@@ -0,0 +1,191 @@
+import functools
+import json
+
+import frappe
+from frappe.utils import cint
+
+# Ricerca per le link query dei dialog (autocomplete).
+# Le sorgenti SQL usano LIKE 'txt%' (utilizzabile dagli indici, vedi db_indexes.CALENDAR_INDEXES)
+# con paginazione keyset; i risultati sono in cache per (sorgente, scope, prefisso) e una ricerca
+# più lunga viene risolta in memoria restringendo quella del prefisso più corto, se completa.
+SEARCH_CACHE_PREFIX = "advanced_tc_search"
+
+# Generazione corrente della cache per ogni doctype sorgente: cambiarla invalida le ricerche
+# che leggono quel doctype (le chiavi vecchie scadono col TTL)
+SEARCH_GENERATION_KEY = "advanced_tc_search_generation"
+
+# Doctype letti da ciascuna sorgente di ricerca: la modifica di un Timesheet non invalida
+# le ricerche che leggono solo i Project, e viceversa
+SEARCH_SOURCE_DOCTYPES = {
+    "open_projects": ("Project",),
+    "timesheet_projects": ("Project", "Timesheet"),
+    "project_timesheets": ("Timesheet",),
+}
+
+# Durata predefinita (secondi) dei risultati in cache, configurabile da site_config
+DEFAULT_SEARCH_CACHE_TTL = 5 * 60
+
+# Righe memorizzate per ogni prefisso (le pagine successive proseguono con la keyset)
+SEARCH_CACHE_ROWS = 100
+
+DEFAULT_PAGE_LEN = 20
+
+# Campi dei doctype sorgente letti dalle ricerche: le altre modifiche non invalidano la cache
+# (per i Timesheet conta anche l'insieme dei progetti delle righe, vedi has_search_fields_changed)
+SEARCH_SOURCE_FIELDS = {
+    "Project": ("project_name", "status"),
+    "Timesheet": ("employee", "docstatus"),
+}
+
+
+def get_search_cache_ttl():
+    """
+    TTL dei risultati in cache; impostare advanced_tc_search_cache_ttl a 0 per disabilitare la cache
+    """
+    return cint(frappe.conf.get("advanced_tc_search_cache_ttl", DEFAULT_SEARCH_CACHE_TTL))
+
+
+def prefix_pattern(txt):
+    """
+    Pattern LIKE per la ricerca per prefisso (i caratteri jolly digitati vengono trattati come testo)
+    """
+    txt = (txt or "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{txt}%"
+
+
+def matches_prefix(txt, *values):
+    """
+    Equivalente in memoria di "campo LIKE 'txt%'" (case insensitive) su almeno uno dei valori
+    """
+    if not txt:
+        return True
+
+    txt = txt.lower()
+    return any((value or "").lower().startswith(txt) for value in values)
+
+
+def paginate(rows, start, page_len):
+    start = cint(start)
+    return rows[start:start + cint(page_len)] if cint(page_len) else rows[start:]
+
+
+def get_generation_key(doctype):
+    return f"{SEARCH_GENERATION_KEY}|{doctype}"
+
+
+def get_bucket_key(source, scope):
+    generation = "|".join(
+        frappe.cache().get_value(get_generation_key(doctype), lambda: frappe.generate_hash(length=8))
+        for doctype in SEARCH_SOURCE_DOCTYPES[source]
+    )
+    return f"{SEARCH_CACHE_PREFIX}|{generation}|{source}|{json.dumps(scope, sort_keys=True, default=str)}"
+
+
+def get_cached_rows(bucket_key, txt, match):
+    """
+    Risultati in cache per il prefisso, oppure quelli di un prefisso più corto completo
+    (tutte le corrispondenze in cache) ristretti in memoria
+    """
+    entry = frappe.cache().hget(bucket_key, txt)
+    if entry:
+        return entry
+
+    for length in range(len(txt) - 1, -1, -1):
+        shorter = frappe.cache().hget(bucket_key, txt[:length])
+        if shorter and shorter["complete"]:
+            return {"rows": [row for row in shorter["rows"] if match(txt, row)], "complete": True}
+
+    return None
+
+
+def search(source, scope, txt, start, page_len, fetch, match, width=None):
+    """
+    Esegue una ricerca per prefisso con cache e paginazione keyset.
+
+    fetch(txt, after, limit) restituisce le righe ordinate successive ad `after` (ultima riga già letta,
+    None per la prima pagina); match(txt, row) indica se una riga soddisfa il prefisso; width limita
+    le colonne restituite (le colonne in più servono solo alla keyset).
+    """
+    txt = (txt or "").strip()
+    start = cint(start)
+    needed = start + (cint(page_len) or DEFAULT_PAGE_LEN)
+    ttl = get_search_cache_ttl()
+
+    entry = None
+    bucket_key = None
+    if ttl:
+        bucket_key = get_bucket_key(source, scope)
+        entry = get_cached_rows(bucket_key, txt, match)
+
+    if entry is None:
+        limit = max(SEARCH_CACHE_ROWS, needed)
+        rows = list(fetch(txt, None, limit + 1))
+        entry = {"rows": rows[:limit], "complete": len(rows) <= limit}
+
+        if ttl:
+            frappe.cache().hset(bucket_key, txt, entry)
+            frappe.cache().expire(frappe.cache().make_key(bucket_key), ttl)
+
+    rows = entry["rows"]
+    if len(rows) < needed and not entry["complete"] and rows:
+        # Pagina oltre le righe in cache: prosegue dall'ultima riga letta
+        rows = rows + list(fetch(txt, rows[-1], needed - len(rows)))
+
+    rows = rows[start:needed]
+    return [tuple(row[:width]) for row in rows] if width else rows
+
+
+def clear_search_cache(doctype=None):
+    """
+    Invalida le ricerche che leggono il doctype indicato (tutte se non indicato)
+    passando a una nuova generazione
+    """
+    doctypes = [doctype] if doctype else {d for doctypes in SEARCH_SOURCE_DOCTYPES.values() for d in doctypes}
+    for d in doctypes:
+        frappe.cache().set_value(get_generation_key(d), frappe.generate_hash(length=8))
+
+
+def get_time_log_projects(doc):
+    return {d.get("project") for d in doc.get("time_logs") or [] if d.get("project")}
+
+
+def has_search_fields_changed(doc, method=None):
+    """
+    True se la modifica cambia i dati letti dalle ricerche: documento nuovo o eliminato,
+    campi di SEARCH_SOURCE_FIELDS o progetti delle righe del Timesheet
+    """
+    if method == "on_trash":
+        return True
+
+    previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+    if not previous:
+        return True
+
+    if any(previous.get(fieldname) != doc.get(fieldname) for fieldname in SEARCH_SOURCE_FIELDS[doc.doctype]):
+        return True
+
+    return doc.doctype == "Timesheet" and get_time_log_projects(previous) != get_time_log_projects(doc)
+
+
+def clear_search_cache_after_commit(doctype):
+    """
+    Invalidazione rimandata al commit: prima del commit una ricerca concorrente
+    riempirebbe la nuova generazione con i dati precedenti
+    """
+    frappe.db.after_commit.add(functools.partial(clear_search_cache, doctype))
+
+
+def on_search_source_change(doc, method=None):
+    """
+    Hook doc_events per Project e Timesheet: invalida le ricerche che leggono il doctype modificato,
+    solo se sono cambiati i campi che leggono
+    """
+    if has_search_fields_changed(doc, method):
+        clear_search_cache_after_commit(doc.doctype)
+
+
+def on_search_source_rename(doc, method=None, old=None, new=None, merge=False):
+    """
+    Hook doc_events per la rinomina di Project e Timesheet
+    """
+    clear_search_cache_after_commit(doc.doctype)
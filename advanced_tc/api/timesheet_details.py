@@ -1,154 +1,570 @@
 import frappe
 from frappe import _
-from frappe.utils import getdate, get_datetime, nowdate, add_days
+from frappe.utils import getdate, get_datetime, nowdate, now_datetime, add_days, cint, flt
+import hashlib
 import json
 import re
 from datetime import datetime, timedelta
 
-def get_week_start_date(date):
+from advanced_tc.api import assignments, event_cache, event_sync, realtime, rollup, search
+from advanced_tc.api.colors import get_event_color, get_project_color_map
+from advanced_tc.api.instrumentation import instrumented
+from advanced_tc.api.overlaps import validate_entries_no_overlap, validate_no_overlap
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.weekly_timesheets import find_week_timesheet, get_week_start_date, lock_employee_week
+from advanced_tc.api.wire_format import encode_events_compact
+
+@frappe.whitelist()
+@instrumented
+def get_timesheet_details(start_date=None, end_date=None, filters=None, compact=0, slim=0):
+    """
+    Recupera i Time Sheet Detail per la calendar view con controllo permessi basato sui ruoli.
+    Con compact=1 gli eventi vengono restituiti nel formato colonnare di wire_format,
+    con slim=1 solo con i campi necessari al rendering (dettagli con get_timesheet_detail_info).
+    """
+    try:
+        return encode_events(get_window_events(start_date, end_date, filters), compact, slim)
+    
+    except Exception as e:
+        frappe.log_error(f"Errore in get_timesheet_details: {str(e)}")
+        frappe.throw(_("Errore nel recupero dei dati: {0}").format(str(e)))
+
+def get_window_events(start_date=None, end_date=None, filters=None):
     """
-    Calcola l'inizio della settimana (lunedì) per una data specifica
+    Lista degli eventi formattati della finestra, servita dalla cache Redis quando disponibile
     """
-    if isinstance(date, str):
-        date = getdate(date)
+    # Parse dei filtri se forniti come stringa JSON
+    if filters and isinstance(filters, str):
+        filters = json.loads(filters)
+    
+    # Controllo permessi basato sui ruoli
+    ctx = get_permission_context()
     
-    # Calcola quanti giorni sottrarre per arrivare al lunedì (0=lunedì, 6=domenica)
-    days_since_monday = date.weekday()
-    week_start = date - timedelta(days=days_since_monday)
+    scope = build_event_conditions(ctx, start_date, end_date, filters)
+    if scope is None:
+        # Utente non associato a nessun employee o non autorizzato sul filtro richiesto
+        return []
     
-    return week_start
+    conditions, values, scope_employee = scope
+    
+    # Le finestre già calcolate vengono servite dalla cache Redis
+    cache_field = event_cache.make_window_field(start_date, end_date, filters)
+    events = event_cache.get_window(scope_employee, cache_field)
+    if events is not None:
+        return events
+    
+    results = fetch_event_rows(conditions, values)
+    
+    # Formattazione per FullCalendar
+    events = [format_event(row) for row in results]
+    
+    event_cache.set_window(scope_employee, cache_field, events)
+    
+    return events
+
+# Paginazione del feed eventi: dimensione predefinita/massima della pagina e limite
+# complessivo di righe per finestra (configurabili da site_config)
+DEFAULT_EVENT_PAGE_SIZE = 500
+MAX_EVENT_PAGE_SIZE = 2000
+DEFAULT_EVENT_ROW_CAP = 10000
 
 @frappe.whitelist()
-def get_timesheet_details(start_date=None, end_date=None, filters=None):
+@instrumented
+def get_timesheet_details_page(start_date=None, end_date=None, filters=None, after=None, page_size=None, fetched=0, compact=0, slim=0):
     """
-    Recupera i Time Sheet Detail per la calendar view con controllo permessi basato sui ruoli
+    Variante paginata di get_timesheet_details per le viste mensili e manager complete.
+    Paginazione keyset su (from_time, name): "after" è la coppia restituita come "next"
+    dalla pagina precedente, "fetched" il numero di eventi già ricevuti dal client,
+    usato per applicare il limite massimo di righe per finestra.
     """
     try:
-        # Parse dei filtri se forniti come stringa JSON
         if filters and isinstance(filters, str):
             filters = json.loads(filters)
         
-        # Controllo permessi basato sui ruoli
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
-        
-        # Costruzione della query base
-        conditions = []
-        values = {}
-        
-        # Se l'utente è solo Employee, limita ai propri timesheet
-        if not is_manager and "Employee" in user_roles:
-            # Ottieni l'employee associato all'utente corrente
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if current_employee:
-                conditions.append("ts.employee = %(current_employee)s")
-                values["current_employee"] = current_employee
+        if after and isinstance(after, str):
+            after = json.loads(after)
+        
+        page_size = cint(page_size) or cint(frappe.conf.get("advanced_tc_event_page_size")) or DEFAULT_EVENT_PAGE_SIZE
+        page_size = min(max(page_size, 1), MAX_EVENT_PAGE_SIZE)
+        row_cap = cint(frappe.conf.get("advanced_tc_event_row_cap")) or DEFAULT_EVENT_ROW_CAP
+        remaining = row_cap - cint(fetched)
+        
+        response = {"events": [], "next": None, "truncated": False}
+        
+        # Il cursore per il sync incrementale viene fornito con la prima pagina
+        if not after:
+            response["cursor"] = event_sync.get_sync_cursor()
+        
+        if remaining <= 0:
+            response["truncated"] = True
+            return response
+        
+        ctx = get_permission_context()
+        scope = build_event_conditions(ctx, start_date, end_date, filters)
+        if scope is None:
+            return response
+        
+        conditions, values, _scope_employee = scope
+        
+        if after:
+            conditions.append(
+                "(tsd.from_time > %(after_time)s OR (tsd.from_time = %(after_time)s AND tsd.name > %(after_name)s))"
+            )
+            values["after_time"] = get_datetime(after[0])
+            values["after_name"] = after[1]
+        
+        limit = min(page_size, remaining)
+        
+        # Una riga in più per sapere se esiste una pagina successiva
+        rows = fetch_event_rows(conditions, values, order_by="tsd.from_time ASC, tsd.name ASC", limit=limit + 1)
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        response["events"] = encode_events([format_event(row) for row in rows], compact, slim)
+        
+        if has_more:
+            if limit < page_size:
+                # Raggiunto il limite massimo di righe per la finestra
+                response["truncated"] = True
             else:
-                # Se non è associato a nessun employee, non mostrare nulla
-                return []
-        
-        # Filtri per date
-        if start_date:
-            conditions.append("tsd.from_time >= %(start_date)s")
-            values["start_date"] = get_datetime(start_date)
-        
-        if end_date:
-            conditions.append("tsd.to_time <= %(end_date)s")
-            values["end_date"] = get_datetime(end_date)
-        
-        # Filtri aggiuntivi (solo per manager o se il filtro employee corrisponde all'utente corrente)
-        if filters:
-            if filters.get("employee"):
-                # Se non è manager, verifica che stia filtrando solo per se stesso
-                if not is_manager:
-                    current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-                    if filters["employee"] != current_employee:
-                        return []  # Non autorizzato a vedere altri employee
-                conditions.append("ts.employee = %(employee)s")
-                values["employee"] = filters["employee"]
-            
-            if filters.get("project"):
-                conditions.append("tsd.project = %(project)s")
-                values["project"] = filters["project"]
-            
-            if filters.get("activity_type"):
-                conditions.append("tsd.activity_type = %(activity_type)s")
-                values["activity_type"] = filters["activity_type"]
-            
-            if filters.get("task"):
-                conditions.append("tsd.task = %(task)s")
-                values["task"] = filters["task"]
-        
-        # Query SQL
-        where_clause = " AND " + " AND ".join(conditions) if conditions else ""
-        
-        query = f"""
-            SELECT 
-                tsd.name,
-                tsd.parent as timesheet,
-                tsd.from_time,
-                tsd.to_time,
-                tsd.hours,
-                tsd.project,
-                tsd.task,
-                tsd.activity_type,
-                tsd.description,
-                ts.employee,
-                ts.employee_name,
-                ts.company,
-                ts.docstatus,
-                p.project_name,
-                t.subject as task_subject
-            FROM 
-                `tabTimesheet Detail` tsd
-            INNER JOIN 
-                `tabTimesheet` ts ON tsd.parent = ts.name
-            LEFT JOIN 
-                `tabProject` p ON tsd.project = p.name
-            LEFT JOIN 
-                `tabTask` t ON tsd.task = t.name
-            WHERE 
-                ts.docstatus < 2 {where_clause}
-            ORDER BY 
-                tsd.from_time ASC
-        """
-        
-        results = frappe.db.sql(query, values, as_dict=True)
-        
-        # Formattazione per FullCalendar
-        events = []
-        for row in results:
-            event = {
-                "id": row.name,
-                "title": f"{row.project or ''} - {row.activity_type or ''}",
-                "start": row.from_time.isoformat() if row.from_time else None,
-                "end": row.to_time.isoformat() if row.to_time else None,
-                "extendedProps": {
-                    "timesheet": row.timesheet,
-                    "employee": row.employee,
-                    "employee_name": row.employee_name,
-                    "project": row.project,
-                    "project_name": row.project_name,
-                    "task": row.task,
-                    "task_subject": row.task_subject,
-                    "activity_type": row.activity_type,
-                    "description": row.description,
-                    "hours": row.hours,
-                    "company": row.company,
-                    "docstatus": row.docstatus
-                },
-                "backgroundColor": get_event_color(row.project),
-                "borderColor": get_event_color(row.project)
+                last = rows[-1]
+                response["next"] = [last.from_time.isoformat(), last.name]
+        
+        return response
+    
+    except Exception as e:
+        frappe.log_error(f"Errore in get_timesheet_details_page: {str(e)}")
+        frappe.throw(_("Errore nel recupero dei dati: {0}").format(str(e)))
+
+@frappe.whitelist()
+@instrumented
+def get_timesheet_changes(start_date=None, end_date=None, filters=None, since=None, compact=0, slim=0):
+    """
+    Sync incrementale della finestra del calendario: restituisce solo gli eventi inseriti o
+    modificati dopo il cursore "since" e i nomi di quelli eliminati (o usciti dalla finestra).
+    Senza cursore, o con un cursore scaduto, restituisce l'intera finestra con reset=True.
+    """
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+        
+        cursor = event_sync.get_sync_cursor()
+        
+        if not since or event_sync.is_cursor_expired(since):
+            return {
+                "cursor": cursor,
+                "reset": True,
+                "events": get_timesheet_details(start_date, end_date, filters, compact=compact, slim=slim)
             }
-            events.append(event)
         
-        return events
+        ctx = get_permission_context()
+        
+        # Le righe modificate vengono cercate solo per ambito (ruolo e filtro employee):
+        # quelle che non rientrano più nella finestra o nei filtri vanno rimosse dal client
+        scope_filters = {"employee": filters.get("employee")} if filters else None
+        scope = build_event_conditions(ctx, filters=scope_filters)
+        if scope is None:
+            return {"cursor": cursor, "reset": True, "events": []}
+        
+        conditions, values, _scope_employee = scope
+        conditions.append("ts.modified > %(since)s")
+        values["since"] = get_datetime(since)
+        
+        # Stessa semantica della query SQL, che confronta i datetime senza timezone
+        window_start = get_datetime(start_date).replace(tzinfo=None) if start_date else None
+        window_end = get_datetime(end_date).replace(tzinfo=None) if end_date else None
+        
+        upserts = []
+        deleted = set()
+        for row in fetch_event_rows(conditions, values, include_cancelled=True):
+            if row.docstatus < 2 and row_matches_window(row, window_start, window_end, filters):
+                upserts.append(format_event(row))
+            else:
+                deleted.add(row.name)
+        
+        upserted = {event["id"] for event in upserts}
+        deleted.update(name for name in event_sync.get_tombstones(since) if name not in upserted)
+        
+        return {
+            "cursor": cursor,
+            "reset": False,
+            "upserts": encode_events(upserts, compact, slim),
+            "deleted": sorted(deleted)
+        }
     
     except Exception as e:
-        frappe.log_error(f"Errore in get_timesheet_details: {str(e)}")
+        frappe.log_error(f"Errore in get_timesheet_changes: {str(e)}")
+        frappe.throw(_("Errore nel recupero delle modifiche: {0}").format(str(e)))
+
+@frappe.whitelist()
+@instrumented
+def get_timesheet_window(start_date=None, end_date=None, filters=None, version=None, compact=0, slim=0):
+    """
+    Richiesta condizionale di una finestra (usata dal prefetch delle finestre adiacenti):
+    la versione è calcolata con una sola query aggregata (numero di righe e ultima modifica);
+    se coincide con quella inviata dal client gli eventi non vengono restituiti.
+    Il cursore permette al client di proseguire con il sync incrementale di get_timesheet_changes.
+    """
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+        
+        cursor = event_sync.get_sync_cursor()
+        current_version = get_window_version(start_date, end_date, filters)
+        
+        if version and version == current_version:
+            return {"version": current_version, "cursor": cursor, "not_modified": True}
+        
+        return {
+            "version": current_version,
+            "cursor": cursor,
+            "events": encode_events(get_window_events(start_date, end_date, filters), compact, slim)
+        }
+    
+    except Exception as e:
+        frappe.log_error(f"Errore in get_timesheet_window: {str(e)}")
         frappe.throw(_("Errore nel recupero dei dati: {0}").format(str(e)))
 
+def get_window_version(start_date=None, end_date=None, filters=None):
+    """
+    Versione della finestra: cambia con ogni inserimento, modifica o eliminazione di una riga
+    visibile (il conteggio copre le eliminazioni, le date di modifica gli aggiornamenti)
+    """
+    scope = build_event_conditions(get_permission_context(), start_date, end_date, filters)
+    if scope is None:
+        return None
+    
+    conditions, values, _scope_employee = scope
+    where_clause = " AND " + " AND ".join(conditions) if conditions else ""
+    
+    count, ts_modified, tsd_modified = frappe.db.sql(f"""
+        SELECT COUNT(*), MAX(ts.modified), MAX(tsd.modified)
+        FROM `tabTimesheet Detail` tsd
+        INNER JOIN `tabTimesheet` ts ON tsd.parent = ts.name
+        WHERE ts.docstatus < 2 {where_clause}
+    """, values)[0]
+    
+    return hashlib.md5(f"{count}|{ts_modified}|{tsd_modified}".encode()).hexdigest()[:16]
+
 @frappe.whitelist()
+@instrumented
+def get_timesheet_summary(start_date=None, end_date=None, filters=None):
+    """
+    Totali di ore per giorno / employee / progetto calcolati con un'unica GROUP BY,
+    con gli stessi filtri e la stessa visibilità per ruolo di get_timesheet_details.
+    Usato dalla vista mensile al posto dei singoli eventi.
+    """
+    try:
+        if filters and isinstance(filters, str):
+            filters = json.loads(filters)
+        
+        ctx = get_permission_context()
+        scope = build_event_conditions(ctx, start_date, end_date, filters)
+        if scope is None:
+            return []
+        
+        if can_use_rollup(start_date, end_date, filters):
+            rows = fetch_rollup_summary(start_date, end_date, filters, scope[2])
+        else:
+            rows = fetch_detail_summary(*scope[:2])
+        
+        for row in rows:
+            row.date = str(row.date)
+            row.hours = float(row.hours or 0)
+        
+        return rows
+    
+    except Exception as e:
+        frappe.log_error(f"Errore in get_timesheet_summary: {str(e)}")
+        frappe.throw(_("Errore nel recupero del riepilogo: {0}").format(str(e)))
+
+def can_use_rollup(start_date, end_date, filters):
+    """
+    La tabella dei totali giornalieri non ha la task e contiene giornate intere:
+    si usa solo senza filtro task e con una finestra che inizia e finisce a mezzanotte
+    """
+    if filters and filters.get("task"):
+        return False
+    
+    if not start_date or not end_date:
+        return False
+    
+    return all(get_datetime(value) == get_datetime(getdate(value)) for value in (start_date, end_date))
+
+def fetch_rollup_summary(start_date, end_date, filters, scope_employee):
+    """
+    Riepilogo dalla tabella Timesheet Daily Rollup (una riga per employee, giorno, progetto e activity type)
+    """
+    conditions = ["r.date >= %(start_date)s", "r.date < %(end_date)s"]
+    values = {"start_date": getdate(start_date), "end_date": getdate(end_date)}
+    
+    if scope_employee:
+        conditions.append("r.employee = %(employee)s")
+        values["employee"] = scope_employee
+    
+    for fieldname in ("project", "activity_type"):
+        if filters and filters.get(fieldname):
+            conditions.append(f"r.{fieldname} = %({fieldname})s")
+            values[fieldname] = filters[fieldname]
+    
+    return frappe.db.sql(f"""
+        SELECT 
+            r.date,
+            r.employee,
+            MAX(r.employee_name) as employee_name,
+            r.project,
+            MAX(p.project_name) as project_name,
+            SUM(r.hours) as hours,
+            SUM(r.entries) as entries
+        FROM 
+            `tabTimesheet Daily Rollup` r
+        LEFT JOIN 
+            `tabProject` p ON r.project = p.name
+        WHERE 
+            {" AND ".join(conditions)}
+        GROUP BY 
+            r.date, r.employee, r.project
+        ORDER BY 
+            r.date ASC, employee_name ASC, r.project ASC
+    """, values, as_dict=True)
+
+def fetch_detail_summary(conditions, values):
+    """
+    Riepilogo calcolato direttamente dai Timesheet Detail
+    """
+    where_clause = " AND " + " AND ".join(conditions) if conditions else ""
+    
+    return frappe.db.sql(f"""
+        SELECT 
+            DATE(tsd.from_time) as date,
+            ts.employee,
+            ts.employee_name,
+            tsd.project,
+            p.project_name,
+            SUM(tsd.hours) as hours,
+            COUNT(*) as entries
+        FROM 
+            `tabTimesheet Detail` tsd
+        INNER JOIN 
+            `tabTimesheet` ts ON tsd.parent = ts.name
+        LEFT JOIN 
+            `tabProject` p ON tsd.project = p.name
+        WHERE 
+            ts.docstatus < 2 {where_clause}
+        GROUP BY 
+            DATE(tsd.from_time), ts.employee, ts.employee_name, tsd.project, p.project_name
+        ORDER BY 
+            date ASC, ts.employee_name ASC, tsd.project ASC
+    """, values, as_dict=True)
+
+def row_matches_window(row, window_start=None, window_end=None, filters=None):
+    """
+    Verifica in memoria che una riga eventi rispetti la finestra e i filtri di
+    build_event_conditions (date, progetto, tipo attività e task)
+    """
+    if window_start and (not row.from_time or row.from_time < window_start):
+        return False
+    
+    if window_end and (not row.to_time or row.to_time > window_end):
+        return False
+    
+    for fieldname in ("project", "activity_type", "task"):
+        if filters and filters.get(fieldname) and row.get(fieldname) != filters[fieldname]:
+            return False
+    
+    return True
+
+def build_event_conditions(ctx, start_date=None, end_date=None, filters=None):
+    """
+    Costruisce le condizioni SQL condivise dalle API del calendario (ruoli, date e filtri).
+    Restituisce (conditions, values, scope_employee) oppure None se l'utente non può vedere nulla.
+    scope_employee è l'employee a cui è limitata la query (None per le viste manager complete).
+    """
+    conditions = []
+    values = {}
+    scope_employee = None
+    
+    # Se l'utente è solo Employee, limita ai propri timesheet
+    if ctx.is_restricted:
+        if not ctx.current_employee:
+            # Se non è associato a nessun employee, non mostrare nulla
+            return None
+        conditions.append("ts.employee = %(current_employee)s")
+        values["current_employee"] = ctx.current_employee
+        scope_employee = ctx.current_employee
+    
+    # Filtri per date
+    if start_date:
+        conditions.append("tsd.from_time >= %(start_date)s")
+        values["start_date"] = get_datetime(start_date)
+    
+    if end_date:
+        conditions.append("tsd.to_time <= %(end_date)s")
+        values["end_date"] = get_datetime(end_date)
+    
+    # Filtri aggiuntivi (solo per manager o se il filtro employee corrisponde all'utente corrente)
+    if filters:
+        if filters.get("employee"):
+            # Se non è manager, verifica che stia filtrando solo per se stesso
+            if not ctx.is_manager and filters["employee"] != ctx.current_employee:
+                return None  # Non autorizzato a vedere altri employee
+            conditions.append("ts.employee = %(employee)s")
+            values["employee"] = filters["employee"]
+            scope_employee = filters["employee"]
+        
+        if filters.get("project"):
+            conditions.append("tsd.project = %(project)s")
+            values["project"] = filters["project"]
+        
+        if filters.get("activity_type"):
+            conditions.append("tsd.activity_type = %(activity_type)s")
+            values["activity_type"] = filters["activity_type"]
+        
+        if filters.get("task"):
+            conditions.append("tsd.task = %(task)s")
+            values["task"] = filters["task"]
+    
+    return conditions, values, scope_employee
+
+def fetch_event_rows(conditions, values, order_by="tsd.from_time ASC", limit=None, include_cancelled=False):
+    """
+    Esegue la join Timesheet Detail / Timesheet / Project / Task con le condizioni indicate
+    """
+    query = build_event_query(conditions, order_by, limit, include_cancelled)
+    return frappe.db.sql(query, values, as_dict=True)
+
+def build_event_query(conditions, order_by="tsd.from_time ASC", limit=None, include_cancelled=False):
+    """
+    Query degli eventi del calendario (usata anche da db_indexes.explain_hot_queries)
+    """
+    where_clause = " AND " + " AND ".join(conditions) if conditions else ""
+    docstatus_clause = "ts.docstatus <= 2" if include_cancelled else "ts.docstatus < 2"
+    limit_clause = f"LIMIT {int(limit)}" if limit else ""
+    
+    query = f"""
+        SELECT 
+            tsd.name,
+            tsd.parent as timesheet,
+            tsd.from_time,
+            tsd.to_time,
+            tsd.hours,
+            tsd.project,
+            tsd.task,
+            tsd.activity_type,
+            tsd.description,
+            ts.employee,
+            ts.employee_name,
+            ts.company,
+            ts.docstatus,
+            p.project_name,
+            t.subject as task_subject
+        FROM 
+            `tabTimesheet Detail` tsd
+        INNER JOIN 
+            `tabTimesheet` ts ON tsd.parent = ts.name
+        LEFT JOIN 
+            `tabProject` p ON tsd.project = p.name
+        LEFT JOIN 
+            `tabTask` t ON tsd.task = t.name
+        WHERE 
+            {docstatus_clause} {where_clause}
+        ORDER BY 
+            {order_by}
+        {limit_clause}
+    """
+    
+    return query
+
+# Campi di extendedProps inviati in modalità slim: quelli usati per colore, permessi e titolo
+SLIM_EVENT_PROPS = ("employee", "project", "activity_type", "docstatus")
+
+# Numero massimo di attività per chiamata a get_timesheet_detail_info
+MAX_DETAIL_INFO_NAMES = 500
+
+def encode_events(events, compact=0, slim=0):
+    """
+    Applica agli eventi formattati la modalità slim (solo i campi di SLIM_EVENT_PROPS)
+    e la codifica colonnare richieste dal client
+    """
+    if cint(slim):
+        events = [
+            {
+                "id": event["id"],
+                "title": event["title"],
+                "start": event["start"],
+                "end": event["end"],
+                "extendedProps": {fieldname: event["extendedProps"].get(fieldname) for fieldname in SLIM_EVENT_PROPS}
+            }
+            for event in events
+        ]
+    
+    return encode_events_compact(events) if cint(compact) else events
+
+@frappe.whitelist()
+@instrumented
+def get_timesheet_detail_info(names):
+    """
+    Dettagli completi (extendedProps) delle attività indicate, per i dialog aperti dagli eventi
+    caricati in modalità slim: {name: extendedProps}. Stessa visibilità per ruolo del calendario;
+    le attività non visibili o eliminate sono omesse.
+    """
+    try:
+        if isinstance(names, str):
+            names = json.loads(names)
+        
+        names = list(dict.fromkeys(name for name in names or [] if name))
+        if not names:
+            return {}
+        if len(names) > MAX_DETAIL_INFO_NAMES:
+            frappe.throw(_("Troppe attività richieste (massimo {0})").format(MAX_DETAIL_INFO_NAMES))
+        
+        ctx = get_permission_context()
+        scope = build_event_conditions(ctx)
+        if scope is None:
+            return {}
+        
+        conditions, values, _scope_employee = scope
+        conditions.append("tsd.name IN %(names)s")
+        values["names"] = tuple(names)
+        
+        return {row.name: format_event(row)["extendedProps"] for row in fetch_event_rows(conditions, values)}
+    
+    except Exception as e:
+        frappe.log_error(f"Errore in get_timesheet_detail_info: {str(e)}")
+        frappe.throw(_("Errore nel recupero dei dettagli: {0}").format(str(e)))
+
+def format_event(row):
+    """
+    Converte una riga della query eventi nel formato atteso da FullCalendar
+    """
+    # Il colore non viaggia con l'evento: il client lo risolve dalla mappa project_colors
+    return {
+        "id": row.name,
+        "title": f"{row.project or ''} - {row.activity_type or ''}",
+        "start": row.from_time.isoformat() if row.from_time else None,
+        "end": row.to_time.isoformat() if row.to_time else None,
+        "extendedProps": {
+            "timesheet": row.timesheet,
+            "employee": row.employee,
+            "employee_name": row.employee_name,
+            "project": row.project,
+            "project_name": row.project_name,
+            "task": row.task,
+            "task_subject": row.task_subject,
+            "activity_type": row.activity_type,
+            "description": row.description,
+            "hours": row.hours,
+            "company": row.company,
+            "docstatus": row.docstatus
+        }
+    }
+
+
+# Messaggio di sovrapposizione, rilanciato senza modifiche dalle API di creazione
+OVERLAP_ERROR_MESSAGE = "Attività già presente per il giorno e fascia oraria selezionati."
+
+@frappe.whitelist()
+@instrumented
 def create_timesheet_detail(data):
     """
     Crea un nuovo Timesheet Detail con controllo permessi
@@ -157,140 +573,219 @@ def create_timesheet_detail(data):
         if isinstance(data, str):
             data = json.loads(data)
         
-        # Controllo permessi: gli Employee possono creare solo per se stessi
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
+        result = create_timesheet_details(ctx, [data])[0]
         
-        if not is_manager and "Employee" in user_roles:
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if not current_employee:
-                frappe.throw(_("Utente non associato a nessun dipendente"))
-            
-            # Verifica che stia creando per se stesso
-            if data.get("employee") != current_employee:
-                frappe.throw(_("Non autorizzato a creare attività per altri dipendenti"))
+        # Un unico commit per timesheet e time_log
+        frappe.db.commit()
         
-        timesheet_name = data.get("timesheet")
+        return {
+            "success": True,
+            "timesheet_detail": result["timesheet_detail"],
+            "timesheet": result["timesheet"],
+            "timesheet_name": result["timesheet"]
+        }
+    
+    except Exception as e:
+        # Se l'errore è già il nostro messaggio personalizzato, rilancialo senza modifiche
+        if OVERLAP_ERROR_MESSAGE in str(e):
+            raise e
         
-        if timesheet_name:
-            timesheet = frappe.get_doc("Timesheet", timesheet_name)
-            # Verifica permessi sul timesheet esistente
-            if not is_manager and "Employee" in user_roles:
-                current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-                if timesheet.employee != current_employee:
-                    frappe.throw(_("Non autorizzato a modificare questo timesheet"))
-        else:
-            # Calcola l'inizio della settimana per la data dell'attività
-            activity_date = getdate(data.get("from_time"))
-            week_start = get_week_start_date(activity_date)
-            
-            timesheet_info = get_or_create_timesheet(
-                employee=data.get("employee"),
-                start_date=week_start,
-                company=data.get("company")
-            )
-            
-            # Se get_or_create_timesheet restituisce un timesheet esistente
-            if timesheet_info.get("name"):
-                timesheet = frappe.get_doc("Timesheet", timesheet_info["name"])
-            else:
-                # Crea un nuovo timesheet
-                timesheet = frappe.new_doc("Timesheet")
-                timesheet.employee = data.get("employee")
-                timesheet.start_date = timesheet_info["start_date"]
-                timesheet.end_date = timesheet_info["end_date"]
-                timesheet.company = data.get("company")
+        frappe.log_error(f"Errore in create_timesheet_detail: {str(e)}")
+        frappe.throw(_("Errore nella creazione: {0}").format(str(e)))
+
+@frappe.whitelist()
+@instrumented
+def create_timesheet_details_bulk(entries):
+    """
+    Crea più Timesheet Detail in un'unica transazione (es. attività divise dalla pausa pranzo
+    o compilazione di un'intera settimana). Le voci vengono raggruppate per Timesheet
+    settimanale di destinazione, ogni Timesheet viene salvato una sola volta ed è
+    eseguito un solo commit; in caso di errore nessuna voce viene creata.
+    """
+    try:
+        if isinstance(entries, str):
+            entries = json.loads(entries)
         
-        # Validazione: verifica che l'employee sia assegnato al progetto della task (se specificata)
-        task_name = data.get("task")
-        project_name = data.get("project")
-        employee_name = data.get("employee")
+        if not entries:
+            return {"success": True, "created": []}
         
-        if task_name and employee_name:
-            # Ottieni il progetto della task
-            task_project = frappe.db.get_value("Task", task_name, "project")
-            
-            if task_project:
-                # Verifica se l'employee è assegnato al progetto della task
-                is_assigned_to_project = frappe.db.exists("ToDo", {
-                    "reference_type": "Project",
-                    "reference_name": task_project,
-                    "allocated_to": frappe.db.get_value("Employee", employee_name, "user_id"),
-                    "status": "Open"
-                })
-                
-                if not is_assigned_to_project and not is_manager:
-                    frappe.throw(_("L'employee {0} non è assegnato al progetto {1} della task selezionata. Contattare HR per l'assegnazione.").format(
-                        frappe.db.get_value("Employee", employee_name, "employee_name"),
-                        frappe.db.get_value("Project", task_project, "project_name")
-                    ))
-                
-                # Se il progetto specificato non corrisponde al progetto della task
-                if project_name and project_name != task_project:
-                    frappe.throw(_("Il progetto selezionato ({0}) non corrisponde al progetto della task ({1}).").format(
-                        frappe.db.get_value("Project", project_name, "project_name"),
-                        frappe.db.get_value("Project", task_project, "project_name")
-                    ))
-        
-        # Verifica sovrapposizioni con time_logs esistenti
-        new_from_time = get_datetime(data.get("from_time"))
-        new_to_time = get_datetime(data.get("to_time"))
-        
-        for existing_log in timesheet.time_logs:
-            existing_from = existing_log.from_time
-            existing_to = existing_log.to_time
-            
-            # Controlla che i valori non siano None prima del confronto
-            if not existing_from or not existing_to:
-                continue  # Salta questo log se ha valori mancanti
-            
-            # Controlla sovrapposizioni
-            if (new_from_time < existing_to and new_to_time > existing_from):
-                frappe.throw(_("Attività già presente per il giorno e fascia oraria selezionati."))
-        
-        # Aggiungere alla child table del timesheet
-        timesheet_detail = timesheet.append("time_logs", {
-            "from_time": new_from_time,
-            "to_time": new_to_time,
-            "project": data.get("project"),
-            "task": data.get("task"),
-            "activity_type": data.get("activity_type"),
-            "description": data.get("description", "")
-        })
-        
-        # Calcola le ore automaticamente
-        if timesheet_detail.from_time and timesheet_detail.to_time:
-            time_diff = timesheet_detail.to_time - timesheet_detail.from_time
-            timesheet_detail.hours = time_diff.total_seconds() / 3600
-        
-        # Inserisci il timesheet solo se è nuovo
-        if not timesheet.name:
-            timesheet.insert()
-            # Commit immediatamente per rendere il timesheet disponibile per altre transazioni
-            frappe.db.commit()
+        ctx = get_permission_context()
+        created = create_timesheet_details(ctx, entries)
         
-        # Salva il timesheet con il nuovo detail
-        timesheet.calculate_hours()
-        timesheet.save()
-        # Commit finale per salvare il time_log
         frappe.db.commit()
         
         return {
             "success": True,
-            "timesheet_detail": timesheet_detail.name,
-            "timesheet": timesheet.name,
-            "timesheet_name": timesheet.name
+            "created": created
         }
     
     except Exception as e:
-        # Se l'errore è già il nostro messaggio personalizzato, rilancialo senza modifiche
-        if "Attività già presente per il giorno e fascia oraria selezionati." in str(e):
+        frappe.db.rollback()
+        
+        if OVERLAP_ERROR_MESSAGE in str(e):
             raise e
         
-        frappe.log_error(f"Errore in create_timesheet_detail: {str(e)}")
+        frappe.log_error(f"Errore in create_timesheet_details_bulk: {str(e)}")
         frappe.throw(_("Errore nella creazione: {0}").format(str(e)))
 
+def create_timesheet_details(ctx, entries):
+    """
+    Valida e aggiunge le voci ai rispettivi Timesheet settimanali (esistenti o nuovi),
+    salvando ogni Timesheet una sola volta. Il commit è a carico del chiamante.
+    Restituisce per ogni voce, nello stesso ordine, il Timesheet Detail creato.
+    """
+    groups = {}
+    week_timesheets = {}
+    
+    checked = [validate_entry(ctx, data) for data in entries]
+    
+    # Lock delle settimane da risolvere (sempre nello stesso ordine), mantenuti fino al commit:
+    # richieste concorrenti per la stessa settimana non possono creare due Timesheet
+    for employee, week_start in sorted({
+        (data.get("employee"), get_week_start_date(getdate(from_time)))
+        for data, (from_time, _to_time) in zip(entries, checked, strict=True)
+        if not data.get("timesheet")
+    }):
+        lock_employee_week(employee, week_start)
+    
+    for index, data in enumerate(entries):
+        from_time, to_time = checked[index]
+        
+        timesheet_name = data.get("timesheet")
+        week_start = get_week_start_date(getdate(from_time))
+        
+        if not timesheet_name:
+            # Timesheet settimanale dell'employee, risolto una sola volta per settimana
+            week_key = (data.get("employee"), week_start)
+            if week_key not in week_timesheets:
+                week_timesheets[week_key] = get_or_create_timesheet(
+                    employee=data.get("employee"),
+                    start_date=week_start,
+                    company=data.get("company"),
+                    for_update=True
+                )
+            timesheet_name = week_timesheets[week_key].get("name")
+        
+        group_key = timesheet_name or ("new", data.get("employee"), week_start)
+        groups.setdefault(group_key, []).append((index, data, from_time, to_time))
+    
+    # Verifica sovrapposizioni su tutti i Timesheet degli employee e tra le nuove voci
+    validate_entries_no_overlap(
+        [(data.get("employee"), from_time, to_time) for group in groups.values() for _index, data, from_time, to_time in group],
+        message=_(OVERLAP_ERROR_MESSAGE)
+    )
+    
+    results = [None] * len(entries)
+    
+    for group_key, group in groups.items():
+        first = group[0][1]
+        
+        if isinstance(group_key, tuple):
+            # Crea un nuovo timesheet settimanale
+            timesheet_info = week_timesheets[(first.get("employee"), group_key[2])]
+            timesheet = frappe.new_doc("Timesheet")
+            timesheet.employee = first.get("employee")
+            timesheet.start_date = timesheet_info["start_date"]
+            timesheet.end_date = timesheet_info["end_date"]
+            timesheet.company = first.get("company")
+        else:
+            timesheet = frappe.get_doc("Timesheet", group_key)
+            # Verifica permessi sul timesheet esistente
+            if ctx.is_restricted and timesheet.employee != ctx.current_employee:
+                frappe.throw(_("Non autorizzato a modificare questo timesheet"))
+        
+        rows = []
+        for index, data, from_time, to_time in group:
+            # Aggiungere alla child table del timesheet
+            timesheet_detail = timesheet.append("time_logs", {
+                "from_time": from_time,
+                "to_time": to_time,
+                "project": data.get("project"),
+                "task": data.get("task"),
+                "activity_type": data.get("activity_type"),
+                "description": data.get("description", ""),
+                # Calcola le ore automaticamente
+                "hours": (to_time - from_time).total_seconds() / 3600
+            })
+            rows.append((index, timesheet_detail))
+        
+        timesheet.calculate_hours()
+        
+        # Un solo salvataggio per timesheet, che sia nuovo o esistente
+        if timesheet.is_new():
+            timesheet.insert()
+        else:
+            timesheet.save()
+        
+        for index, timesheet_detail in rows:
+            results[index] = {
+                "index": index,
+                "timesheet_detail": timesheet_detail.name,
+                "timesheet": timesheet.name
+            }
+    
+    return results
+
+def validate_entry(ctx, data):
+    """
+    Controlli di una singola voce da creare (permessi, assegnazione, orari).
+    Restituisce from_time e to_time convertiti in datetime.
+    """
+    validate_detail_permission(ctx, data.get("employee"))
+    validate_task_assignment(ctx, data.get("employee"), data.get("task"), data.get("project"))
+    
+    from_time = get_datetime(data.get("from_time"))
+    to_time = get_datetime(data.get("to_time"))
+    if not from_time or not to_time or from_time >= to_time:
+        frappe.throw(_("L'orario di fine deve essere successivo all'orario di inizio."))
+    
+    return from_time, to_time
+
+def validate_detail_permission(ctx, employee):
+    """
+    Gli Employee possono creare o modificare attività solo per se stessi
+    """
+    if not ctx.is_restricted:
+        return
+    
+    if not ctx.current_employee:
+        frappe.throw(_("Utente non associato a nessun dipendente"))
+    
+    if employee != ctx.current_employee:
+        frappe.throw(_("Non autorizzato a creare attività per altri dipendenti"))
+
+def validate_task_assignment(ctx, employee, task, project):
+    """
+    Validazione: verifica che l'employee sia assegnato al progetto della task (se specificata)
+    e che il progetto selezionato corrisponda a quello della task
+    """
+    if not task or not employee:
+        return
+    
+    # Ottieni il progetto della task (dall'indice delle assegnazioni se la task è assegnata)
+    employee_user = assignments.get_employee_user(employee)
+    task_project = assignments.get_task_project(task, employee_user)
+    if not task_project:
+        return
+    
+    if not ctx.is_manager:
+        # Verifica se l'employee è assegnato al progetto della task
+        if not assignments.is_assigned_to_project(employee_user, task_project):
+            frappe.throw(_("L'employee {0} non è assegnato al progetto {1} della task selezionata. Contattare HR per l'assegnazione.").format(
+                frappe.get_cached_value("Employee", employee, "employee_name"),
+                frappe.get_cached_value("Project", task_project, "project_name")
+            ))
+    
+    # Se il progetto specificato non corrisponde al progetto della task
+    if project and project != task_project:
+        frappe.throw(_("Il progetto selezionato ({0}) non corrisponde al progetto della task ({1}).").format(
+            frappe.get_cached_value("Project", project, "project_name"),
+            frappe.get_cached_value("Project", task_project, "project_name")
+        ))
+
 @frappe.whitelist()
+@instrumented
 def update_timesheet_detail(name, data):
     """
     Aggiorna un Time Sheet Detail esistente con controllo permessi
@@ -299,62 +794,19 @@ def update_timesheet_detail(name, data):
         if isinstance(data, str):
             data = json.loads(data)
         
-        doc = frappe.get_doc("Timesheet Detail", name)
-        
         # Controllo permessi: gli Employee possono modificare solo i propri timesheet
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
         
-        if not is_manager and "Employee" in user_roles:
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if not current_employee:
-                frappe.throw(_("Utente non associato a nessun dipendente"))
-            
-            # Verifica che il timesheet appartenga all'utente corrente
-            timesheet = frappe.get_doc("Timesheet", doc.parent)
-            if timesheet.employee != current_employee:
-                frappe.throw(_("Non autorizzato a modificare questo timesheet"))
+        # Drag and drop / resize: percorso veloce per i soli spostamenti di orario
+        if data and set(data) <= {"from_time", "to_time"}:
+            update_detail_times(ctx, name, data.get("from_time"), data.get("to_time"))
+            return {"success": True}
         
-        # Funzione helper per pulire le date
-        def clean_datetime(dt_str):
-            if not dt_str:
-                return None
-            # Rimuovi timezone info
-            dt_str = re.sub(r'[+-]\d{2}:\d{2}$', '', dt_str)
-            dt_str = dt_str.replace('Z', '')
-            return get_datetime(dt_str)
+        # Timesheet padre caricato una sola volta (con lock) e riga modificata al suo interno
+        timesheet, doc = get_detail_timesheet(ctx, name)
         
         # Validazione: verifica che l'employee sia assegnato al progetto della task (se specificata)
-        task_name = data.get("task", doc.task)
-        project_name = data.get("project", doc.project)
-        timesheet = frappe.get_doc("Timesheet", doc.parent)
-        employee_name = timesheet.employee
-        
-        if task_name and employee_name:
-            # Ottieni il progetto della task
-            task_project = frappe.db.get_value("Task", task_name, "project")
-            
-            if task_project:
-                # Verifica se l'employee è assegnato al progetto della task
-                is_assigned_to_project = frappe.db.exists("ToDo", {
-                    "reference_type": "Project",
-                    "reference_name": task_project,
-                    "allocated_to": frappe.db.get_value("Employee", employee_name, "user_id"),
-                    "status": "Open"
-                })
-                
-                if not is_assigned_to_project and not is_manager:
-                    frappe.throw(_("L'employee {0} non è assegnato al progetto {1} della task selezionata. Contattare HR per l'assegnazione.").format(
-                        frappe.db.get_value("Employee", employee_name, "employee_name"),
-                        frappe.db.get_value("Project", task_project, "project_name")
-                    ))
-                
-                # Se il progetto specificato non corrisponde al progetto della task
-                if project_name and project_name != task_project:
-                    frappe.throw(_("Il progetto selezionato ({0}) non corrisponde al progetto della task ({1}).").format(
-                        frappe.db.get_value("Project", project_name, "project_name"),
-                        frappe.db.get_value("Project", task_project, "project_name")
-                    ))
+        validate_task_assignment(ctx, timesheet.employee, data.get("task", doc.task), data.get("project", doc.project))
         
         # Aggiorna i campi
         if "from_time" in data:
@@ -376,11 +828,12 @@ def update_timesheet_detail(name, data):
         if doc.from_time and doc.to_time:
             time_diff = doc.to_time - doc.from_time
             doc.hours = time_diff.total_seconds() / 3600
+            
+            # Verifica sovrapposizioni (anche per drag and drop e resize)
+            if "from_time" in data or "to_time" in data:
+                validate_no_overlap(timesheet.employee, doc.from_time, doc.to_time, exclude=[doc.name])
         
-        doc.save()
-        
-        # Aggiorna il timesheet parent
-        timesheet = frappe.get_doc("Timesheet", doc.parent)
+        # Un solo salvataggio del timesheet parent (righe e totali)
         timesheet.calculate_hours()
         timesheet.save()
         
@@ -390,7 +843,114 @@ def update_timesheet_detail(name, data):
         frappe.log_error(f"Errore in update_timesheet_detail: {str(e)}")
         frappe.throw(_("Errore nell'aggiornamento: {0}").format(str(e)))
 
+def clean_datetime(dt_str):
+    """
+    Funzione helper per pulire le date inviate dal calendario (rimuove le info di timezone)
+    """
+    if not dt_str:
+        return None
+    dt_str = re.sub(r'[+-]\d{2}:\d{2}$', '', str(dt_str))
+    dt_str = dt_str.replace('Z', '')
+    return get_datetime(dt_str)
+
+def get_detail_timesheet(ctx, name):
+    """
+    Carica con lock il Timesheet padre di un Time Sheet Detail e verifica che l'utente possa
+    modificarlo. Restituisce (timesheet, riga di timesheet.time_logs).
+    """
+    parent = frappe.db.get_value("Timesheet Detail", {"name": name, "parenttype": "Timesheet"}, "parent")
+    if not parent:
+        frappe.throw(_("Attività {0} non trovata").format(name), frappe.DoesNotExistError)
+    
+    timesheet = frappe.get_doc("Timesheet", parent, for_update=True)
+    
+    if ctx.is_restricted:
+        if not ctx.current_employee:
+            frappe.throw(_("Utente non associato a nessun dipendente"))
+        if timesheet.employee != ctx.current_employee:
+            frappe.throw(_("Non autorizzato a modificare questo timesheet"))
+    
+    return timesheet, next(d for d in timesheet.time_logs if d.name == name)
+
+def update_detail_times(ctx, name, from_time=None, to_time=None):
+    """
+    Sposta o ridimensiona un Time Sheet Detail caricando il Timesheet padre una sola volta.
+    Per le righe non fatturabili di un Timesheet in bozza che restano nella sua settimana
+    vengono aggiornate solo la riga e i totali del padre (delta di ore e costi), senza
+    risalvare tutte le righe: la latenza resta costante al crescere della settimana.
+    Negli altri casi il Timesheet viene salvato normalmente, comunque una sola volta.
+    """
+    timesheet, row = get_detail_timesheet(ctx, name)
+    old_from_time, old_to_time = row.from_time, row.to_time
+    
+    new_from_time = clean_datetime(from_time) if from_time else row.from_time
+    new_to_time = clean_datetime(to_time) if to_time else row.to_time
+    if not new_from_time or not new_to_time or new_from_time >= new_to_time:
+        frappe.throw(_("L'orario di fine deve essere successivo all'orario di inizio."))
+    
+    validate_no_overlap(timesheet.employee, new_from_time, new_to_time, exclude=[name])
+    
+    new_hours = (new_to_time - new_from_time).total_seconds() / 3600
+    delta_hours = new_hours - flt(row.hours)
+    
+    row.from_time = new_from_time
+    row.to_time = new_to_time
+    row.hours = new_hours
+    
+    # Con le nuove date la riga resta dentro il periodo del Timesheet?
+    start_date = min(getdate(d.from_time) for d in timesheet.time_logs if d.from_time)
+    end_date = max(getdate(d.to_time) for d in timesheet.time_logs if d.to_time)
+    
+    if timesheet.docstatus != 0 or row.get("is_billable") or start_date != getdate(timesheet.start_date) \
+            or end_date != getdate(timesheet.end_date):
+        timesheet.calculate_hours()
+        timesheet.save()
+        return timesheet
+    
+    # Aggiornamento incrementale: riga e totali del padre
+    delta_costing = flt(row.get("costing_rate")) * delta_hours
+    delta_base_costing = flt(row.get("base_costing_rate")) * delta_hours
+    modified = now_datetime()
+    
+    frappe.db.set_value("Timesheet Detail", name, {
+        "from_time": new_from_time,
+        "to_time": new_to_time,
+        "hours": new_hours,
+        "costing_amount": flt(row.get("costing_amount")) + delta_costing,
+        "base_costing_amount": flt(row.get("base_costing_amount")) + delta_base_costing,
+        "modified": modified
+    }, update_modified=False)
+    
+    timesheet.total_hours = flt(timesheet.total_hours) + delta_hours
+    timesheet.total_costing_amount = flt(timesheet.total_costing_amount) + delta_costing
+    timesheet.base_total_costing_amount = flt(timesheet.get("base_total_costing_amount")) + delta_base_costing
+    timesheet.modified = modified
+    
+    frappe.db.set_value("Timesheet", timesheet.name, {
+        "total_hours": timesheet.total_hours,
+        "total_costing_amount": timesheet.total_costing_amount,
+        "base_total_costing_amount": timesheet.base_total_costing_amount,
+        "modified": modified,
+        "modified_by": frappe.session.user
+    }, update_modified=False)
+    
+    # Il salvataggio diretto non attiva i doc_events: stessi effetti collaterali a mano
+    on_timesheet_fast_update(timesheet, old_from_time, old_to_time)
+    
+    return timesheet
+
+def on_timesheet_fast_update(timesheet, old_from_time=None, old_to_time=None):
+    """
+    Effetti collaterali dei doc_events per gli aggiornamenti diretti di update_detail_times
+    """
+    dates = [getdate(timesheet.start_date), getdate(timesheet.end_date)]
+    dates += [getdate(value) for value in (old_from_time, old_to_time) if value]
+    event_cache.invalidate_windows_after_commit(timesheet.employee, min(dates), max(dates))
+    rollup.refresh_rollup(timesheet.employee, min(dates), max(dates))
+    realtime.on_timesheet_fast_update(timesheet, min(dates), max(dates))
+
 @frappe.whitelist()
+@instrumented
 def delete_timesheet_detail(name):
     """
     Elimina un Time Sheet Detail con controllo permessi
@@ -409,15 +969,13 @@ def delete_timesheet_detail(name):
             frappe.throw(_("Non hai i permessi per modificare questo timesheet"))
         
         # Controllo aggiuntivo per Employee: possono modificare solo i propri timesheet
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
         
-        if not is_manager and "Employee" in user_roles:
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if not current_employee:
+        if ctx.is_restricted:
+            if not ctx.current_employee:
                 frappe.throw(_("Utente non associato a nessun dipendente"))
             
-            if timesheet.employee != current_employee:
+            if timesheet.employee != ctx.current_employee:
                 frappe.throw(_("Non autorizzato a eliminare da questo timesheet"))
         
         # Rimuovi il dettaglio specifico dalla lista time_logs
@@ -444,10 +1002,7 @@ def delete_timesheet_detail(name):
                     error_msg = str(delete_error)
                     if "time_logs" in error_msg.lower() or "timesheet" in error_msg.lower():
                         # Verifica se l'utente è solo Employee
-                        user_roles = frappe.get_roles(frappe.session.user)
-                        is_employee_only = "Employee" in user_roles and not any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
-                        
-                        if is_employee_only:
+                        if ctx.is_restricted:
                             frappe.throw(_("Contatta il tuo Project Manager per eliminare il Timesheet"))
                         else:
                             # Per altri utenti, mostra l'errore originale
@@ -482,112 +1037,97 @@ def delete_timesheet_detail(name):
         error_msg = str(e)
         if "time_logs" in error_msg.lower() or ("timesheet" in error_msg.lower() and "delete" in error_msg.lower()):
             # Verifica se l'utente è solo Employee
-            user_roles = frappe.get_roles(frappe.session.user)
-            is_employee_only = "Employee" in user_roles and not any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
-            
-            if is_employee_only:
+            if get_permission_context().is_restricted:
                 frappe.throw(_("Contatta il tuo Project Manager per eliminare il Timesheet"))
         
         # Per tutti gli altri errori, mostra il messaggio originale
         frappe.throw(_("Errore nell'eliminazione: {0}").format(str(e)))
 
 @frappe.whitelist()
+@instrumented
 def get_filter_options():
     """
     Recupera le opzioni per i filtri con controllo permessi
     """
     try:
-        # Controllo permessi basato sui ruoli
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
-        
-        # Progetti: per Employee solo quelli assegnati tramite "Assign To", per Manager tutti aperti
-        if is_manager:
-            projects = frappe.get_all("Project", 
-                filters={"status": "Open"}, 
-                fields=["name", "project_name"],
-                order_by="project_name")
-        else:
-            # Per Employee: progetti assegnati tramite sistema "Assign To" di ERPNext
-            current_user = frappe.session.user
-            assigned_projects = frappe.db.sql("""
-                SELECT DISTINCT p.name, p.project_name
-                FROM `tabProject` p
-                INNER JOIN `tabToDo` t ON t.reference_type = 'Project' AND t.reference_name = p.name
-                WHERE t.allocated_to = %s AND t.status = 'Open' AND p.status = 'Open'
-                ORDER BY p.project_name
-            """, (current_user,), as_dict=True)
-            
-            if assigned_projects:
-                projects = [{"name": p.name, "project_name": p.project_name} for p in assigned_projects]
-            else:
-                # Se non ha progetti assegnati, lista vuota - l'utente deve contattare HR
-                projects = []
-        
-        # Lista employees: manager vedono tutti, employee solo se stesso
-        if is_manager:
-            employees = frappe.get_all("Employee", 
-                fields=["name", "employee_name"], 
-                filters={"status": "Active"},
-                order_by="employee_name"
-            )
-        else:
-            # Employee vede solo se stesso
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, ["name", "employee_name"])
-            if current_employee:
-                employees = [{
-                    "name": current_employee[0],
-                    "employee_name": current_employee[1] or current_employee[0]  # Fallback se employee_name è None
-                }]
-            else:
-                # Se l'utente non ha un Employee associato, restituisci lista vuota
-                frappe.log_error(f"Utente {frappe.session.user} non ha un Employee associato")
-                employees = []
-        
-        return {
-            "employees": employees,
-            "projects": projects,
-            "activity_types": frappe.get_all("Activity Type", 
-                fields=["name", "activity_type"], 
-                order_by="activity_type"
-            ),
-            "user_permissions": {
-                "is_manager": is_manager,
-                "is_employee_only": not is_manager,
-                "current_employee": frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name") or None
-            }
-        }
+        options = build_filter_options(get_permission_context())
+        options["project_colors"] = get_project_color_map([p["name"] for p in options["projects"]])
+        return options
     except Exception as e:
         frappe.log_error(f"Errore in get_filter_options: {str(e)}")
-        return {"employees": [], "projects": [], "activity_types": [], "user_permissions": {"is_manager": False}}
+        return {"employees": [], "projects": [], "project_colors": {}, "activity_types": [], "user_permissions": {"is_manager": False}}
+
+def build_filter_options(ctx):
+    """
+    Employees, progetti e activity type visibili all'utente (usato anche dal bootstrap del calendario)
+    """
+    is_manager = ctx.is_manager
+
+    # Progetti: per Employee solo quelli assegnati tramite "Assign To", per Manager tutti aperti
+    if is_manager:
+        projects = frappe.get_all("Project", 
+            filters={"status": "Open"}, 
+            fields=["name", "project_name"],
+            order_by="project_name")
+    else:
+        # Per Employee: progetti aperti assegnati tramite sistema "Assign To" di ERPNext.
+        # Se non ha progetti assegnati, lista vuota - l'utente deve contattare HR
+        projects = assignments.get_assigned_projects(ctx.user_id)
+    
+    # Lista employees: manager vedono tutti, employee solo se stesso
+    if is_manager:
+        employees = frappe.get_all("Employee", 
+            fields=["name", "employee_name"], 
+            filters={"status": "Active"},
+            order_by="employee_name"
+        )
+    else:
+        # Employee vede solo se stesso
+        if ctx.current_employee:
+            employees = [{
+                "name": ctx.current_employee,
+                "employee_name": ctx.employee_name  # Già con fallback sul name se employee_name è None
+            }]
+        else:
+            # Se l'utente non ha un Employee associato, restituisci lista vuota
+            frappe.log_error(f"Utente {ctx.user_id} non ha un Employee associato")
+            employees = []
+    
+    return {
+        "employees": employees,
+        "projects": projects,
+        "activity_types": frappe.get_all("Activity Type", 
+            fields=["name", "activity_type"], 
+            order_by="activity_type"
+        ),
+        "user_permissions": {
+            "is_manager": is_manager,
+            "is_employee_only": not is_manager,
+            "current_employee": ctx.current_employee
+        }
+    }
 
 @frappe.whitelist()
-def get_or_create_timesheet(employee, start_date, company):
+@instrumented
+def get_or_create_timesheet(employee, start_date, company, for_update=False):
     """
-    Recupera o crea un timesheet settimanale per l'employee e la data specificata
+    Recupera o crea un timesheet settimanale per l'employee e la data specificata.
+    Con for_update (scritture, sotto lock della settimana) la ricerca vede anche i Timesheet
+    appena creati da richieste concorrenti.
     """
     # Assicurati che start_date sia l'inizio della settimana
     week_start = get_week_start_date(start_date)
     week_end = add_days(week_start, 6)
     
-    # Cerca un timesheet esistente che inizi esattamente in questa settimana
-    existing = frappe.get_all("Timesheet", 
-        filters={
-            "employee": employee,
-            "start_date": week_start,
-            "docstatus": ["<", 2]
-        },
-        fields=["name", "start_date", "end_date"],
-        limit=1
-    )
+    # Cerca un timesheet esistente in questa settimana
+    existing = find_week_timesheet(employee, week_start, for_update=cint(for_update))
     
     if existing:
-        timesheet = frappe.get_doc("Timesheet", existing[0].name)
         return {
-            "name": timesheet.name,
-            "start_date": timesheet.start_date,
-            "end_date": timesheet.end_date,
-            "employee": timesheet.employee
+            "name": existing.name,
+            "start_date": existing.start_date,
+            "end_date": existing.end_date,
+            "employee": existing.employee
         }
     
     # Non esiste un timesheet per questa settimana, restituisci informazioni per crearne uno nuovo
@@ -601,39 +1141,8 @@ def get_or_create_timesheet(employee, start_date, company):
         "week_end": str(week_end)
     }
 
-# ✅ Prima funzione (linea 339) - per progetti
-def get_event_color(project):
-    """Restituisce un colore per il progetto"""
-    # ✅ MODIFICATO: Genera colori dinamici basati sul nome del progetto
-    if not project:
-        return "#95a5a6"  # Colore grigio di default
-    
-    # Lista di colori predefiniti
-    colors = [
-        "#3498db",  # Blu
-        "#e74c3c",  # Rosso
-        "#f39c12",  # Arancione
-        "#2ecc71",  # Verde
-        "#9b59b6",  # Viola
-        "#1abc9c",  # Turchese
-        "#e67e22",  # Arancione scuro
-        "#34495e",  # Blu scuro
-        "#f1c40f",  # Giallo
-        "#e91e63",  # Rosa
-        "#00bcd4",  # Ciano
-        "#ff9800"   # Ambra
-    ]
-    
-    # Genera un hash del nome del progetto per assegnare sempre lo stesso colore
-    import hashlib
-    hash_object = hashlib.md5(project.encode())
-    hash_hex = hash_object.hexdigest()
-    color_index = int(hash_hex, 16) % len(colors)
-    
-    return colors[color_index]
-
-
 @frappe.whitelist()
+@instrumented
 def get_timesheet_projects(doctype, txt, searchfield, start, page_len, filters):
     """
     Restituisce i progetti associati a un timesheet specifico
@@ -644,45 +1153,74 @@ def get_timesheet_projects(doctype, txt, searchfield, start, page_len, filters):
         if not timesheet:
             return []
         
-        # Query per ottenere solo i progetti già presenti nel timesheet
-        # più tutti i progetti aperti se il timesheet non ha ancora dettagli
-        query = """
-            SELECT DISTINCT p.name, p.project_name
-            FROM `tabProject` p
-            WHERE p.status = 'Open'
-            AND (
-                p.name IN (
-                    SELECT DISTINCT tsd.project
-                    FROM `tabTimesheet Detail` tsd
-                    WHERE tsd.parent = %(timesheet)s
-                    AND tsd.project IS NOT NULL
-                    AND tsd.project != ''
-                )
-                OR NOT EXISTS (
-                    SELECT 1 FROM `tabTimesheet Detail` tsd2
-                    WHERE tsd2.parent = %(timesheet)s
-                    AND tsd2.project IS NOT NULL
-                    AND tsd2.project != ''
+        def fetch(txt, after, limit):
+            # Query per ottenere solo i progetti già presenti nel timesheet
+            # più tutti i progetti aperti se il timesheet non ha ancora dettagli
+            query = """
+                SELECT DISTINCT p.name, p.project_name
+                FROM `tabProject` p
+                WHERE p.status = 'Open'
+                AND (
+                    p.name IN (
+                        SELECT DISTINCT tsd.project
+                        FROM `tabTimesheet Detail` tsd
+                        WHERE tsd.parent = %(timesheet)s
+                        AND tsd.project IS NOT NULL
+                        AND tsd.project != ''
+                    )
+                    OR NOT EXISTS (
+                        SELECT 1 FROM `tabTimesheet Detail` tsd2
+                        WHERE tsd2.parent = %(timesheet)s
+                        AND tsd2.project IS NOT NULL
+                        AND tsd2.project != ''
+                    )
                 )
-            )
-            AND (p.name LIKE %(txt)s OR p.project_name LIKE %(txt)s)
-            ORDER BY p.project_name
-            LIMIT %(start)s, %(page_len)s
-        """
-        
-        return frappe.db.sql(query, {
-            'timesheet': timesheet,
-            'txt': f'%{txt}%',
-            'start': start,
-            'page_len': page_len
-        })
+                AND (p.name LIKE %(txt)s OR p.project_name LIKE %(txt)s)
+                {keyset}
+                ORDER BY p.project_name, p.name
+                LIMIT %(limit)s
+            """.format(keyset=PROJECT_KEYSET_CONDITION if after else "")
+            
+            return frappe.db.sql(query, {
+                'timesheet': timesheet,
+                'txt': search.prefix_pattern(txt),
+                'after_name': after[0] if after else None,
+                'after_title': after[1] if after else None,
+                'limit': limit
+            })
+        
+        return search.search("timesheet_projects", {"timesheet": timesheet}, txt, start, page_len,
+            fetch, match_project_row)
         
     except Exception as e:
         frappe.log_error(f"Errore in get_timesheet_projects: {str(e)}")
         return []
 
 
+# Keyset per le query sui progetti ordinate per (project_name, name)
+PROJECT_KEYSET_CONDITION = """
+    AND (p.project_name > %(after_title)s
+        OR (p.project_name = %(after_title)s AND p.name > %(after_name)s))
+"""
+
+# Ricerca per prefisso sui progetti aperti (manager), verificata da db_indexes.explain_hot_queries
+OPEN_PROJECTS_QUERY = """
+    SELECT p.name, p.project_name
+    FROM `tabProject` p
+    WHERE p.status = 'Open'
+    AND (p.name LIKE %(txt)s OR p.project_name LIKE %(txt)s)
+    {keyset}
+    ORDER BY p.project_name, p.name
+    LIMIT %(limit)s
+"""
+
+
+def match_project_row(txt, row):
+    return search.matches_prefix(txt, row[0], row[1])
+
+
 @frappe.whitelist()
+@instrumented
 def get_employee_projects(doctype, txt, searchfield, start, page_len, filters):
     """
     Restituisce i progetti per i dialog di creazione attività
@@ -690,50 +1228,31 @@ def get_employee_projects(doctype, txt, searchfield, start, page_len, filters):
     """
     try:
         # Controllo permessi basato sui ruoli
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
         
-        if is_manager:
-            # Manager vedono tutti i progetti aperti
-            query = """
-                SELECT p.name, p.project_name
-                FROM `tabProject` p
-                WHERE p.status = 'Open'
-                AND (p.name LIKE %(txt)s OR p.project_name LIKE %(txt)s)
-                ORDER BY p.project_name
-                LIMIT %(start)s, %(page_len)s
-            """
+        if ctx.is_manager:
+            # Manager vedono tutti i progetti aperti (ricerca condivisa da tutti i manager)
+            def fetch(txt, after, limit):
+                query = OPEN_PROJECTS_QUERY.format(keyset=PROJECT_KEYSET_CONDITION if after else "")
+                
+                return frappe.db.sql(query, {
+                    'txt': search.prefix_pattern(txt),
+                    'after_name': after[0] if after else None,
+                    'after_title': after[1] if after else None,
+                    'limit': limit
+                })
             
-            return frappe.db.sql(query, {
-                'txt': f'%{txt}%',
-                'start': start,
-                'page_len': page_len
-            })
+            return search.search("open_projects", "all", txt, start, page_len, fetch, match_project_row)
         else:
-            # Employee vedono solo progetti assegnati tramite "Assign To"
-            current_user = frappe.session.user
-            query = """
-                SELECT DISTINCT p.name, p.project_name
-                FROM `tabProject` p
-                INNER JOIN `tabToDo` t ON t.reference_type = 'Project' AND t.reference_name = p.name
-                WHERE t.allocated_to = %(user)s AND t.status = 'Open' AND p.status = 'Open'
-                AND (p.name LIKE %(txt)s OR p.project_name LIKE %(txt)s)
-                ORDER BY p.project_name
-                LIMIT %(start)s, %(page_len)s
-            """
-            
-            assigned_projects = frappe.db.sql(query, {
-                'user': current_user,
-                'txt': f'%{txt}%',
-                'start': start,
-                'page_len': page_len
-            })
+            # Employee vedono solo progetti assegnati tramite "Assign To" (dall'indice delle assegnazioni)
+            projects = [
+                (p["name"], p["project_name"])
+                for p in assignments.get_assigned_projects(ctx.user_id)
+                if search.matches_prefix(txt, p["name"], p["project_name"])
+            ]
             
-            if assigned_projects:
-                return assigned_projects
-            else:
-                # Se non ha progetti assegnati, lista vuota - l'utente deve contattare HR
-                return []
+            # Se non ha progetti assegnati, lista vuota - l'utente deve contattare HR
+            return search.paginate(projects, start, page_len)
         
     except Exception as e:
         frappe.log_error(f"Errore in get_employee_projects: {str(e)}")
@@ -741,45 +1260,55 @@ def get_employee_projects(doctype, txt, searchfield, start, page_len, filters):
 
 
 @frappe.whitelist()
+@instrumented
 def get_project_timesheets(doctype, txt, searchfield, start, page_len, filters):
     """
     Restituisce i timesheet associati a un progetto specifico
     """
     try:
         project = filters.get('project')
-        if not project:
-            return frappe.db.sql("""
-                SELECT name, employee
-                FROM `tabTimesheet`
-                WHERE docstatus = 0
-                AND employee IS NOT NULL
-                AND (name LIKE %(txt)s OR employee LIKE %(txt)s)
-                ORDER BY creation DESC
-                LIMIT %(start)s, %(page_len)s
-            """, {
-                'txt': f'%{txt}%',
-                'start': start,
-                'page_len': page_len
-            })
         
-        # Trova gli employee che hanno lavorato su questo progetto
-        query = """
-            SELECT DISTINCT ts.name, ts.employee
-            FROM `tabTimesheet` ts
-            INNER JOIN `tabTimesheet Detail` tsd ON tsd.parent = ts.name
-            WHERE ts.docstatus = 0
-            AND tsd.project = %(project)s
-            AND (ts.name LIKE %(txt)s OR ts.employee LIKE %(txt)s)
-            ORDER BY ts.creation DESC
-            LIMIT %(start)s, %(page_len)s
-        """
-        
-        return frappe.db.sql(query, {
-            'project': project,
-            'txt': f'%{txt}%',
-            'start': start,
-            'page_len': page_len
-        })
+        def fetch(txt, after, limit):
+            # Keyset su (creation, name) decrescenti: la terza colonna serve solo alla paginazione
+            keyset = """
+                AND (ts.creation < %(after_creation)s
+                    OR (ts.creation = %(after_creation)s AND ts.name < %(after_name)s))
+            """ if after else ""
+            values = {
+                'project': project,
+                'txt': search.prefix_pattern(txt),
+                'after_name': after[0] if after else None,
+                'after_creation': after[2] if after else None,
+                'limit': limit
+            }
+            
+            if not project:
+                return frappe.db.sql("""
+                    SELECT ts.name, ts.employee, ts.creation
+                    FROM `tabTimesheet` ts
+                    WHERE ts.docstatus = 0
+                    AND ts.employee IS NOT NULL
+                    AND (ts.name LIKE %(txt)s OR ts.employee LIKE %(txt)s)
+                    {keyset}
+                    ORDER BY ts.creation DESC, ts.name DESC
+                    LIMIT %(limit)s
+                """.format(keyset=keyset), values)
+            
+            # Trova gli employee che hanno lavorato su questo progetto
+            return frappe.db.sql("""
+                SELECT DISTINCT ts.name, ts.employee, ts.creation
+                FROM `tabTimesheet` ts
+                INNER JOIN `tabTimesheet Detail` tsd ON tsd.parent = ts.name
+                WHERE ts.docstatus = 0
+                AND tsd.project = %(project)s
+                AND (ts.name LIKE %(txt)s OR ts.employee LIKE %(txt)s)
+                {keyset}
+                ORDER BY ts.creation DESC, ts.name DESC
+                LIMIT %(limit)s
+            """.format(keyset=keyset), values)
+        
+        return search.search("project_timesheets", {"project": project}, txt, start, page_len,
+            fetch, lambda txt, row: search.matches_prefix(txt, row[0], row[1]), width=2)
         
     except Exception as e:
         frappe.log_error(f"Errore in get_project_timesheets: {str(e)}")
@@ -787,6 +1316,7 @@ def get_project_timesheets(doctype, txt, searchfield, start, page_len, filters):
 
 
 @frappe.whitelist()
+@instrumented
 def get_employee_tasks(doctype, txt, searchfield, start, page_len, filters):
     """
     Restituisce i task assegnati a un employee per un progetto specifico
@@ -799,37 +1329,20 @@ def get_employee_tasks(doctype, txt, searchfield, start, page_len, filters):
             return []
         
         # Controllo permessi basato sui ruoli
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
         
         # Se non è manager, verifica che stia cercando task per se stesso
-        if not is_manager and "Employee" in user_roles:
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if employee != current_employee:
-                return []
-        
-        # Query per ottenere task assegnate all'employee per il progetto specifico
-        query = """
-            SELECT DISTINCT t.name, t.subject
-            FROM `tabTask` t
-            INNER JOIN `tabToDo` td ON td.reference_type = 'Task' AND td.reference_name = t.name
-            INNER JOIN `tabEmployee` e ON e.user_id = td.allocated_to
-            WHERE t.project = %(project)s
-            AND e.name = %(employee)s
-            AND t.status != 'Cancelled'
-            AND td.status = 'Open'
-            AND (t.name LIKE %(txt)s OR t.subject LIKE %(txt)s)
-            ORDER BY t.subject
-            LIMIT %(start)s, %(page_len)s
-        """
-        
-        return frappe.db.sql(query, {
-            'employee': employee,
-            'project': project,
-            'txt': f'%{txt}%',
-            'start': start,
-            'page_len': page_len
-        })
+        if ctx.is_restricted and employee != ctx.current_employee:
+            return []
+        
+        # Task assegnate all'employee per il progetto specifico (dall'indice delle assegnazioni)
+        tasks = [
+            (t["name"], t["subject"])
+            for t in assignments.get_assigned_tasks(assignments.get_employee_user(employee), project)
+            if search.matches_prefix(txt, t["name"], t["subject"])
+        ]
+        
+        return search.paginate(tasks, start, page_len)
         
     except Exception as e:
         frappe.log_error(f"Errore in get_employee_tasks: {str(e)}")
@@ -837,6 +1350,7 @@ def get_employee_tasks(doctype, txt, searchfield, start, page_len, filters):
 
 
 @frappe.whitelist()
+@instrumented
 def get_task_project(task_name):
     """
     Restituisce il progetto associato a un task
@@ -845,8 +1359,7 @@ def get_task_project(task_name):
         if not task_name:
             return None
         
-        project = frappe.db.get_value("Task", task_name, "project")
-        return project
+        return assignments.get_task_project(task_name, frappe.session.user)
         
     except Exception as e:
         frappe.log_error(f"Errore in get_task_project: {str(e)}")
@@ -854,6 +1367,7 @@ def get_task_project(task_name):
 
 
 @frappe.whitelist()
+@instrumented
 def check_employee_has_tasks(employee, project):
     """
     Verifica se un employee ha task assegnate per un progetto specifico
@@ -863,33 +1377,14 @@ def check_employee_has_tasks(employee, project):
             return False
         
         # Controllo permessi basato sui ruoli
-        user_roles = frappe.get_roles(frappe.session.user)
-        is_manager = any(role in user_roles for role in ["System Manager", "HR Manager", "HR User"])
+        ctx = get_permission_context()
         
         # Se non è manager, verifica che stia controllando per se stesso
-        if not is_manager and "Employee" in user_roles:
-            current_employee = frappe.db.get_value("Employee", {"user_id": frappe.session.user}, "name")
-            if employee != current_employee:
-                return False
-        
-        # Query per verificare se esistono task assegnate
-        query = """
-            SELECT COUNT(*) as count
-            FROM `tabTask` t
-            INNER JOIN `tabToDo` td ON td.reference_type = 'Task' AND td.reference_name = t.name
-            INNER JOIN `tabEmployee` e ON e.user_id = td.allocated_to
-            WHERE t.project = %(project)s
-            AND e.name = %(employee)s
-            AND t.status != 'Cancelled'
-            AND td.status = 'Open'
-        """
-        
-        result = frappe.db.sql(query, {
-            'employee': employee,
-            'project': project
-        }, as_dict=True)
-        
-        return result[0]['count'] > 0 if result else False
+        if ctx.is_restricted and employee != ctx.current_employee:
+            return False
+        
+        # Verifica sull'indice delle assegnazioni dell'utente collegato all'employee
+        return assignments.has_assigned_tasks(assignments.get_employee_user(employee), project)
         
     except Exception as e:
         frappe.log_error(f"Errore in check_employee_has_tasks: {str(e)}")
@@ -903,7 +1398,7 @@ def has_permission():
     """
     try:
         # Verifica se l'utente ha uno dei ruoli di base di ERPNext
-        user_roles = frappe.get_roles(frappe.session.user)
+        user_roles = get_permission_context().roles
         required_roles = ["System Manager", "HR Manager", "HR User", "Employee"]
         
         # Se l'utente ha almeno uno dei ruoli richiesti, può accedere
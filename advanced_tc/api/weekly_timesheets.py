@@ -0,0 +1,168 @@
+import hashlib
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, getdate
+
+# Attesa massima (secondi) per il lock di una settimana di un employee
+WEEK_LOCK_TIMEOUT = 10
+
+
+def get_week_start_date(date):
+    """
+    Calcola l'inizio della settimana (lunedì) per una data specifica
+    """
+    if isinstance(date, str):
+        date = getdate(date)
+
+    # Calcola quanti giorni sottrarre per arrivare al lunedì (0=lunedì, 6=domenica)
+    days_since_monday = date.weekday()
+    week_start = date - timedelta(days=days_since_monday)
+
+    return week_start
+
+
+def lock_employee_week(employee, week_start):
+    """
+    Lock applicativo (advisory lock del database) sulla settimana di un employee, mantenuto fino
+    alla fine della transazione: due richieste concorrenti per la stessa settimana non possono
+    entrambe non trovare il Timesheet e crearne uno ciascuna.
+    """
+    key = f"advanced_tc_week|{employee}|{getdate(week_start)}"
+
+    locked = getattr(frappe.local, "advanced_tc_week_locks", None)
+    if locked is None:
+        locked = frappe.local.advanced_tc_week_locks = set()
+
+    if key in locked:
+        return
+
+    if frappe.db.db_type == "postgres":
+        # Rilasciato automaticamente a fine transazione
+        frappe.db.sql("SELECT pg_advisory_xact_lock(hashtext(%s))", (key,))
+        locked.add(key)
+        return
+
+    # GET_LOCK accetta nomi di al più 64 caratteri
+    lock_name = "advanced_tc_" + hashlib.md5(key.encode()).hexdigest()
+    acquired = frappe.db.sql("SELECT GET_LOCK(%s, %s)", (lock_name, WEEK_LOCK_TIMEOUT))[0][0]
+    if not acquired:
+        frappe.throw(_("Timesheet della settimana in aggiornamento da un'altra richiesta, riprovare."))
+
+    locked.add(key)
+
+    def release():
+        frappe.db.sql("SELECT RELEASE_LOCK(%s)", (lock_name,))
+        locked.discard(key)
+
+    # GET_LOCK vale per la connessione: rilascio dopo commit o rollback della transazione
+    frappe.db.after_commit.add(release)
+    frappe.db.after_rollback.add(release)
+
+# Timesheet dell'employee per la settimana ({lock}: FOR UPDATE per la lettura bloccante)
+WEEK_TIMESHEET_QUERY = """
+    SELECT name, start_date, end_date, employee
+    FROM `tabTimesheet`
+    WHERE employee = %(employee)s
+    AND start_date BETWEEN %(week_start)s AND %(week_end)s
+    AND docstatus < 2
+    ORDER BY docstatus ASC, creation ASC
+    LIMIT 1
+    {lock}
+"""
+
+
+def find_week_timesheet(employee, week_start, for_update=False):
+    """
+    Timesheet (non annullato) dell'employee per la settimana. ERPNext riallinea start_date alla
+    prima attività, quindi la ricerca avviene su tutto l'intervallo della settimana.
+    Con for_update la lettura è bloccante e vede anche i Timesheet appena committati da altre
+    transazioni (una lettura normale userebbe lo snapshot della transazione corrente).
+    """
+    week_start = getdate(week_start)
+    result = frappe.db.sql(WEEK_TIMESHEET_QUERY.format(lock="FOR UPDATE" if for_update else ""), {
+        "employee": employee,
+        "week_start": week_start,
+        "week_end": add_days(week_start, 6)
+    }, as_dict=True)
+
+    return result[0] if result else None
+
+
+def get_duplicate_weeks():
+    """
+    Settimane con più Timesheet in bozza per lo stesso employee:
+    [{"employee", "week_start", "timesheets": [dal più vecchio al più recente]}]
+    """
+    rows = frappe.db.sql("""
+        SELECT name, employee, start_date
+        FROM `tabTimesheet`
+        WHERE docstatus = 0 AND employee IS NOT NULL AND start_date IS NOT NULL
+        ORDER BY employee, start_date, creation
+    """, as_dict=True)
+
+    weeks = {}
+    for row in rows:
+        weeks.setdefault((row.employee, get_week_start_date(getdate(row.start_date))), []).append(row.name)
+
+    return [
+        {"employee": employee, "week_start": week_start, "timesheets": names}
+        for (employee, week_start), names in weeks.items()
+        if len(names) > 1
+    ]
+
+
+def merge_week_timesheets(timesheets):
+    """
+    Sposta i time_logs dei Timesheet duplicati nel primo (il più vecchio), lo risalva per
+    ricalcolare totali e date ed elimina i duplicati ormai vuoti. Il commit è a carico del chiamante.
+    """
+    keeper, duplicates = timesheets[0], timesheets[1:]
+
+    frappe.db.sql("""
+        UPDATE `tabTimesheet Detail`
+        SET parent = %(keeper)s
+        WHERE parenttype = 'Timesheet' AND parentfield = 'time_logs' AND parent IN %(duplicates)s
+    """, {"keeper": keeper, "duplicates": tuple(duplicates)})
+
+    doc = frappe.get_doc("Timesheet", keeper)
+    for idx, row in enumerate(sorted(doc.time_logs, key=lambda d: (d.from_time, d.name)), start=1):
+        row.idx = idx
+    doc.calculate_hours()
+    doc.save()
+
+    for name in duplicates:
+        frappe.delete_doc("Timesheet", name)
+
+    return keeper
+
+
+def merge_duplicate_timesheets(dry_run=False):
+    """
+    Unisce i Timesheet settimanali duplicati (solo bozze; quelli inviati non sono modificabili).
+    Ogni settimana è una transazione separata: un errore non blocca le altre.
+    """
+    report = []
+
+    for week in get_duplicate_weeks():
+        entry = dict(week, week_start=str(week["week_start"]))
+
+        if dry_run:
+            report.append(dict(entry, status="duplicate"))
+            continue
+
+        try:
+            lock_employee_week(week["employee"], week["week_start"])
+            entry["kept"] = merge_week_timesheets(week["timesheets"])
+            frappe.db.commit()
+            entry["status"] = "merged"
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(f"Errore nell'unione dei timesheet {', '.join(week['timesheets'])}: {e!s}")
+            entry["status"] = "error"
+            entry["error"] = str(e)
+
+        report.append(entry)
+
+    return report
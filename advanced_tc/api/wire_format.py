@@ -0,0 +1,77 @@
+# Formato compatto (colonnare) del feed eventi: invece di una lista di dict annidati che
+# ripetono nomi di employee, progetti e task per ogni riga, gli eventi vengono inviati come
+# array per colonna più tabelle di lookup per i valori ripetuti. Il decoder si trova in
+# advanced_tc.js (decode_events).
+
+COMPACT_FORMAT = "columnar"
+
+# Colonne con valori semplici (una voce per evento)
+PLAIN_COLUMNS = ("timesheet", "hours", "docstatus", "description")
+
+# Colonne codificate a dizionario: colonna -> (lookup, campo etichetta opzionale)
+LOOKUP_COLUMNS = {
+    "employee": ("employees", "employee_name"),
+    "project": ("projects", "project_name"),
+    "task": ("tasks", "task_subject"),
+    "activity_type": ("activity_types", None),
+    "company": ("companies", None),
+}
+
+
+def encode_events_compact(events):
+    """
+    Converte una lista di eventi FullCalendar (come prodotti da format_event) nel formato
+    colonnare. Le colonne assenti da tutti gli eventi vengono omesse.
+    """
+    columns = {"id": [], "start": [], "end": []}
+    lookups = {}
+    lookup_indexes = {}
+
+    present = set()
+    for event in events:
+        present.update((event.get("extendedProps") or {}).keys())
+
+    for fieldname in PLAIN_COLUMNS:
+        if fieldname in present:
+            columns[fieldname] = []
+
+    for fieldname, (lookup, _label) in LOOKUP_COLUMNS.items():
+        if fieldname in present:
+            columns[fieldname] = []
+            lookups[lookup] = []
+            lookup_indexes[lookup] = {}
+
+    for event in events:
+        props = event.get("extendedProps") or {}
+
+        columns["id"].append(event.get("id"))
+        columns["start"].append(event.get("start"))
+        columns["end"].append(event.get("end"))
+
+        for fieldname in PLAIN_COLUMNS:
+            if fieldname in columns:
+                columns[fieldname].append(props.get(fieldname))
+
+        for fieldname, (lookup, label) in LOOKUP_COLUMNS.items():
+            if fieldname not in columns:
+                continue
+
+            value = props.get(fieldname)
+            if not value:
+                columns[fieldname].append(None)
+                continue
+
+            indexes = lookup_indexes[lookup]
+            if value not in indexes:
+                indexes[value] = len(lookups[lookup])
+                # Coppia [valore, etichetta] solo se l'etichetta è presente negli eventi (non in modalità slim)
+                lookups[lookup].append([value, props.get(label)] if label and label in present else value)
+
+            columns[fieldname].append(indexes[value])
+
+    return {
+        "format": COMPACT_FORMAT,
+        "count": len(events),
+        "columns": columns,
+        "lookups": lookups
+    }
@@ -0,0 +1,154 @@
+import json
+from contextlib import ExitStack, contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate
+
+from advanced_tc.api.overlaps import validate_entries_no_overlap
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import (
+    OVERLAP_ERROR_MESSAGE,
+    create_timesheet_details,
+    get_week_start_date,
+    validate_entry,
+)
+
+# Modalità di scrittura asincrona (disattivata di default): advanced_tc_async_writes = 1 in site_config
+ASYNC_WRITES_CONFIG = "advanced_tc_async_writes"
+
+# Evento realtime con l'esito di una scrittura accodata (inviato solo all'utente che l'ha richiesta)
+WRITE_RESULT_EVENT = "advanced_tc_write_result"
+
+# Lock Redis per employee-settimana: i job che scrivono sullo stesso Timesheet settimanale
+# vengono eseguiti uno alla volta anche se presi in carico da worker diversi
+WRITE_LOCK_PREFIX = "advanced_tc_write_lock"
+WRITE_LOCK_TIMEOUT = 120
+WRITE_LOCK_WAIT = 60
+
+WRITE_QUEUE = "short"
+
+
+def is_async_writes_enabled():
+    return bool(cint(frappe.conf.get(ASYNC_WRITES_CONFIG, 0)))
+
+
+@frappe.whitelist()
+def enqueue_timesheet_details(entries):
+    """
+    Valida le voci e ne accoda la creazione come job in background, restituendo subito
+    un id provvisorio per ogni voce. L'esito finale arriva al client con l'evento realtime
+    advanced_tc_write_result. Se la modalità asincrona non è attiva la creazione è immediata.
+    """
+    try:
+        if isinstance(entries, str):
+            entries = json.loads(entries)
+
+        if not entries:
+            return {"success": True, "queued": False, "created": []}
+
+        ctx = get_permission_context()
+
+        if not is_async_writes_enabled():
+            created = create_timesheet_details(ctx, entries)
+            frappe.db.commit()
+            return {"success": True, "queued": False, "created": created}
+
+        # Controlli rapidi prima di accodare, per restituire subito gli errori più comuni
+        # (ripetuti dal job sotto lock, dove fanno fede)
+        checked = [(data.get("employee"), *validate_entry(ctx, data)) for data in entries]
+        validate_entries_no_overlap(checked, message=_(OVERLAP_ERROR_MESSAGE))
+
+        request_id = frappe.generate_hash(length=10)
+        provisional_ids = [f"pending-{request_id}-{index}" for index in range(len(entries))]
+
+        frappe.enqueue(
+            "advanced_tc.api.write_queue.process_timesheet_details",
+            queue=WRITE_QUEUE,
+            timeout=WRITE_LOCK_TIMEOUT + WRITE_LOCK_WAIT,
+            request_id=request_id,
+            entries=entries,
+            provisional_ids=provisional_ids
+        )
+
+        return {
+            "success": True,
+            "queued": True,
+            "request_id": request_id,
+            "provisional_ids": provisional_ids
+        }
+
+    except Exception as e:
+        frappe.db.rollback()
+
+        if OVERLAP_ERROR_MESSAGE in str(e):
+            raise e
+
+        frappe.log_error(f"Errore in enqueue_timesheet_details: {e!s}")
+        frappe.throw(_("Errore nella creazione: {0}").format(str(e)))
+
+
+def process_timesheet_details(request_id, entries, provisional_ids):
+    """
+    Job in background: crea le voci sotto i lock delle settimane coinvolte ed invia l'esito
+    all'utente che le ha richieste (il job viene eseguito con l'utente della richiesta)
+    """
+    user = frappe.session.user
+
+    try:
+        with ExitStack() as stack:
+            for key in get_write_lock_keys(entries):
+                stack.enter_context(week_lock(key))
+
+            created = create_timesheet_details(get_permission_context(), entries)
+            frappe.db.commit()
+
+        for item in created:
+            item["provisional_id"] = provisional_ids[item["index"]]
+
+        result = {"request_id": request_id, "success": True, "created": created}
+
+    except Exception as e:
+        frappe.db.rollback()
+
+        if OVERLAP_ERROR_MESSAGE not in str(e):
+            frappe.log_error(f"Errore in process_timesheet_details: {e!s}")
+
+        result = {
+            "request_id": request_id,
+            "success": False,
+            "provisional_ids": provisional_ids,
+            "error": str(e)
+        }
+
+    frappe.publish_realtime(WRITE_RESULT_EVENT, result, user=user)
+
+
+def get_write_lock_keys(entries):
+    """
+    Chiavi employee-settimana delle voci, ordinate per acquisire i lock sempre nello stesso ordine
+    """
+    return sorted({
+        f"{data.get('employee')}|{get_week_start_date(getdate(data.get('from_time')))}"
+        for data in entries
+    })
+
+
+@contextmanager
+def week_lock(key):
+    """
+    Lock Redis su una settimana di un employee
+    """
+    lock = frappe.cache().lock(frappe.cache().make_key(f"{WRITE_LOCK_PREFIX}|{key}"), timeout=WRITE_LOCK_TIMEOUT)
+
+    if not lock.acquire(blocking_timeout=WRITE_LOCK_WAIT):
+        frappe.throw(_("Timesheet occupato da un'altra scrittura, riprovare tra qualche istante."))
+
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            # Lock già scaduto: il rilascio non è più necessario
+            pass
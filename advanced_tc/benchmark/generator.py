@@ -0,0 +1,305 @@
+import random
+from datetime import datetime, time, timedelta
+
+import frappe
+from frappe.utils import add_days, getdate, now_datetime, nowdate
+
+from advanced_tc.api import assignments, bootstrap, event_cache, rollup, search
+from advanced_tc.api.permissions import clear_permission_context
+from advanced_tc.api.weekly_timesheets import get_week_start_date
+
+# Prefisso dei record sintetici: permette di riconoscerli ed eliminarli
+BENCH_PREFIX = "BENCH"
+BENCH_USER_DOMAIN = "bench.advanced-tc.local"
+
+ACTIVITY_TYPES = ["BENCH Development", "BENCH Meeting", "BENCH Support", "BENCH Analysis"]
+
+# Fasce orarie di una giornata tipo (mattina e pomeriggio, divise dalla pausa pranzo)
+WORKDAY_SLOTS = [(time(9, 30), time(13, 0)), (time(14, 0), time(18, 30))]
+
+INSERT_CHUNK_SIZE = 5000
+
+STANDARD_FIELDS = ["name", "creation", "modified", "owner", "modified_by", "docstatus", "idx"]
+
+
+def check_benchmark_site():
+    """
+    I dati sintetici vengono scritti direttamente nel database: solo su siti di test
+    (allow_tests = 1 in site_config, come per bench run-tests)
+    """
+    if not frappe.conf.get("allow_tests"):
+        frappe.throw("Benchmark consentito solo sui siti con allow_tests = 1 in site_config")
+
+
+def generate_dataset(employees=500, years=3, projects=60, tasks_per_project=8, projects_per_employee=3, company=None, seed=42):
+    """
+    Popola il sito con Employee, utenti, Project, Task, assegnazioni (ToDo) e Timesheet settimanali sintetici.
+    I record sono inseriti con bulk insert (senza doc_events): alla fine vengono ricostruiti
+    la tabella dei totali giornalieri e svuotate le cache dell'app.
+    Restituisce i conteggi dei record creati.
+    """
+    check_benchmark_site()
+    clear_dataset()
+
+    rng = random.Random(seed)
+    company = company or get_default_company()
+    end_date = getdate(nowdate())
+    start_date = get_week_start_date(add_days(end_date, -365 * years))
+
+    insert_activity_types()
+    project_names = insert_projects(projects, company)
+    task_projects = insert_tasks(project_names, tasks_per_project)
+    employee_users = insert_employees(employees, company)
+
+    user_tasks = insert_assignments(rng, employee_users, project_names, task_projects, projects_per_employee)
+    frappe.db.commit()
+
+    counts = {
+        "employees": employees,
+        "projects": len(project_names),
+        "tasks": len(task_projects),
+        "assigned_tasks": sum(len(tasks) for tasks in user_tasks.values()),
+    }
+
+    timesheets, details = 0, 0
+    for employee, employee_name, user in employee_users:
+        created = insert_employee_timesheets(
+            rng, employee, employee_name, company, start_date, end_date, user_tasks[user]
+        )
+        timesheets += created[0]
+        details += created[1]
+        # Un commit per employee: transazioni di dimensione contenuta
+        frappe.db.commit()
+
+    counts.update({"timesheets": timesheets, "timesheet_details": details})
+
+    rollup.rebuild_rollup(start_date, end_date)
+    frappe.db.commit()
+    clear_app_caches()
+
+    counts.update({"from_date": str(start_date), "to_date": str(end_date), "company": company, "seed": seed})
+    return counts
+
+
+def clear_dataset():
+    """
+    Elimina i record sintetici di una generazione precedente
+    """
+    check_benchmark_site()
+
+    like = f"{BENCH_PREFIX}-%"
+    frappe.db.sql("""
+        DELETE FROM `tabTimesheet Detail` WHERE parenttype = 'Timesheet' AND parent LIKE %s
+    """, (like,))
+    for doctype in ("Timesheet", "Task", "Project", "Employee"):
+        frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE name LIKE %s", (like,))
+
+    frappe.db.sql("DELETE FROM `tabToDo` WHERE allocated_to LIKE %s", (f"%@{BENCH_USER_DOMAIN}",))
+    frappe.db.sql("DELETE FROM `tabHas Role` WHERE parenttype = 'User' AND parent LIKE %s", (f"%@{BENCH_USER_DOMAIN}",))
+    frappe.db.sql("DELETE FROM `tabUser` WHERE name LIKE %s", (f"%@{BENCH_USER_DOMAIN}",))
+    frappe.db.sql("DELETE FROM `tabTimesheet Daily Rollup` WHERE employee LIKE %s", (like,))
+    frappe.db.commit()
+
+    clear_app_caches()
+
+
+def clear_app_caches():
+    """
+    I bulk insert non eseguono i doc_events: le cache dell'app vanno svuotate esplicitamente
+    """
+    clear_permission_context()
+    assignments.clear_assignment_index()
+    bootstrap.clear_bootstrap_cache()
+    event_cache.clear_event_cache()
+    search.clear_search_cache()
+
+
+def get_default_company():
+    company = frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {}, "name")
+    if not company:
+        frappe.throw("Nessuna Company presente sul sito: crearne una o indicarla con --company")
+    return company
+
+
+def employee_user(employee):
+    return f"{employee.lower()}@{BENCH_USER_DOMAIN}"
+
+
+def standard_fields(name, now, docstatus=0, idx=0):
+    return [name, now, now, "Administrator", "Administrator", docstatus, idx]
+
+
+def insert_activity_types():
+    now = now_datetime()
+    frappe.db.bulk_insert(
+        "Activity Type",
+        [*STANDARD_FIELDS, "activity_type"],
+        [[*standard_fields(name, now), name] for name in ACTIVITY_TYPES],
+        ignore_duplicates=True
+    )
+
+
+def insert_projects(count, company):
+    now = now_datetime()
+    names = [f"{BENCH_PREFIX}-PRJ-{index:04d}" for index in range(1, count + 1)]
+    frappe.db.bulk_insert(
+        "Project",
+        [*STANDARD_FIELDS, "project_name", "status", "company", "is_active"],
+        [[*standard_fields(name, now), f"Bench Project {index:04d}", "Open", company, "Yes"]
+            for index, name in enumerate(names, start=1)]
+    )
+    return names
+
+
+def insert_tasks(project_names, tasks_per_project):
+    """
+    Restituisce {task: project}
+    """
+    now = now_datetime()
+    task_projects = {}
+    values = []
+
+    for project_index, project in enumerate(project_names, start=1):
+        for index in range(1, tasks_per_project + 1):
+            name = f"{BENCH_PREFIX}-TASK-{project_index:04d}-{index:03d}"
+            task_projects[name] = project
+            values.append([*standard_fields(name, now), f"Bench Task {project_index:04d}.{index:03d}", project, "Open"])
+
+    frappe.db.bulk_insert("Task", [*STANDARD_FIELDS, "subject", "project", "status"], values, chunk_size=INSERT_CHUNK_SIZE)
+    return task_projects
+
+
+def insert_employees(count, company):
+    """
+    Employee con un utente (ruolo Employee) ciascuno, per gli scenari con visibilità ristretta.
+    Restituisce [(employee, employee_name, user)]
+    """
+    now = now_datetime()
+    employees = []
+
+    for index in range(1, count + 1):
+        name = f"{BENCH_PREFIX}-EMP-{index:05d}"
+        employees.append((name, f"Bench Employee {index:05d}", employee_user(name)))
+
+    frappe.db.bulk_insert(
+        "User",
+        [*STANDARD_FIELDS, "email", "first_name", "full_name", "enabled", "user_type"],
+        [[*standard_fields(user, now), user, employee_name, employee_name, 1, "System User"]
+            for _name, employee_name, user in employees],
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+    frappe.db.bulk_insert(
+        "Has Role",
+        [*STANDARD_FIELDS, "parent", "parenttype", "parentfield", "role"],
+        [[*standard_fields(f"{BENCH_PREFIX}-ROLE-{index:05d}", now), user, "User", "roles", "Employee"]
+            for index, (_name, _employee_name, user) in enumerate(employees, start=1)],
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+    frappe.db.bulk_insert(
+        "Employee",
+        [*STANDARD_FIELDS, "first_name", "employee_name", "company", "status", "user_id",
+            "gender", "date_of_birth", "date_of_joining"],
+        [[*standard_fields(name, now), employee_name, employee_name, company, "Active", user,
+            "Male", "1990-01-01", "2015-01-01"]
+            for name, employee_name, user in employees],
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+
+    return employees
+
+
+def insert_assignments(rng, employee_users, project_names, task_projects, projects_per_employee):
+    """
+    Assegna ad ogni employee alcuni progetti e, per ciascuno, alcune task (ToDo aperti).
+    Restituisce {user: [(project, task)]}
+    """
+    now = now_datetime()
+    tasks_by_project = {}
+    for task, project in task_projects.items():
+        tasks_by_project.setdefault(project, []).append(task)
+
+    values = []
+    user_tasks = {}
+    for _employee, _employee_name, user in employee_users:
+        user_tasks[user] = []
+        for project in rng.sample(project_names, min(projects_per_employee, len(project_names))):
+            tasks = rng.sample(tasks_by_project[project], min(3, len(tasks_by_project[project])))
+            user_tasks[user].extend((project, task) for task in tasks)
+
+            for reference_type, reference_name in [("Project", project)] + [("Task", task) for task in tasks]:
+                values.append([
+                    *standard_fields(f"{BENCH_PREFIX}-TODO-{len(values) + 1:07d}", now),
+                    "Open", user, reference_type, reference_name, f"Bench assignment {reference_name}"
+                ])
+
+    frappe.db.bulk_insert(
+        "ToDo",
+        [*STANDARD_FIELDS, "status", "allocated_to", "reference_type", "reference_name", "description"],
+        values,
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+    return user_tasks
+
+
+def insert_employee_timesheets(rng, employee, employee_name, company, start_date, end_date, employee_tasks):
+    """
+    Un Timesheet in bozza per settimana con due attività per giorno lavorativo
+    (le settimane concluse da più di un mese sono inviate). Restituisce (timesheets, details).
+    """
+    if not employee_tasks:
+        return 0, 0
+
+    now = now_datetime()
+    submit_before = add_days(end_date, -30)
+    timesheets, details = [], []
+    week_start = start_date
+
+    while week_start <= end_date:
+        name = f"{BENCH_PREFIX}-TS-{employee.rsplit('-', 1)[-1]}-{week_start.strftime('%Y%m%d')}"
+        docstatus = 1 if add_days(week_start, 6) < submit_before else 0
+        total_hours = 0
+        idx = 0
+
+        for offset in range(5):
+            day = add_days(week_start, offset)
+            if day > end_date or rng.random() < 0.05:
+                # Giorno futuro o di assenza
+                continue
+
+            for slot_start, slot_end in WORKDAY_SLOTS:
+                project, task = rng.choice(employee_tasks)
+                from_time = datetime.combine(day, slot_start)
+                to_time = datetime.combine(day, slot_end)
+                hours = (to_time - from_time).total_seconds() / 3600
+                idx += 1
+                total_hours += hours
+                details.append([
+                    *standard_fields(f"{name}-{idx:02d}", now, docstatus, idx),
+                    name, "Timesheet", "time_logs", from_time, to_time, hours,
+                    project, task, rng.choice(ACTIVITY_TYPES), f"Bench activity {task}", 0
+                ])
+
+        if idx:
+            timesheets.append([
+                *standard_fields(name, now, docstatus),
+                employee, employee_name, company, week_start, add_days(week_start, 4),
+                total_hours, "Submitted" if docstatus else "Draft"
+            ])
+
+        week_start += timedelta(days=7)
+
+    frappe.db.bulk_insert(
+        "Timesheet",
+        [*STANDARD_FIELDS, "employee", "employee_name", "company", "start_date", "end_date", "total_hours", "status"],
+        timesheets,
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+    frappe.db.bulk_insert(
+        "Timesheet Detail",
+        [*STANDARD_FIELDS, "parent", "parenttype", "parentfield", "from_time", "to_time", "hours",
+            "project", "task", "activity_type", "description", "is_billable"],
+        details,
+        chunk_size=INSERT_CHUNK_SIZE
+    )
+
+    return len(timesheets), len(details)
@@ -0,0 +1,347 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import frappe
+import requests
+from frappe.utils import add_days, get_first_day, getdate, nowdate
+from frappe.utils.password import set_encrypted_password
+
+from advanced_tc.api import assignments
+from advanced_tc.api.weekly_timesheets import get_week_start_date
+from advanced_tc.benchmark.generator import BENCH_PREFIX
+from advanced_tc.benchmark.metrics import percentile
+
+API_PREFIX = "/api/method/advanced_tc.api.timesheet_details"
+
+# Classificazione degli errori dal testo della risposta: (categoria, frammento cercato)
+ERROR_CLASSES = (
+    ("deadlock", "Deadlock found"),
+    ("lock_wait_timeout", "Lock wait timeout"),
+    ("week_lock_timeout", "in aggiornamento da un'altra richiesta"),
+    ("overlap", "Attività già presente"),
+)
+
+# Fasce orarie per le scritture: settimane future (libere nei dati sintetici), 12 slot da un'ora al giorno
+SLOTS_PER_DAY = 12
+FIRST_SLOT_HOUR = 7
+
+REQUEST_TIMEOUT = 60
+
+
+class LoadTestRecorder:
+    """
+    Raccoglie (in modo thread-safe) latenza, esito e categoria di errore di ogni richiesta
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.started = None
+        self.finished = None
+
+    def add(self, action, elapsed_ms, status, error_class=None):
+        with self.lock:
+            self.samples.setdefault(action, []).append((elapsed_ms, status, error_class))
+
+    def report(self):
+        duration = max((self.finished or time.time()) - (self.started or time.time()), 0.001)
+        actions = {}
+        totals = {"requests": 0, "errors": 0, "error_classes": {}}
+
+        for action, samples in sorted(self.samples.items()):
+            latencies = sorted(elapsed for elapsed, _status, _error in samples)
+            errors = [error for _elapsed, status, error in samples if status != 200]
+            error_classes = {}
+            for error in errors:
+                error_classes[error or "other"] = error_classes.get(error or "other", 0) + 1
+                totals["error_classes"][error or "other"] = totals["error_classes"].get(error or "other", 0) + 1
+
+            totals["requests"] += len(samples)
+            totals["errors"] += len(errors)
+            actions[action] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / duration, 2),
+                "error_rate": round(len(errors) / len(samples), 4),
+                "error_classes": error_classes,
+                "latency_ms": {
+                    name: round(percentile(latencies, fraction), 2)
+                    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+                },
+            }
+
+        totals["throughput_rps"] = round(totals["requests"] / duration, 2)
+        totals["error_rate"] = round(totals["errors"] / totals["requests"], 4) if totals["requests"] else 0
+        totals["deadlock_rate"] = (
+            round(totals["error_classes"].get("deadlock", 0) / totals["requests"], 4) if totals["requests"] else 0
+        )
+
+        return {"duration_s": round(duration, 2), "totals": totals, "actions": actions}
+
+
+class VirtualUser(threading.Thread):
+    """
+    Utente simulato: una sessione HTTP autenticata con token che alterna letture e scritture
+    sugli endpoint reali del calendario, con pause casuali tra un'azione e l'altra
+    """
+
+    def __init__(self, profile, base_url, host, recorder, deadline, start_delay, think_time, write_ratio, seed):
+        super().__init__(daemon=True)
+
+        self.profile = profile
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.deadline = deadline
+        self.start_delay = start_delay
+        self.think_time = think_time
+        self.write_ratio = write_ratio
+        self.rng = random.Random(seed)
+        self.created = []
+        self.next_slot = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"token {profile['api_key']}:{profile['api_secret']}",
+            "Accept": "application/json",
+        })
+        if host:
+            # Bench multi-sito: il sito viene risolto dall'header Host
+            self.session.headers["Host"] = host
+
+    def run(self):
+        time.sleep(self.start_delay)
+
+        # Apertura della pagina
+        self.request("get_filter_options", {})
+
+        while time.time() < self.deadline:
+            self.next_action()()
+            # Pausa esponenziale attorno al think time medio
+            time.sleep(self.rng.expovariate(1 / self.think_time) if self.think_time else 0)
+
+        self.session.close()
+
+    def next_action(self):
+        if self.rng.random() >= self.write_ratio:
+            return self.rng.choice([self.read_week, self.read_week, self.read_week, self.read_month, self.search_projects])
+
+        if self.created and self.rng.random() < 0.3:
+            return self.rng.choice([self.drag_activity, self.delete_activity])
+        return self.create_activity
+
+    def request(self, method, data, action=None):
+        """
+        POST su /api/method: restituisce il campo message della risposta (None in caso di errore)
+        """
+        payload = {key: json.dumps(value) if isinstance(value, dict | list) else value for key, value in data.items()}
+        started = time.perf_counter()
+        error_class = None
+
+        try:
+            response = self.session.post(f"{self.base_url}{API_PREFIX}.{method}", data=payload, timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+            body = response.text
+        except Exception as e:
+            status, body = 0, str(e)
+            error_class = "connection"
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if status != 200 and not error_class:
+            error_class = next((name for name, fragment in ERROR_CLASSES if fragment in body), "http_" + str(status))
+
+        self.recorder.add(action or method, elapsed_ms, status, error_class)
+
+        if status != 200:
+            return None
+        try:
+            return response.json().get("message")
+        except ValueError:
+            return None
+
+    def read_week(self):
+        week_start = self.profile["current_week"] - timedelta(days=7 * self.rng.randint(0, 4))
+        self.request("get_timesheet_details", {
+            "start_date": f"{week_start} 00:00:00",
+            "end_date": f"{week_start + timedelta(days=7)} 00:00:00",
+            "filters": {"employee": self.profile["employee"]},
+            "compact": 1,
+        })
+
+    def read_month(self):
+        first_day = self.profile["current_month"]
+        self.request("get_timesheet_summary", {
+            "start_date": f"{first_day} 00:00:00",
+            "end_date": f"{(first_day + timedelta(days=32)).replace(day=1)} 00:00:00",
+            "filters": {"employee": self.profile["employee"]},
+        })
+
+    def search_projects(self):
+        self.request("get_employee_projects", {
+            "doctype": "Project",
+            "txt": self.rng.choice(["B", "Bench", "Bench P"]),
+            "searchfield": "name",
+            "start": 0,
+            "page_len": 20,
+            "filters": {"employee": self.profile["employee"]},
+        })
+
+    def create_activity(self):
+        if not self.profile["tasks"]:
+            return
+
+        from_time = self.take_slot()
+        project, task = self.rng.choice(self.profile["tasks"])
+        result = self.request("create_timesheet_detail", {
+            "data": {
+                "employee": self.profile["employee"],
+                "project": project,
+                "task": task,
+                "activity_type": self.profile["activity_type"],
+                "from_time": str(from_time),
+                "to_time": str(from_time + timedelta(hours=1)),
+                "description": "Load test",
+                "company": self.profile["company"],
+            }
+        })
+        if result and result.get("timesheet_detail"):
+            self.created.append((result["timesheet_detail"], from_time))
+
+    def drag_activity(self):
+        name, from_time = self.rng.choice(self.created)
+        # Ridimensionamento all'interno del proprio slot: nessuna sovrapposizione con altre attività
+        minutes = self.rng.choice([30, 45, 60])
+        self.request("update_timesheet_detail", {
+            "name": name,
+            "data": {"from_time": str(from_time), "to_time": str(from_time + timedelta(minutes=minutes))},
+        })
+
+    def delete_activity(self):
+        name, _from_time = self.created.pop(self.rng.randrange(len(self.created)))
+        self.request("delete_timesheet_detail", {"name": name})
+
+    def take_slot(self):
+        """
+        Slot orario libero successivo nelle settimane future: ogni utente riempie la propria settimana
+        giorno per giorno, come nel picco del lunedì mattina
+        """
+        slot = self.next_slot
+        self.next_slot += 1
+
+        week = slot // (7 * SLOTS_PER_DAY)
+        day = (slot // SLOTS_PER_DAY) % 7
+        hour = FIRST_SLOT_HOUR + slot % SLOTS_PER_DAY
+        week_start = self.profile["first_week"] + timedelta(days=7 * week)
+        return datetime.combine(week_start + timedelta(days=day), datetime.min.time()) + timedelta(hours=hour)
+
+    def cleanup(self):
+        """
+        Elimina le attività create e rimaste (fuori dalle misure)
+        """
+        for name, _from_time in self.created:
+            self.request("delete_timesheet_detail", {"name": name}, action="cleanup")
+        self.created = []
+
+
+def prepare_virtual_users(count, seed=42):
+    """
+    Profili degli utenti simulati dai dati sintetici, con una coppia api_key/api_secret generata
+    per ciascuno (autenticazione con token, senza login). Eseguito nel contesto del sito.
+    """
+    rng = random.Random(seed)
+    employees = frappe.db.sql("""
+        SELECT name, user_id, company FROM `tabEmployee`
+        WHERE name LIKE %s AND user_id IS NOT NULL
+        ORDER BY name
+    """, (f"{BENCH_PREFIX}-%",), as_dict=True)
+
+    if not employees:
+        frappe.throw("Nessun dato di benchmark: eseguire prima bench advanced-tc-benchmark-seed")
+
+    activity_types = frappe.get_all("Activity Type", pluck="name", limit=10) or [None]
+    # Date calcolate qui: i thread degli utenti simulati non usano il contesto frappe
+    today = getdate(nowdate())
+    current_week = get_week_start_date(today)
+
+    profiles = []
+    for employee in rng.sample(employees, min(count, len(employees))):
+        api_key = frappe.generate_hash(length=15)
+        api_secret = frappe.generate_hash(length=15)
+        frappe.db.set_value("User", employee.user_id, "api_key", api_key, update_modified=False)
+        set_encrypted_password("User", employee.user_id, api_secret, "api_secret")
+
+        profiles.append({
+            "employee": employee.name,
+            "user": employee.user_id,
+            "company": employee.company,
+            "api_key": api_key,
+            "api_secret": api_secret,
+            "activity_type": rng.choice(activity_types),
+            "current_week": current_week,
+            "current_month": get_first_day(today),
+            # Prima settimana libera: i dati sintetici arrivano fino ad oggi
+            "first_week": add_days(current_week, 7),
+            "tasks": [(task["project"], task["name"]) for task in assignments.get_assigned_tasks(employee.user_id)],
+        })
+
+    frappe.db.commit()
+    return profiles
+
+
+def revoke_api_keys(profiles):
+    for profile in profiles:
+        frappe.db.set_value("User", profile["user"], "api_key", None, update_modified=False)
+        frappe.db.sql("""
+            DELETE FROM `__Auth` WHERE doctype = 'User' AND name = %s AND fieldname = 'api_secret'
+        """, (profile["user"],))
+    frappe.db.commit()
+
+
+def run_load_test(base_url, host, profiles, duration=60, ramp_up=10, think_time=2.0, write_ratio=0.3, seed=42):
+    """
+    Avvia un thread per utente simulato (partenze distribuite sul ramp-up), attende la fine
+    del test, elimina le attività create e restituisce il report
+    """
+    recorder = LoadTestRecorder()
+    recorder.started = time.time()
+    deadline = recorder.started + ramp_up + duration
+
+    users = [
+        VirtualUser(
+            profile,
+            base_url,
+            host,
+            recorder,
+            deadline,
+            start_delay=ramp_up * index / max(len(profiles), 1),
+            think_time=think_time,
+            write_ratio=write_ratio,
+            seed=seed + index
+        )
+        for index, profile in enumerate(profiles)
+    ]
+
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    recorder.finished = time.time()
+
+    report = recorder.report()
+
+    cleanup = [threading.Thread(target=user.cleanup, daemon=True) for user in users]
+    for thread in cleanup:
+        thread.start()
+    for thread in cleanup:
+        thread.join()
+
+    report.update({
+        "base_url": base_url,
+        "users": len(profiles),
+        "ramp_up_s": ramp_up,
+        "think_time_s": think_time,
+        "write_ratio": write_ratio,
+    })
+    return report
@@ -0,0 +1,112 @@
+import time
+from contextlib import contextmanager
+
+import frappe
+
+from advanced_tc.api.instrumentation import SqlRecorder, response_size
+
+# Contatori di sessione MariaDB delle righe lette dagli storage engine (righe esaminate)
+ROWS_READ_STATUS = (
+    "Handler_read_first",
+    "Handler_read_key",
+    "Handler_read_last",
+    "Handler_read_next",
+    "Handler_read_prev",
+    "Handler_read_rnd",
+    "Handler_read_rnd_next",
+)
+
+
+class CallStats:
+    """
+    Misure di una singola chiamata: durata, query SQL eseguite, tempo SQL e righe esaminate
+    """
+
+    def __init__(self):
+        self.wall_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.rows_returned = 0
+        self.rows_scanned = None
+        self.response_bytes = 0
+        self.error = None
+
+
+def read_rows_scanned():
+    """
+    Totale dei contatori Handler_read_* della sessione (None se il database non li espone)
+    """
+    if frappe.db.db_type != "mariadb":
+        return None
+
+    # Letto prima e dopo il blocco misurato: non viene contato tra le query della chiamata
+    rows = frappe.db.sql("SHOW SESSION STATUS WHERE Variable_name IN %s", (ROWS_READ_STATUS,))
+    return sum(int(value) for _name, value in rows)
+
+
+@contextmanager
+def measure_call(stats):
+    """
+    Misura il blocco: durata, query passate da frappe.db.sql (numero, tempo, righe restituite)
+    e righe esaminate dal database
+    """
+    rows_before = read_rows_scanned()
+    started = time.perf_counter()
+
+    try:
+        with SqlRecorder() as recorder:
+            yield stats
+    finally:
+        stats.wall_ms = (time.perf_counter() - started) * 1000
+        stats.queries = recorder.count
+        stats.sql_ms = recorder.sql_ms
+        stats.rows_returned = recorder.rows
+        if rows_before is not None:
+            stats.rows_scanned = read_rows_scanned() - rows_before
+
+
+def percentile(values, fraction):
+    """
+    Percentile con interpolazione lineare su una lista ordinata
+    """
+    if not values:
+        return None
+
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(calls):
+    """
+    Aggregato delle chiamate di un endpoint: percentili di latenza e medie/massimi delle altre misure
+    """
+    completed = [call for call in calls if not call.error]
+    latencies = sorted(call.wall_ms for call in completed)
+
+    def distribution(values):
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        return {"mean": round(sum(values) / len(values), 2), "max": round(max(values), 2)}
+
+    summary = {
+        "calls": len(calls),
+        "errors": len(calls) - len(completed),
+        "latency_ms": {
+            name: round(percentile(latencies, fraction), 2) if latencies else None
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "queries": distribution([call.queries for call in completed]),
+        "sql_ms": distribution([call.sql_ms for call in completed]),
+        "rows_returned": distribution([call.rows_returned for call in completed]),
+        "rows_scanned": distribution([call.rows_scanned for call in completed]),
+        "response_bytes": distribution([call.response_bytes for call in completed]),
+    }
+
+    errors = sorted({call.error for call in calls if call.error})
+    if errors:
+        summary["error_samples"] = errors[:5]
+
+    return summary
@@ -0,0 +1,260 @@
+import random
+from datetime import datetime, time, timedelta
+
+import frappe
+from frappe.utils import add_days, add_months, get_first_day, getdate, nowdate
+
+from advanced_tc.api import assignments, bootstrap, timesheet_details
+from advanced_tc.api.weekly_timesheets import get_week_start_date
+from advanced_tc.benchmark.generator import BENCH_PREFIX, clear_app_caches
+from advanced_tc.benchmark.metrics import CallStats, measure_call, response_size, summarize
+
+# Prefissi digitati nei campi Link dei dialog (ricerca progressiva carattere per carattere)
+AUTOCOMPLETE_PREFIXES = ["B", "Be", "Ben", "Bench", "Bench P", "Bench Project 00"]
+
+# Attributi di frappe.local usati dall'app come cache per richiesta
+REQUEST_LOCALS = ("advanced_tc_permission_context", "advanced_tc_assignment_index", "advanced_tc_week_locks")
+
+
+class BenchmarkRunner:
+    """
+    Esegue le chiamate degli scenari come farebbe una richiesta HTTP (utente impostato,
+    cache per richiesta azzerate) e raccoglie le misure per endpoint
+    """
+
+    def __init__(self, cold=False):
+        self.cold = cold
+        self.results = {}
+
+    def call(self, scenario, user, function, *args, **kwargs):
+        endpoint = f"{function.__module__}.{function.__name__}"
+        stats = CallStats()
+
+        frappe.set_user(user)
+        for attribute in REQUEST_LOCALS:
+            if hasattr(frappe.local, attribute):
+                delattr(frappe.local, attribute)
+        if self.cold:
+            clear_app_caches()
+
+        result = None
+        try:
+            with measure_call(stats):
+                result = function(*args, **kwargs)
+            stats.response_bytes = response_size(result)
+        except Exception as e:
+            frappe.db.rollback()
+            stats.error = str(e)[:200]
+        finally:
+            frappe.set_user("Administrator")
+
+        self.results.setdefault(scenario, {}).setdefault(endpoint, []).append(stats)
+        return result
+
+    def report(self):
+        return {
+            scenario: {endpoint: summarize(calls) for endpoint, calls in endpoints.items()}
+            for scenario, endpoints in self.results.items()
+        }
+
+
+def get_benchmark_users(count, rng):
+    """
+    Campione di employee sintetici con il loro utente: [(employee, user)]
+    """
+    employees = frappe.db.sql("""
+        SELECT name, user_id FROM `tabEmployee`
+        WHERE name LIKE %s AND user_id IS NOT NULL
+        ORDER BY name
+    """, (f"{BENCH_PREFIX}-%",))
+
+    if not employees:
+        frappe.throw("Nessun dato di benchmark: eseguire prima bench advanced-tc-benchmark-seed")
+
+    return rng.sample(list(employees), min(count, len(employees)))
+
+
+def week_windows(weeks):
+    """
+    Finestre settimanali dalla settimana corrente all'indietro
+    """
+    week_start = get_week_start_date(getdate(nowdate()))
+    for offset in range(weeks):
+        start = add_days(week_start, -7 * offset)
+        yield f"{start} 00:00:00", f"{add_days(start, 7)} 00:00:00"
+
+
+def month_windows(months):
+    first_day = get_first_day(nowdate())
+    for offset in range(months):
+        start = add_months(first_day, -offset)
+        yield f"{start} 00:00:00", f"{add_months(start, 1)} 00:00:00"
+
+
+def scenario_week_navigation(runner, users, rng):
+    """
+    Employee che scorre le settimane all'indietro (vista timeGridWeek)
+    """
+    for employee, user in users:
+        for start, end in week_windows(8):
+            runner.call("week_navigation", user, timesheet_details.get_timesheet_details,
+                start, end, {"employee": employee}, compact=1)
+
+
+def scenario_month_navigation(runner, users, rng):
+    """
+    Employee che scorre i mesi (riepilogo mensile ed eventi paginati)
+    """
+    for employee, user in users:
+        for start, end in month_windows(6):
+            runner.call("month_navigation", user, timesheet_details.get_timesheet_summary,
+                start, end, {"employee": employee})
+            load_all_pages(runner, "month_navigation", user, start, end, {"employee": employee})
+
+
+def scenario_manager_views(runner, users, rng):
+    """
+    Manager senza filtro employee: settimana completa di tutti gli employee e riepilogo mensile
+    """
+    for start, end in week_windows(4):
+        load_all_pages(runner, "manager_views", "Administrator", start, end, {})
+
+    for start, end in month_windows(3):
+        runner.call("manager_views", "Administrator", timesheet_details.get_timesheet_summary, start, end, {})
+
+
+def scenario_page_load(runner, users, rng):
+    """
+    Apertura della pagina: opzioni dei filtri e bootstrap (employee e manager)
+    """
+    for _employee, user in [*users, (None, "Administrator")]:
+        runner.call("page_load", user, timesheet_details.get_filter_options)
+        runner.call("page_load", user, bootstrap.get_calendar_bootstrap)
+
+
+def scenario_dialog_autocomplete(runner, users, rng):
+    """
+    Digitazione nei campi Link del dialog di creazione (progetti e task)
+    """
+    for employee, user in users:
+        for txt in AUTOCOMPLETE_PREFIXES:
+            runner.call("dialog_autocomplete", user, timesheet_details.get_employee_projects,
+                "Project", txt, "name", 0, 20, {"employee": employee})
+
+        project = first_assigned_project(user)
+        for txt in AUTOCOMPLETE_PREFIXES[:3]:
+            runner.call("dialog_autocomplete", user, timesheet_details.get_employee_tasks,
+                "Task", txt, "name", 0, 20, {"employee": employee, "project": project})
+
+    for txt in AUTOCOMPLETE_PREFIXES:
+        runner.call("dialog_autocomplete", "Administrator", timesheet_details.get_timesheet_projects,
+            "Project", txt, "name", 0, 20, {})
+
+
+def scenario_create_drag_delete(runner, users, rng):
+    """
+    Creazione, spostamento (drag) ed eliminazione di un'attività in un orario libero
+    (sabato della settimana corrente, i dati sintetici coprono solo i giorni feriali)
+    """
+    saturday = add_days(get_week_start_date(getdate(nowdate())), 5)
+    activity_types = frappe.get_all("Activity Type", pluck="name", limit=10) or [None]
+
+    for index, (employee, user) in enumerate(users):
+        task = first_assigned_task(user)
+        if not task:
+            continue
+
+        from_time = datetime.combine(saturday, time(7, 0)) + timedelta(minutes=15 * (index % 40))
+        created = runner.call("create_drag_delete", user, timesheet_details.create_timesheet_detail, {
+            "employee": employee,
+            "project": task["project"],
+            "task": task["name"],
+            "activity_type": rng.choice(activity_types),
+            "from_time": str(from_time),
+            "to_time": str(from_time + timedelta(hours=1)),
+            "description": "Benchmark",
+            "company": frappe.db.get_value("Employee", employee, "company"),
+        })
+        if not created:
+            continue
+
+        name = created["timesheet_detail"]
+        runner.call("create_drag_delete", user, timesheet_details.update_timesheet_detail, name, {
+            "from_time": str(from_time + timedelta(minutes=30)),
+            "to_time": str(from_time + timedelta(minutes=90)),
+        })
+        runner.call("create_drag_delete", user, timesheet_details.delete_timesheet_detail, name)
+        frappe.db.commit()
+
+
+def load_all_pages(runner, scenario, user, start, end, filters):
+    after, fetched = None, 0
+    while True:
+        page = runner.call(scenario, user, timesheet_details.get_timesheet_details_page,
+            start, end, filters, after=after, fetched=fetched, compact=1)
+        if not page or not page.get("next"):
+            return
+        after = page["next"]
+        fetched += page["events"]["count"]
+
+
+def first_assigned_project(user):
+    projects = assignments.get_assigned_projects(user)
+    return projects[0]["name"] if projects else None
+
+
+def first_assigned_task(user):
+    tasks = assignments.get_assigned_tasks(user)
+    return tasks[0] if tasks else None
+
+
+SCENARIOS = {
+    "page_load": scenario_page_load,
+    "week_navigation": scenario_week_navigation,
+    "month_navigation": scenario_month_navigation,
+    "manager_views": scenario_manager_views,
+    "dialog_autocomplete": scenario_dialog_autocomplete,
+    "create_drag_delete": scenario_create_drag_delete,
+}
+
+
+def run_suite(scenarios=None, users=10, iterations=1, cold=False, seed=42):
+    """
+    Esegue gli scenari (tutti o quelli indicati) per il numero di iterazioni richiesto e
+    restituisce il report JSON: per scenario ed endpoint percentili di latenza, query SQL,
+    tempo SQL, righe restituite ed esaminate, dimensione della risposta
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        frappe.throw(f"Scenari sconosciuti: {', '.join(unknown)}")
+
+    rng = random.Random(seed)
+    runner = BenchmarkRunner(cold=cold)
+    sample = get_benchmark_users(users, rng)
+
+    for _iteration in range(iterations):
+        for name in scenarios:
+            SCENARIOS[name](runner, sample, rng)
+
+    return {
+        "site": frappe.local.site,
+        "db_type": frappe.db.db_type,
+        "users": len(sample),
+        "iterations": iterations,
+        "cold": cold,
+        "dataset": get_dataset_counts(),
+        "scenarios": runner.report(),
+    }
+
+
+def get_dataset_counts():
+    like = f"{BENCH_PREFIX}-%"
+    return {
+        "employees": frappe.db.count("Employee", {"name": ["like", like]}),
+        "projects": frappe.db.count("Project", {"name": ["like", like]}),
+        "timesheets": frappe.db.count("Timesheet", {"name": ["like", like]}),
+        "timesheet_details": frappe.db.sql(
+            "SELECT COUNT(*) FROM `tabTimesheet Detail` WHERE parenttype = 'Timesheet' AND parent LIKE %s", (like,)
+        )[0][0],
+    }
@@ -0,0 +1,216 @@
+import json
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("advanced-tc-check-indexes")
+@click.option("--fix", is_flag=True, default=False, help="Crea gli indici mancanti prima della verifica")
+@pass_context
+def check_indexes(context, fix=False):
+    """
+    Verifica gli indici del calendario ed esegue EXPLAIN sulle query calde (output JSON)
+    """
+    from advanced_tc.api.db_indexes import ensure_indexes, explain_hot_queries, verify_indexes
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        if fix:
+            ensure_indexes()
+            frappe.db.commit()
+
+        report = {
+            "indexes": verify_indexes(),
+            "queries": explain_hot_queries()
+        }
+        click.echo(json.dumps(report, indent=2, default=str))
+
+        if not all(index["exists"] for index in report["indexes"]) or not all(
+            query["uses_index"] for query in report["queries"]
+        ):
+            click.secho("Alcune query calde non usano un indice", fg="yellow", err=True)
+    finally:
+        frappe.destroy()
+
+
+@click.command("advanced-tc-merge-duplicate-timesheets")
+@click.option("--dry-run", is_flag=True, default=False, help="Elenca i duplicati senza modificarli")
+@pass_context
+def merge_duplicate_timesheets(context, dry_run=False):
+    """
+    Unisce i Timesheet settimanali in bozza duplicati per lo stesso employee (output JSON)
+    """
+    from advanced_tc.api.weekly_timesheets import merge_duplicate_timesheets as merge
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        report = merge(dry_run=dry_run)
+        click.echo(json.dumps(report, indent=2, default=str))
+
+        if any(entry["status"] == "error" for entry in report):
+            click.secho("Alcune settimane non sono state unite", fg="yellow", err=True)
+    finally:
+        frappe.destroy()
+
+
+@click.command("advanced-tc-rebuild-rollup")
+@click.option("--from-date", default=None, help="Primo giorno da ricalcolare (YYYY-MM-DD)")
+@click.option("--to-date", default=None, help="Ultimo giorno da ricalcolare (YYYY-MM-DD)")
+@pass_context
+def rebuild_rollup(context, from_date=None, to_date=None):
+    """
+    Ricostruisce la tabella Timesheet Daily Rollup (tutta o per un intervallo di date)
+    """
+    from advanced_tc.api.rollup import rebuild_rollup as rebuild
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        rows = rebuild(from_date=from_date, to_date=to_date)
+        frappe.db.commit()
+        click.echo(f"Timesheet Daily Rollup: {rows} righe")
+    finally:
+        frappe.destroy()
+
+
+@click.command("advanced-tc-benchmark-seed")
+@click.option("--employees", default=500, type=int, help="Numero di Employee sintetici")
+@click.option("--years", default=3, type=int, help="Anni di Timesheet da generare fino ad oggi")
+@click.option("--projects", default=60, type=int, help="Numero di progetti")
+@click.option("--tasks-per-project", default=8, type=int, help="Task per progetto")
+@click.option("--projects-per-employee", default=3, type=int, help="Progetti assegnati ad ogni employee")
+@click.option("--company", default=None, help="Company dei record (default: quella predefinita)")
+@click.option("--seed", default=42, type=int, help="Seed del generatore casuale (dati riproducibili)")
+@click.option("--clear", is_flag=True, default=False, help="Elimina i dati sintetici senza generarne di nuovi")
+@pass_context
+def benchmark_seed(context, employees=500, years=3, projects=60, tasks_per_project=8,
+        projects_per_employee=3, company=None, seed=42, clear=False):
+    """
+    Popola il sito con dati sintetici per il benchmark (solo siti con allow_tests = 1)
+    """
+    from advanced_tc.benchmark.generator import clear_dataset, generate_dataset
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        if clear:
+            clear_dataset()
+            click.echo("Dati di benchmark eliminati")
+            return
+
+        counts = generate_dataset(
+            employees=employees,
+            years=years,
+            projects=projects,
+            tasks_per_project=tasks_per_project,
+            projects_per_employee=projects_per_employee,
+            company=company,
+            seed=seed
+        )
+        click.echo(json.dumps(counts, indent=2, default=str))
+    finally:
+        frappe.destroy()
+
+
+@click.command("advanced-tc-benchmark")
+@click.option("--scenario", "scenarios", multiple=True, help="Scenario da eseguire (ripetibile, default: tutti)")
+@click.option("--users", default=10, type=int, help="Employee sintetici usati dagli scenari")
+@click.option("--iterations", default=1, type=int, help="Ripetizioni della suite")
+@click.option("--cold", is_flag=True, default=False, help="Svuota le cache dell'app prima di ogni chiamata")
+@click.option("--seed", default=42, type=int, help="Seed per la scelta degli employee")
+@click.option("--output", default=None, help="File in cui scrivere il report JSON (default: stdout)")
+@pass_context
+def benchmark(context, scenarios=(), users=10, iterations=1, cold=False, seed=42, output=None):
+    """
+    Esegue la suite di scenari sui dati sintetici e riporta latenze (percentili), query SQL e righe esaminate per endpoint
+    """
+    from advanced_tc.benchmark.generator import check_benchmark_site
+    from advanced_tc.benchmark.scenarios import run_suite
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        check_benchmark_site()
+        report = json.dumps(
+            run_suite(scenarios=list(scenarios), users=users, iterations=iterations, cold=cold, seed=seed),
+            indent=2,
+            default=str
+        )
+
+        if output:
+            with open(output, "w") as f:
+                f.write(report)
+            click.echo(f"Report scritto in {output}")
+        else:
+            click.echo(report)
+    finally:
+        frappe.destroy()
+
+
+@click.command("advanced-tc-load-test")
+@click.option("--url", default=None, help="URL del bench (default: http://127.0.0.1:<webserver_port>)")
+@click.option("--users", default=50, type=int, help="Utenti simulati concorrenti (employee sintetici)")
+@click.option("--duration", default=60, type=int, help="Durata del test a regime (secondi)")
+@click.option("--ramp-up", default=10, type=int, help="Intervallo (secondi) in cui partono gli utenti")
+@click.option("--think-time", default=2.0, type=float, help="Pausa media (secondi) tra due azioni di un utente")
+@click.option("--write-ratio", default=0.3, type=float, help="Frazione di azioni di scrittura (crea, sposta, elimina)")
+@click.option("--seed", default=42, type=int, help="Seed per la scelta degli utenti e delle azioni")
+@click.option("--output", default=None, help="File in cui scrivere il report JSON (default: stdout)")
+@pass_context
+def load_test(context, url=None, users=50, duration=60, ramp_up=10, think_time=2.0, write_ratio=0.3, seed=42, output=None):
+    """
+    Test di carico HTTP sugli endpoint del calendario con utenti concorrenti autenticati
+    (dati di advanced-tc-benchmark-seed, solo siti con allow_tests = 1): throughput, errori,
+    deadlock e latenze per azione
+    """
+    from advanced_tc.benchmark.generator import check_benchmark_site
+    from advanced_tc.benchmark.load_test import prepare_virtual_users, revoke_api_keys, run_load_test
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+
+    try:
+        check_benchmark_site()
+        base_url = url or f"http://127.0.0.1:{frappe.conf.webserver_port or 8000}"
+        profiles = prepare_virtual_users(users, seed=seed)
+
+        try:
+            report = run_load_test(
+                base_url,
+                site,
+                profiles,
+                duration=duration,
+                ramp_up=ramp_up,
+                think_time=think_time,
+                write_ratio=write_ratio,
+                seed=seed
+            )
+        finally:
+            revoke_api_keys(profiles)
+
+        report = json.dumps(report, indent=2, default=str)
+        if output:
+            with open(output, "w") as f:
+                f.write(report)
+            click.echo(f"Report scritto in {output}")
+        else:
+            click.echo(report)
+    finally:
+        frappe.destroy()
+
+
+commands = [check_indexes, merge_duplicate_timesheets, rebuild_rollup, benchmark_seed, benchmark, load_test]
@@ -48,3 +48,138 @@ after_install = "advanced_tc.install.after_install"
 
 before_uninstall = "advanced_tc.install.before_uninstall"
 
+
+
+# Document Events
+# ---------------
+# Hook on document methods and events
+
+doc_events = {
+	"Employee": {
+		"on_update": [
+			"advanced_tc.api.permissions.on_employee_change",
+			"advanced_tc.api.bootstrap.on_master_change",
+			"advanced_tc.api.event_cache.on_employee_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.permissions.on_employee_change",
+			"advanced_tc.api.bootstrap.on_master_change"
+		],
+		"after_rename": [
+			"advanced_tc.api.permissions.on_employee_rename",
+			"advanced_tc.api.bootstrap.on_master_rename",
+			"advanced_tc.api.event_cache.on_employee_rename"
+		]
+	},
+	"User": {
+		"on_update": [
+			"advanced_tc.api.permissions.on_user_change",
+			"advanced_tc.api.bootstrap.on_user_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.permissions.on_user_change",
+			"advanced_tc.api.bootstrap.on_user_change"
+		]
+	},
+	"Has Role": {
+		"after_insert": [
+			"advanced_tc.api.permissions.on_has_role_change",
+			"advanced_tc.api.bootstrap.on_has_role_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.permissions.on_has_role_change",
+			"advanced_tc.api.bootstrap.on_has_role_change"
+		]
+	},
+	"Timesheet": {
+		"on_update": [
+			"advanced_tc.api.event_cache.on_timesheet_change",
+			"advanced_tc.api.event_sync.on_timesheet_change",
+			"advanced_tc.api.search.on_search_source_change",
+			"advanced_tc.api.rollup.on_timesheet_change",
+			"advanced_tc.api.realtime.on_timesheet_change"
+		],
+		"on_submit": [
+			"advanced_tc.api.event_cache.on_timesheet_change",
+			"advanced_tc.api.search.on_search_source_change"
+		],
+		"on_cancel": [
+			"advanced_tc.api.event_cache.on_timesheet_change",
+			"advanced_tc.api.search.on_search_source_change",
+			"advanced_tc.api.rollup.on_timesheet_change",
+			"advanced_tc.api.realtime.on_timesheet_change"
+		],
+		"on_update_after_submit": [
+			"advanced_tc.api.event_cache.on_timesheet_change",
+			"advanced_tc.api.event_sync.on_timesheet_change",
+			"advanced_tc.api.rollup.on_timesheet_change",
+			"advanced_tc.api.realtime.on_timesheet_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.event_cache.on_timesheet_change",
+			"advanced_tc.api.event_sync.on_timesheet_change",
+			"advanced_tc.api.search.on_search_source_change",
+			"advanced_tc.api.rollup.on_timesheet_change",
+			"advanced_tc.api.realtime.on_timesheet_change"
+		],
+		"after_rename": [
+			"advanced_tc.api.event_cache.on_timesheet_rename",
+			"advanced_tc.api.search.on_search_source_rename"
+		]
+	},
+	"Project": {
+		"on_update": [
+			"advanced_tc.api.event_cache.on_project_change",
+			"advanced_tc.api.assignments.on_project_change",
+			"advanced_tc.api.bootstrap.on_master_change",
+			"advanced_tc.api.search.on_search_source_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.assignments.on_project_change",
+			"advanced_tc.api.bootstrap.on_master_change",
+			"advanced_tc.api.search.on_search_source_change"
+		],
+		"after_rename": [
+			"advanced_tc.api.event_cache.on_link_rename",
+			"advanced_tc.api.assignments.on_link_rename",
+			"advanced_tc.api.bootstrap.on_master_rename",
+			"advanced_tc.api.search.on_search_source_rename"
+		]
+	},
+	"Task": {
+		"on_update": [
+			"advanced_tc.api.event_cache.on_task_change",
+			"advanced_tc.api.assignments.on_task_change",
+			"advanced_tc.api.bootstrap.on_master_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.assignments.on_task_change",
+			"advanced_tc.api.bootstrap.on_master_change"
+		],
+		"after_rename": [
+			"advanced_tc.api.event_cache.on_link_rename",
+			"advanced_tc.api.assignments.on_link_rename",
+			"advanced_tc.api.bootstrap.on_master_rename"
+		]
+	},
+	"ToDo": {
+		"on_update": [
+			"advanced_tc.api.assignments.on_todo_change",
+			"advanced_tc.api.bootstrap.on_todo_change"
+		],
+		"on_trash": [
+			"advanced_tc.api.assignments.on_todo_change",
+			"advanced_tc.api.bootstrap.on_todo_change"
+		]
+	},
+	"Activity Type": {
+		"on_update": "advanced_tc.api.bootstrap.on_master_change",
+		"on_trash": "advanced_tc.api.bootstrap.on_master_change",
+		"after_rename": "advanced_tc.api.bootstrap.on_master_rename"
+	}
+}
+
+# Request Events
+# ----------------
+# Dimensione delle risposte delle API strumentate, misurata dopo la serializzazione
+after_request = ["advanced_tc.api.instrumentation.record_response_size"]
@@ -1,6 +1,8 @@
 import frappe
 from frappe import _
 
+from advanced_tc.api import db_indexes, rollup
+
 def after_install():
     """
     Configurazioni post-installazione per l'app Advanced Timesheet Calendar
@@ -11,6 +13,10 @@ def after_install():
         # Crea workspace custom dedicata
         create_custom_workspace()
         
+        # Su una nuova installazione le patch di patches.txt risultano già eseguite:
+        # indici e tabella dei totali giornalieri vanno preparati qui
+        setup_calendar_data()
+        
         frappe.db.commit()
         print("✅ Installazione completata con successo!")
         print("ℹ️ L'app è accessibile tramite:")
@@ -70,6 +76,20 @@ def create_custom_workspace():
         frappe.log_error(f"Errore durante la creazione della workspace: {str(e)}", "Advanced TC Install")
         print(f"⚠️ Errore durante la creazione della workspace: {str(e)}")
 
+def setup_calendar_data():
+    """
+    Crea gli indici del calendario e popola la tabella Timesheet Daily Rollup
+    (stesse operazioni delle patch add_*_indexes e build_daily_rollup)
+    """
+    try:
+        db_indexes.ensure_indexes()
+        rollup.rebuild_rollup()
+        print("✅ Indici e totali giornalieri del calendario inizializzati")
+        
+    except Exception as e:
+        frappe.log_error(f"Errore durante l'inizializzazione di indici e totali: {str(e)}", "Advanced TC Install")
+        print(f"⚠️ Errore durante l'inizializzazione di indici e totali: {str(e)}")
+
 def remove_custom_workspace():
     """
     Rimuove la workspace custom durante la disinstallazione
@@ -0,0 +1,15 @@
+import frappe
+
+from advanced_tc.api.db_indexes import ensure_indexes, verify_indexes
+
+
+def execute():
+    """
+    Indici composti per le query calde del calendario (finestre eventi, assegnazioni ToDo,
+    Employee per user_id, Timesheet settimanale) con verifica finale
+    """
+    ensure_indexes()
+
+    missing = [index["index"] for index in verify_indexes() if not index["exists"]]
+    if missing:
+        frappe.log_error(f"Indici non creati: {', '.join(missing)}", "Advanced TC Indexes")
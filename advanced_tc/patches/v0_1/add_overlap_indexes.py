@@ -0,0 +1,11 @@
+import frappe
+
+from advanced_tc.api.overlaps import OVERLAP_INDEXES
+
+
+def execute():
+    """
+    Indici composti per la ricerca delle sovrapposizioni per employee e fascia oraria
+    """
+    for doctype, fields, index_name in OVERLAP_INDEXES:
+        frappe.db.add_index(doctype, fields, index_name=index_name)
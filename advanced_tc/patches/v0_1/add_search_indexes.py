@@ -0,0 +1,11 @@
+import frappe
+
+from advanced_tc.api.db_indexes import SEARCH_INDEXES
+
+
+def execute():
+    """
+    Indici per l'autocomplete per prefisso (Project per stato e nome, Timesheet per stato e creazione)
+    """
+    for doctype, fields, index_name in SEARCH_INDEXES:
+        frappe.db.add_index(doctype, fields, index_name=index_name)
@@ -0,0 +1,13 @@
+import frappe
+
+from advanced_tc.api.db_indexes import ensure_indexes
+from advanced_tc.api.rollup import rebuild_rollup
+
+
+def execute():
+    """
+    Indici e popolamento iniziale della tabella Timesheet Daily Rollup
+    """
+    frappe.reload_doc("advanced_tc", "doctype", "timesheet_daily_rollup")
+    ensure_indexes()
+    rebuild_rollup()
@@ -0,0 +1,44 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from advanced_tc.api import event_sync
+from advanced_tc.api.timesheet_details import delete_timesheet_detail, get_timesheet_changes
+from advanced_tc.tests.utils import TEST_WEEK, make_activity, make_test_employee
+
+
+class TestEventSync(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frappe.set_user("Administrator")
+        cls.employee = make_test_employee("advanced-tc-sync@example.com")
+
+    def test_delete_then_sync(self):
+        kept = make_activity(self.employee, f"{TEST_WEEK} 09:00:00")
+        removed = make_activity(self.employee, f"{TEST_WEEK} 11:00:00")
+        self.assertEqual(kept["timesheet"], removed["timesheet"])
+
+        cursor = event_sync.get_sync_cursor()
+        delete_timesheet_detail(removed["timesheet_detail"])
+
+        # La tombstone viene registrata solo al commit della transazione
+        self.assertNotIn(removed["timesheet_detail"], event_sync.get_tombstones(cursor))
+        frappe.db.after_commit.run()
+        self.assertIn(removed["timesheet_detail"], event_sync.get_tombstones(cursor))
+
+        changes = get_timesheet_changes(
+            f"{TEST_WEEK} 00:00:00", "2030-01-14 00:00:00", {"employee": self.employee}, since=cursor
+        )
+
+        self.assertFalse(changes["reset"])
+        self.assertIn(removed["timesheet_detail"], changes["deleted"])
+        self.assertNotIn(kept["timesheet_detail"], changes["deleted"])
+        self.assertIn(kept["timesheet_detail"], [event["id"] for event in changes["upserts"]])
+
+    def test_tombstones_after_cursor_only(self):
+        name = frappe.generate_hash(length=10)
+        event_sync.record_tombstones([name])
+
+        self.assertIn(name, event_sync.get_tombstones(add_to_date(now_datetime(), seconds=-5)))
+        self.assertNotIn(name, event_sync.get_tombstones(add_to_date(now_datetime(), seconds=5)))
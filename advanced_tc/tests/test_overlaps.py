@@ -0,0 +1,39 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from advanced_tc.api.overlaps import get_employee_intervals, validate_no_overlap
+from advanced_tc.tests.utils import TEST_WEEK, make_activity, make_test_employee, make_timesheet
+
+
+class TestOverlaps(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frappe.set_user("Administrator")
+        cls.employee = make_test_employee("advanced-tc-overlaps@example.com")
+
+        # Due Timesheet distinti dello stesso employee (settimana dei test e successiva)
+        cls.first = make_timesheet(cls.employee, [
+            {"from_time": f"{TEST_WEEK} 09:00:00", "to_time": f"{TEST_WEEK} 10:00:00"}
+        ])
+        cls.second = make_timesheet(cls.employee, [
+            {"from_time": "2030-01-15 09:00:00", "to_time": "2030-01-15 10:00:00"}
+        ])
+
+    def test_overlap_rejected_across_timesheets(self):
+        # La nuova voce va nel secondo Timesheet ma si sovrappone a un'attività del primo
+        with self.assertRaises(frappe.ValidationError):
+            make_activity(self.employee, f"{TEST_WEEK} 09:30:00", timesheet=self.second.name)
+
+        with self.assertRaises(frappe.ValidationError):
+            validate_no_overlap(self.employee, f"{TEST_WEEK} 09:30:00", f"{TEST_WEEK} 10:30:00")
+
+    def test_adjacent_activity_allowed(self):
+        self.assertFalse(get_employee_intervals(self.employee, f"{TEST_WEEK} 10:00:00", f"{TEST_WEEK} 11:00:00"))
+
+        result = make_activity(self.employee, f"{TEST_WEEK} 10:00:00", timesheet=self.second.name)
+        self.assertEqual(result["timesheet"], self.second.name)
+
+    def test_excluded_activity_ignored(self):
+        name = self.first.time_logs[0].name
+        validate_no_overlap(self.employee, f"{TEST_WEEK} 09:15:00", f"{TEST_WEEK} 09:45:00", exclude=[name])
@@ -0,0 +1,47 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.rollup import rebuild_rollup
+from advanced_tc.api.timesheet_details import delete_timesheet_detail, update_detail_times
+from advanced_tc.tests.utils import TEST_WEEK, make_activity, make_test_employee
+
+ROLLUP_TO_DATE = "2030-01-13"
+
+
+class TestRollup(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frappe.set_user("Administrator")
+        cls.employee = make_test_employee("advanced-tc-rollup@example.com")
+
+    def get_rollup_rows(self):
+        return [
+            (row.name, str(row.date), row.project, row.activity_type, flt(row.hours, 6), row.entries)
+            for row in frappe.get_all(
+                "Timesheet Daily Rollup",
+                filters={"employee": self.employee, "date": ["between", [TEST_WEEK, ROLLUP_TO_DATE]]},
+                fields=["name", "date", "project", "activity_type", "hours", "entries"],
+                order_by="name"
+            )
+        ]
+
+    def test_incremental_rollup_matches_rebuild(self):
+        make_activity(self.employee, f"{TEST_WEEK} 09:00:00")
+        make_activity(self.employee, f"{TEST_WEEK} 10:00:00", hours=2)
+        moved = make_activity(self.employee, "2030-01-08 09:00:00")
+        removed = make_activity(self.employee, "2030-01-09 09:00:00")
+
+        # Spostamento su un altro giorno (la riga del giorno di partenza va rimossa) ed eliminazione
+        update_detail_times(
+            get_permission_context(), moved["timesheet_detail"], f"{TEST_WEEK} 14:00:00", f"{TEST_WEEK} 15:30:00"
+        )
+        delete_timesheet_detail(removed["timesheet_detail"])
+
+        incremental = self.get_rollup_rows()
+        self.assertEqual([(row[1], row[4], row[5]) for row in incremental], [(TEST_WEEK, 4.5, 4)])
+
+        rebuild_rollup(TEST_WEEK, ROLLUP_TO_DATE)
+        self.assertEqual(self.get_rollup_rows(), incremental)
@@ -0,0 +1,54 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import update_detail_times
+from advanced_tc.tests.utils import TEST_WEEK, make_activity, make_test_employee
+
+
+class TestUpdateDetailTimes(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frappe.set_user("Administrator")
+        cls.employee = make_test_employee("advanced-tc-drag@example.com")
+
+    def assertTotalsMatchCalculateHours(self, timesheet_name):
+        """
+        I totali salvati devono coincidere con quelli ricalcolati da ERPNext sul documento
+        """
+        stored = frappe.db.get_value(
+            "Timesheet", timesheet_name, ["total_hours", "total_costing_amount"], as_dict=True
+        )
+
+        timesheet = frappe.get_doc("Timesheet", timesheet_name)
+        timesheet.calculate_hours()
+        timesheet.update_cost()
+        timesheet.calculate_total_amounts()
+
+        self.assertAlmostEqual(flt(stored.total_hours), flt(timesheet.total_hours), places=6)
+        self.assertAlmostEqual(flt(stored.total_costing_amount), flt(timesheet.total_costing_amount), places=2)
+
+    def test_drag_within_week(self):
+        result = make_activity(self.employee, f"{TEST_WEEK} 09:00:00")
+        make_activity(self.employee, "2030-01-09 09:00:00")
+
+        # Stesso giorno: percorso incrementale (riga e totali aggiornati senza salvare il documento)
+        update_detail_times(
+            get_permission_context(), result["timesheet_detail"], f"{TEST_WEEK} 13:00:00", f"{TEST_WEEK} 15:00:00"
+        )
+
+        self.assertEqual(flt(frappe.db.get_value("Timesheet Detail", result["timesheet_detail"], "hours")), 2)
+        self.assertTotalsMatchCalculateHours(result["timesheet"])
+
+    def test_resize_outside_period(self):
+        result = make_activity(self.employee, "2030-01-10 09:00:00")
+
+        # La riga estende il periodo del Timesheet: salvataggio completo
+        update_detail_times(
+            get_permission_context(), result["timesheet_detail"], "2030-01-11 09:00:00", "2030-01-11 12:30:00"
+        )
+
+        self.assertEqual(flt(frappe.db.get_value("Timesheet Detail", result["timesheet_detail"], "hours")), 3.5)
+        self.assertTotalsMatchCalculateHours(result["timesheet"])
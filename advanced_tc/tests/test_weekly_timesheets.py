@@ -0,0 +1,64 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import create_timesheet_details
+from advanced_tc.api.weekly_timesheets import find_week_timesheet, get_week_start_date
+from advanced_tc.tests.utils import (
+    TEST_WEEK,
+    get_test_company,
+    make_activity,
+    make_activity_type,
+    make_test_employee,
+)
+
+
+class TestWeeklyTimesheets(FrappeTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        frappe.set_user("Administrator")
+        cls.employee = make_test_employee("advanced-tc-weekly@example.com")
+
+    def get_week_timesheets(self, week_start):
+        return frappe.get_all("Timesheet", filters={
+            "employee": self.employee,
+            "docstatus": ["<", 2],
+            "start_date": ["between", [week_start, add_days(week_start, 6)]]
+        }, pluck="name")
+
+    def test_week_start_date(self):
+        self.assertEqual(str(get_week_start_date("2030-01-10")), TEST_WEEK)
+        self.assertEqual(str(get_week_start_date(TEST_WEEK)), TEST_WEEK)
+
+    def test_two_creates_same_week(self):
+        first = make_activity(self.employee, f"{TEST_WEEK} 09:00:00")
+        second = make_activity(self.employee, "2030-01-09 14:00:00")
+
+        self.assertEqual(first["timesheet"], second["timesheet"])
+        self.assertEqual(self.get_week_timesheets(TEST_WEEK), [first["timesheet"]])
+        self.assertEqual(find_week_timesheet(self.employee, TEST_WEEK).name, first["timesheet"])
+
+    def test_bulk_create_groups_by_week(self):
+        entries = [
+            {
+                "employee": self.employee,
+                "company": get_test_company(),
+                "activity_type": make_activity_type(),
+                "from_time": from_time,
+                "to_time": to_time
+            }
+            for from_time, to_time in (
+                ("2030-01-21 09:00:00", "2030-01-21 10:00:00"),
+                ("2030-01-22 09:00:00", "2030-01-22 10:00:00"),
+                ("2030-01-28 09:00:00", "2030-01-28 10:00:00"),
+            )
+        ]
+
+        results = create_timesheet_details(get_permission_context(), entries)
+
+        self.assertEqual(results[0]["timesheet"], results[1]["timesheet"])
+        self.assertNotEqual(results[0]["timesheet"], results[2]["timesheet"])
+        self.assertEqual(self.get_week_timesheets("2030-01-21"), [results[0]["timesheet"]])
+        self.assertEqual(self.get_week_timesheets("2030-01-28"), [results[2]["timesheet"]])
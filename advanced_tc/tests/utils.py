@@ -0,0 +1,68 @@
+import frappe
+from erpnext.setup.doctype.employee.test_employee import make_employee
+from frappe.utils import add_to_date, get_datetime
+
+from advanced_tc.api.permissions import get_permission_context
+from advanced_tc.api.timesheet_details import create_timesheet_details
+
+# Settimana dei test (lunedì): lontana dai dati reali del sito
+TEST_WEEK = "2030-01-07"
+
+TEST_ACTIVITY_TYPE = "_Test Advanced TC Activity"
+
+
+def get_test_company():
+    return frappe.defaults.get_global_default("company") or frappe.db.get_value("Company", {}, "name")
+
+
+def make_test_employee(email):
+    """
+    Employee di test dedicato: nessuna attività preesistente nella settimana dei test
+    """
+    return make_employee(email, company=get_test_company())
+
+
+def make_activity_type():
+    if not frappe.db.exists("Activity Type", TEST_ACTIVITY_TYPE):
+        frappe.get_doc({
+            "doctype": "Activity Type",
+            "activity_type": TEST_ACTIVITY_TYPE,
+            "costing_rate": 50,
+            "billing_rate": 80
+        }).insert()
+
+    return TEST_ACTIVITY_TYPE
+
+
+def make_activity(employee, from_time, hours=1, **kwargs):
+    """
+    Crea un'attività come il calendario (senza commit) e restituisce il risultato di
+    create_timesheet_details: {"timesheet_detail", "timesheet", "index"}
+    """
+    from_time = get_datetime(from_time)
+    data = {
+        "employee": employee,
+        "company": get_test_company(),
+        "activity_type": make_activity_type(),
+        "from_time": str(from_time),
+        "to_time": str(add_to_date(from_time, hours=hours)),
+        "description": "Test Advanced TC"
+    }
+    data.update(kwargs)
+
+    return create_timesheet_details(get_permission_context(), [data])[0]
+
+
+def make_timesheet(employee, time_logs):
+    """
+    Inserisce direttamente un Timesheet (senza passare dal calendario)
+    """
+    return frappe.get_doc({
+        "doctype": "Timesheet",
+        "employee": employee,
+        "company": get_test_company(),
+        "time_logs": [
+            dict({"activity_type": make_activity_type(), "hours": 1}, **log)
+            for log in time_logs
+        ]
+    }).insert()